@@ -68,6 +68,7 @@ class Blog(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
+            models.Index(fields=['created_at', 'id']),
             models.Index(fields=['status']),
             models.Index(fields=['slug']),
         ]
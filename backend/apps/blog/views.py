@@ -1,6 +1,8 @@
 from django.utils import timezone
 from rest_framework import viewsets, permissions, filters
 
+from apps.common.pagination import KeysetPagination
+
 from .models import Blog, Comment
 from .serializers import PostSerializer, CommentSerializer
 
@@ -20,6 +22,8 @@ class PostViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description', 'focus_keyword']
     ordering_fields = ['created_at', 'published_at', 'title']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         qs = Blog.objects.all()
@@ -1,6 +1,22 @@
 from django.contrib import admin
-from .models import Contact, Newsletter
+from .models import Contact, Newsletter, CorreoSaliente
 
 # Register your models here.
 admin.site.register(Contact)
-admin.site.register(Newsletter)
\ No newline at end of file
+admin.site.register(Newsletter)
+
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ['id', 'destinatario', 'asunto', 'categoria', 'estado', 'intentos', 'created_at', 'enviado_at']
+    list_filter = ['estado', 'categoria']
+    search_fields = ['destinatario', 'asunto']
+    # El cuerpo puede llevar enlaces de un solo uso (restablecimiento de contraseña)
+    exclude = ['html', 'params']
+    readonly_fields = ['cuerpo', 'estado', 'intentos', 'disponible_en', 'ultimo_error', 'message_id', 'enviado_at']
+
+    @admin.display(description='Cuerpo')
+    def cuerpo(self, obj):
+        if obj.sensible:
+            return '(oculto: contiene datos sensibles)'
+        return obj.html or (f'Plantilla {obj.template_id}' if obj.template_id else '')
@@ -0,0 +1,41 @@
+"""
+Espacios de llaves de la caché por app.
+
+Cada app arma sus llaves con clave_cache('productos', 'categoria', 7) ->
+'productos:v1:categoria:7'. La versión de cada app sale de
+settings.CACHE_VERSIONES_APPS (1 si no aparece); subirla descarta solo lo
+memorizado por esa app, sin tocar el resto (CACHE_VERSION descarta todo).
+
+Para invalidar un grupo de llaves (todas las páginas de una categoría, el usuario
+autenticado, ...) el grupo lleva su propio número de versión: version_grupo() lo
+lee y invalidar_grupo() lo sube al confirmar la transacción. Si la caché pierde
+el número, arranca en un valor nunca usado (time.time_ns) y nunca en 1, para que
+las entradas de una versión anterior no se vuelvan a servir.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def clave_cache(app, *partes):
+    """Llave con el prefijo y la versión de la app: 'app:v<versión>:parte:parte'."""
+    version = getattr(settings, 'CACHE_VERSIONES_APPS', {}).get(app, 1)
+    return ':'.join([app, f'v{version}', *map(str, partes)])
+
+
+def version_grupo(clave):
+    """Número de versión actual del grupo `clave` (lo crea si no existe)."""
+    return cache.get_or_set(clave, time.time_ns, None)
+
+
+def invalidar_grupo(*claves):
+    """Sube (al confirmar la transacción) la versión de los grupos dados."""
+    def subir_versiones():
+        for clave in claves:
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.set(clave, time.time_ns(), None)
+    transaction.on_commit(subir_versiones)
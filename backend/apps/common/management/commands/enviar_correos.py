@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.common.services import enviar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Envía los correos de la bandeja de salida (worker con reintentos y backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help='Correos a tomar por iteración')
+        parser.add_argument('--espera', type=float, default=5.0, help='Segundos de espera cuando no hay correos')
+        parser.add_argument('--una-vez', action='store_true', help='Envía lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        while True:
+            enviados = enviar_pendientes(limite=options['lote'])
+            if enviados:
+                self.stdout.write(f'{enviados} correos procesados')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['espera'])
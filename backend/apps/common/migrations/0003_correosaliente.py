@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_newsletter_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('asunto', models.CharField(blank=True, max_length=255)),
+                ('html', models.TextField(blank=True)),
+                ('template_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('categoria', models.CharField(blank=True, help_text='Origen del correo (newsletter, pedido_enviado, ...)', max_length=50)),
+                ('estado', models.CharField(choices=[('PEN', 'Pendiente'), ('PRO', 'Enviando'), ('ENV', 'Enviado'), ('ERR', 'Fallido')], default='PEN', max_length=3)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('message_id', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('enviado_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Correo saliente',
+                'verbose_name_plural': 'Correos salientes',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='common_corr_estado_aff69c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+def proteger_restablecimientos(apps, schema_editor):
+    CorreoSaliente = apps.get_model('common', 'CorreoSaliente')
+    restablecimientos = CorreoSaliente.objects.filter(categoria='password_reset')
+    restablecimientos.update(sensible=True)
+    # Los ya enviados o fallidos no necesitan conservar el enlace
+    restablecimientos.exclude(estado__in=['PEN', 'PRO']).update(html='', params={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_correosaliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='correosaliente',
+            name='sensible',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(proteger_restablecimientos, migrations.RunPython.noop),
+    ]
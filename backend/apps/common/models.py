@@ -1,6 +1,7 @@
 from django.db import models
 from django.db.models import UniqueConstraint
 from django.db.models.functions import Lower
+from django.utils import timezone
 
 # Create your models here.
 
@@ -31,4 +32,47 @@ class Newsletter(models.Model):
         constraints = [
             UniqueConstraint(Lower('email'), name='unique_newsletter_email_ci')
         ]
-    
\ No newline at end of file
+    
+
+class CorreoSaliente(models.Model):
+    """Bandeja de salida de correos transaccionales.
+
+    Las vistas solo encolan (common.services.encolar_correo); el comando
+    `enviar_correos` los manda por Brevo en lotes, con reintentos y backoff.
+    """
+
+    class EstadoChoices(models.TextChoices):
+        PENDIENTE = 'PEN', 'Pendiente'
+        ENVIANDO = 'PRO', 'Enviando'
+        ENVIADO = 'ENV', 'Enviado'
+        FALLIDO = 'ERR', 'Fallido'
+
+    destinatario = models.EmailField()
+    asunto = models.CharField(max_length=255, blank=True)
+    html = models.TextField(blank=True)
+    # Si se indica template_id, Brevo arma el correo con la plantilla y `params`
+    template_id = models.PositiveIntegerField(null=True, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    categoria = models.CharField(max_length=50, blank=True, help_text="Origen del correo (newsletter, pedido_enviado, ...)")
+    # El cuerpo lleva secretos (p. ej. el enlace de restablecimiento): se borra al enviarse o fallar
+    sensible = models.BooleanField(default=False)
+
+    estado = models.CharField(max_length=3, choices=EstadoChoices.choices, default=EstadoChoices.PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    disponible_en = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True, default='')
+    message_id = models.CharField(max_length=255, blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    enviado_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.destinatario} - {self.asunto or self.categoria} ({self.estado})'
+
+    class Meta:
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en']),
+        ]
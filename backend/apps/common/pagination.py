@@ -0,0 +1,102 @@
+"""
+Paginación por llave (keyset) compatible con la paginación por página.
+
+Sin `?cursor=` se comporta como PageNumberPagination (count/next/previous/results),
+así que los clientes actuales no cambian. Con `?cursor=` (vacío para la primera
+página) pagina por llave sobre `keyset_ordering` de la vista (o `ordering` de la
+clase): WHERE (fecha, id) < (último visto) ORDER BY fecha DESC, id DESC LIMIT n,
+sin OFFSET ni COUNT(*), y responde {'next_cursor', 'results'}. Con cursor el orden
+es el de la llave: combinarlo con `?ordering=` responde 400 en lugar de ignorarlo.
+
+codificar_cursor/decodificar_cursor son el formato único de cursor: también los
+usan los listados por llave que no pasan por esta clase (categorías, ventas).
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # Debe terminar en un campo único (normalmente -id) para que el orden sea total
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self._rechazar_ordering(request, view)
+        ordering = tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+        valores = self.decodificar_cursor(queryset.model, ordering, request.query_params[self.cursor_query_param])
+        if valores is not None:
+            queryset = queryset.filter(self.despues_de(ordering, valores))
+
+        tamano = self.get_page_size(request)
+        filas = list(queryset.order_by(*ordering)[:tamano + 1])
+        self.next_cursor = self.codificar_cursor(filas[tamano - 1], ordering) if len(filas) > tamano else None
+        return filas[:tamano]
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({'next_cursor': self.next_cursor, 'results': data})
+
+    @staticmethod
+    def _rechazar_ordering(request, view):
+        """El cursor solo vale para el orden de la llave: un ?ordering= explícito no se ignora en silencio."""
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter) and request.query_params.get(backend.ordering_param):
+                raise ValidationError({backend.ordering_param: 'No se puede combinar con cursor'})
+
+    @staticmethod
+    def despues_de(ordering, valores):
+        """Filas posteriores a `valores` en el orden lexicográfico de `ordering`."""
+        condicion = Q()
+        for i, campo in enumerate(ordering):
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            paso = Q(**{f'{campo.lstrip("-")}__{operador}': valores[i]})
+            for previo, valor in zip(ordering[:i], valores[:i]):
+                paso &= Q(**{previo.lstrip('-'): valor})
+            condicion |= paso
+        return condicion
+
+    @staticmethod
+    def codificar_cursor(fila, ordering):
+        """Cursor opaco con los valores de `ordering` en `fila` (instancia o dict de values())."""
+        valores = []
+        for campo in ordering:
+            nombre = campo.lstrip('-')
+            valor = fila[nombre] if isinstance(fila, dict) else getattr(fila, nombre)
+            valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+    @staticmethod
+    def decodificar_cursor(modelo, ordering, cursor, campos=None):
+        """Valores de la llave del cursor (convertidos con cada campo del modelo) o None si viene vacío.
+
+        `campos` da el Field de las columnas anotadas que no existen en el modelo.
+        """
+        if not cursor:
+            return None
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(valores, list) or len(valores) != len(ordering):
+                raise ValueError
+            campos = campos or {}
+            return [
+                (campos.get(campo.lstrip('-')) or modelo._meta.get_field(campo.lstrip('-'))).to_python(valor)
+                for campo, valor in zip(ordering, valores)
+            ]
+        except (TypeError, ValueError, binascii.Error, DjangoValidationError) as exc:
+            raise ValidationError({'cursor': 'Cursor inválido'}) from exc
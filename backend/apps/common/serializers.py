@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Contact, Newsletter
+from .models import Contact, Newsletter, CorreoSaliente
 
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,3 +30,15 @@ class NewsletterSerializer(serializers.ModelSerializer):
         email = validated_data.get('email', '').lower()
         is_active = validated_data.get('is_active', True)
         return Newsletter.objects.create(email=email, is_active=is_active)
+
+
+class CorreoSalienteSerializer(serializers.ModelSerializer):
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+
+    class Meta:
+        model = CorreoSaliente
+        fields = [
+            'id', 'destinatario', 'asunto', 'categoria', 'estado', 'estado_display',
+            'intentos', 'ultimo_error', 'message_id', 'created_at', 'enviado_at',
+        ]
+        read_only_fields = fields
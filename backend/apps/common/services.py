@@ -0,0 +1,142 @@
+"""
+Envío de correos transaccionales vía Brevo a través de la bandeja CorreoSaliente.
+
+Las vistas encolan con `encolar_correo` (un INSERT, sin llamadas HTTP) y el
+comando `enviar_correos` despacha en lotes reutilizando un solo cliente de Brevo,
+cuyo pool de conexiones (urllib3) mantiene vivas las conexiones TLS entre envíos.
+"""
+from datetime import timedelta
+
+import brevo_python
+from brevo_python.rest import ApiException
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CorreoSaliente
+
+MAX_INTENTOS = 6
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAXIMO = timedelta(hours=2)
+LEASE = timedelta(minutes=5)
+
+_cliente = None
+
+
+def brevo_configurado(requiere_remitente=True):
+    if not getattr(settings, 'BREVO_API_KEY', None):
+        return False
+    return not requiere_remitente or bool(getattr(settings, 'BREVO_SENDER_EMAIL', None))
+
+
+def cliente_brevo():
+    """TransactionalEmailsApi compartido por el proceso (se crea una sola vez)."""
+    global _cliente
+    if _cliente is None:
+        configuration = brevo_python.Configuration()
+        configuration.api_key['api-key'] = settings.BREVO_API_KEY
+        _cliente = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
+    return _cliente
+
+
+def encolar_correo(destinatario, asunto='', html='', template_id=None, params=None, categoria='', sensible=False):
+    """Agrega un correo a la bandeja de salida; se envía en segundo plano.
+
+    Con `sensible=True` el cuerpo (html y params) se borra en cuanto el correo se
+    envía o falla definitivamente, para no dejar secretos guardados en la base.
+    """
+    return CorreoSaliente.objects.create(
+        destinatario=destinatario,
+        asunto=asunto,
+        html=html,
+        template_id=template_id or None,
+        params=params or {},
+        categoria=categoria,
+        sensible=sensible,
+    )
+
+
+def _construir_mensaje(correo):
+    if correo.template_id:
+        return brevo_python.SendSmtpEmail(
+            to=[{"email": correo.destinatario}],
+            template_id=correo.template_id,
+            params=correo.params or None,
+        )
+    empresa = getattr(settings, 'COMPANY_NAME', '') or 'Refaccionaria Vega'
+    return brevo_python.SendSmtpEmail(
+        to=[{"email": correo.destinatario}],
+        subject=correo.asunto,
+        html_content=correo.html,
+        sender={
+            "email": settings.BREVO_SENDER_EMAIL,
+            "name": getattr(settings, 'BREVO_SENDER_NAME', '') or empresa,
+        },
+    )
+
+
+def _es_error_permanente(exc):
+    # 4xx (salvo 429: límite de tasa) significa que reintentar no servirá
+    status_code = getattr(exc, 'status', None)
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code != 429
+
+
+def _backoff(intentos):
+    return min(BACKOFF_BASE * (2 ** max(intentos - 1, 0)), BACKOFF_MAXIMO)
+
+
+def reclamar_correos(limite=50):
+    """Toma un lote de correos listos para enviar (SKIP LOCKED entre workers)."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        correos = list(
+            CorreoSaliente.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                estado__in=[CorreoSaliente.EstadoChoices.PENDIENTE, CorreoSaliente.EstadoChoices.ENVIANDO],
+                disponible_en__lte=ahora,
+            )
+            .order_by('disponible_en', 'id')[:limite]
+        )
+        for correo in correos:
+            correo.estado = CorreoSaliente.EstadoChoices.ENVIANDO
+            correo.intentos += 1
+            correo.disponible_en = ahora + LEASE
+        CorreoSaliente.objects.bulk_update(correos, ['estado', 'intentos', 'disponible_en'])
+    return correos
+
+
+def enviar_correo(correo, api=None):
+    """Envía un correo ya reclamado y registra el resultado."""
+    try:
+        if not brevo_configurado(requiere_remitente=not correo.template_id):
+            raise RuntimeError('Brevo no está configurado (BREVO_API_KEY / BREVO_SENDER_EMAIL)')
+        respuesta = (api or cliente_brevo()).send_transac_email(_construir_mensaje(correo))
+    except Exception as exc:
+        correo.ultimo_error = str(getattr(exc, 'body', None) or exc)[:2000]
+        if (isinstance(exc, ApiException) and _es_error_permanente(exc)) or correo.intentos >= MAX_INTENTOS:
+            correo.estado = CorreoSaliente.EstadoChoices.FALLIDO
+        else:
+            correo.estado = CorreoSaliente.EstadoChoices.PENDIENTE
+            correo.disponible_en = timezone.now() + _backoff(correo.intentos)
+    else:
+        correo.estado = CorreoSaliente.EstadoChoices.ENVIADO
+        correo.message_id = getattr(respuesta, 'message_id', '') or ''
+        correo.ultimo_error = ''
+        correo.enviado_at = timezone.now()
+    campos = ['estado', 'disponible_en', 'ultimo_error', 'message_id', 'enviado_at']
+    if correo.sensible and correo.estado != CorreoSaliente.EstadoChoices.PENDIENTE:
+        correo.html, correo.params = '', {}
+        campos += ['html', 'params']
+    correo.save(update_fields=campos)
+    return correo
+
+
+def enviar_pendientes(limite=50):
+    """Envía un lote de la bandeja por el mismo cliente; regresa cuántos se tomaron."""
+    correos = reclamar_correos(limite)
+    if correos:
+        api = cliente_brevo() if brevo_configurado(requiere_remitente=False) else None
+        for correo in correos:
+            enviar_correo(correo, api=api)
+    return len(correos)
@@ -1,3 +1,152 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from brevo_python.rest import ApiException
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.common.cache import clave_cache, invalidar_grupo, version_grupo
+from apps.common.models import CorreoSaliente, Newsletter
+from apps.common.services import enviar_pendientes
+
+
+@override_settings(BREVO_API_KEY='key', BREVO_SENDER_EMAIL='tienda@example.com', BREVO_TEMPLATE_NEWSLETTER_CONFIRM=0)
+class CorreoSalienteTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_newsletter_encola_sin_llamar_a_brevo(self):
+        with mock.patch('apps.common.services.cliente_brevo') as cliente:
+            res = self.client.post(reverse('newsletter-list'), {'email': 'Ana@Example.com'}, format='json')
+            cliente.assert_not_called()
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(Newsletter.objects.filter(email='ana@example.com').exists())
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.destinatario, 'ana@example.com')
+        self.assertEqual(correo.estado, CorreoSaliente.EstadoChoices.PENDIENTE)
+
+    def test_worker_envia_lote_con_un_solo_cliente(self):
+        for i in range(3):
+            CorreoSaliente.objects.create(destinatario=f'c{i}@example.com', asunto='Hola', html='<p>x</p>')
+        api = mock.Mock()
+        api.send_transac_email.return_value = mock.Mock(message_id='<m@brevo>')
+        with mock.patch('apps.common.services.cliente_brevo', return_value=api) as cliente:
+            self.assertEqual(enviar_pendientes(), 3)
+        self.assertEqual(cliente.call_count, 1)
+        self.assertEqual(api.send_transac_email.call_count, 3)
+        self.assertEqual(
+            CorreoSaliente.objects.filter(estado=CorreoSaliente.EstadoChoices.ENVIADO, message_id='<m@brevo>').count(), 3
+        )
+
+    def test_reintento_con_backoff_y_error_permanente(self):
+        temporal = CorreoSaliente.objects.create(destinatario='a@example.com', asunto='A', html='a')
+        permanente = CorreoSaliente.objects.create(destinatario='b@example.com', asunto='B', html='b')
+
+        def enviar(mensaje):
+            if mensaje.to[0]['email'] == 'a@example.com':
+                raise ApiException(status=503, reason='Service Unavailable')
+            raise ApiException(status=400, reason='Bad Request')
+
+        api = mock.Mock()
+        api.send_transac_email.side_effect = enviar
+        with mock.patch('apps.common.services.cliente_brevo', return_value=api):
+            enviar_pendientes()
+
+        temporal.refresh_from_db()
+        permanente.refresh_from_db()
+        self.assertEqual(temporal.estado, CorreoSaliente.EstadoChoices.PENDIENTE)
+        self.assertGreater(temporal.disponible_en, timezone.now() + timedelta(seconds=30))
+        self.assertEqual(permanente.estado, CorreoSaliente.EstadoChoices.FALLIDO)
+
+    def test_enlace_de_restablecimiento_no_queda_guardado(self):
+        get_user_model().objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.client.post('/api/v1/user/password-reset/request/', {'email': 'ana@example.com'}, format='json')
+        correo = CorreoSaliente.objects.get(categoria='password_reset')
+        self.assertTrue(correo.sensible)
+        self.assertIn('/cuenta/reset-password/', correo.html)
+
+        api = mock.Mock()
+        api.send_transac_email.return_value = mock.Mock(message_id='<m@brevo>')
+        with mock.patch('apps.common.services.cliente_brevo', return_value=api):
+            enviar_pendientes()
+        self.assertIn('/cuenta/reset-password/', api.send_transac_email.call_args[0][0].html_content)
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.html, correo.params), (CorreoSaliente.EstadoChoices.ENVIADO, '', {}))
+
+    def test_estado_de_entrega_solo_admin(self):
+        CorreoSaliente.objects.create(destinatario='a@example.com', asunto='A', html='a')
+        url = reverse('correo-saliente-list')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        admin = get_user_model().objects.create_superuser(username='admin', password='x')
+        self.client.force_authenticate(user=admin)
+        res = self.client.get(url, {'estado': 'PEN'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['results'][0]['estado'], 'PEN')
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        from apps.inventario.models import Inventario
+        from apps.productos.models import Categoria, Marca, Refaccion
+
+        ref = Refaccion.objects.create(
+            codigo_parte='K1', nombre='Ref', descripcion='', marca=Marca.objects.create(nombre='M'),
+            categoria=Categoria.objects.create(nombre='C', descripcion=''), precio=1, existencias=0, compatibilidad='',
+        )
+        ahora = timezone.now()
+        self.ids = []
+        for i in range(5):
+            mov = Inventario.objects.create(refaccion=ref, cantidad=1, tipo_movimiento='ENT')
+            # Dos movimientos con la misma fecha: el id desempata
+            Inventario.objects.filter(pk=mov.pk).update(fecha=ahora - timedelta(minutes=i // 2 * 10))
+            self.ids.append(mov.pk)
+        self.client = APIClient()
+        self.url = '/api/v1/inventario/refacciones/'
+
+    def test_por_cursor_recorre_sin_offset_ni_count(self):
+        vistos, cursor = [], ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as consultas:
+                res = self.client.get(self.url, {'cursor': cursor, 'page_size': 2})
+            self.assertFalse(any('COUNT(' in q['sql'] or 'OFFSET' in q['sql'] for q in consultas.captured_queries))
+            vistos += [mov['id'] for mov in res.data['results']]
+            cursor = res.data['next_cursor']
+        self.assertEqual(vistos, [self.ids[1], self.ids[0], self.ids[3], self.ids[2], self.ids[4]])
+
+    def test_sin_cursor_conserva_la_paginacion_por_pagina(self):
+        res = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual((res.data['count'], len(res.data['results'])), (5, 2))
+        self.assertIsNotNone(res.data['next'])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'no-es-cursor'}).status_code, 400)
+
+    def test_cursor_con_ordering_responde_400(self):
+        res = self.client.get(self.url, {'cursor': '', 'ordering': 'cantidad'})
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('ordering', res.data)
+        self.assertEqual(self.client.get(self.url, {'ordering': 'cantidad'}).status_code, 200)
+
+
+class CacheAppsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CACHE_VERSIONES_APPS={'productos': 3})
+    def test_clave_con_version_por_app(self):
+        self.assertEqual(clave_cache('productos', 'categoria', 7), 'productos:v3:categoria:7')
+        self.assertEqual(clave_cache('ventas', 'resumen'), 'ventas:v1:resumen')
+
+    def test_version_perdida_no_vuelve_a_un_valor_usado(self):
+        grupo = clave_cache('pedidos', 'grupo', 'version')
+        usadas = {version_grupo(grupo)}
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_grupo(grupo)
+        usadas.add(version_grupo(grupo))
+        cache.delete(grupo)
+        self.assertNotIn(version_grupo(grupo), usadas)
+        self.assertEqual(len(usadas), 2)
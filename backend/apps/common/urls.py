@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ContactViewSet, NewsletterViewSet
+from .views import ContactViewSet, NewsletterViewSet, CorreoSalienteViewSet
 
 router = DefaultRouter()
 router.register(r'contacts', ContactViewSet, basename='contact')
 router.register(r'newsletters', NewsletterViewSet, basename='newsletter')
+router.register(r'correos', CorreoSalienteViewSet, basename='correo-saliente')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,5 +1,21 @@
 from django.contrib import admin
-from .models import Inventario
+from .models import CorteInventario, Inventario, ReservaStock
 
 # Register your models here.
 admin.site.register(Inventario)
+
+
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ['id', 'refaccion', 'pedido', 'cantidad', 'estado', 'expira_en', 'fecha']
+    list_filter = ['estado']
+    search_fields = ['refaccion__nombre', 'refaccion__codigo_parte']
+    raw_id_fields = ['refaccion', 'pedido']
+
+
+@admin.register(CorteInventario)
+class CorteInventarioAdmin(admin.ModelAdmin):
+    list_display = ['id', 'fecha', 'refaccion', 'existencias', 'costo_unitario', 'valor']
+    list_filter = ['fecha']
+    search_fields = ['refaccion__nombre', 'refaccion__codigo_parte']
+    raw_id_fields = ['refaccion']
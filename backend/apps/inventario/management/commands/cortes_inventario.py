@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.inventario.services import generar_cortes, reconstruir_cortes, verificar_cortes
+
+
+class Command(BaseCommand):
+    help = "Genera los cortes mensuales de inventario que falten (y opcionalmente los verifica contra la bitácora)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help='Borra todos los cortes y los genera de nuevo')
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Compara cada corte contra la suma completa de movimientos; falla si hay diferencias',
+        )
+        parser.add_argument(
+            '--cada', type=float, default=None,
+            help='Segundos entre generaciones; sin él genera una vez y termina (para cron)',
+        )
+
+    def handle(self, *args, **options):
+        creados = reconstruir_cortes() if options['reconstruir'] else generar_cortes()
+        self.stdout.write(self.style.SUCCESS(f'{creados} cortes mensuales generados'))
+
+        # Como proceso (Procfile): genera los cortes de cada mes cerrado conforme pasan
+        while options['cada']:
+            time.sleep(options['cada'])
+            creados = generar_cortes()
+            if creados:
+                self.stdout.write(self.style.SUCCESS(f'{creados} cortes mensuales generados'))
+
+        if options['verificar']:
+            diferencias = verificar_cortes()
+            for corte, refaccion_id, guardado, esperado in diferencias[:50]:
+                self.stdout.write(f'{corte:%Y-%m-%d} refacción {refaccion_id}: corte {guardado}, bitácora {esperado}')
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} diferencias; ejecuta con --reconstruir para corregirlas')
+            self.stdout.write(self.style.SUCCESS('Cortes verificados sin diferencias'))
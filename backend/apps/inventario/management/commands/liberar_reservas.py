@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.inventario.services import liberar_reservas_vencidas, reconciliar_reservado
+
+
+class Command(BaseCommand):
+    help = "Libera las reservas de stock vencidas de pedidos sin pagar"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas a liberar por iteración')
+        parser.add_argument('--espera', type=float, default=300.0, help='Segundos de espera cuando no hay reservas vencidas')
+        parser.add_argument('--una-vez', action='store_true', help='Libera lo vencido y termina (para cron)')
+        parser.add_argument(
+            '--reconciliar', action='store_true',
+            help='Antes de empezar, recalcula Refaccion.reservado desde las reservas activas',
+        )
+
+    def handle(self, *args, **options):
+        if options['reconciliar']:
+            self.stdout.write(f'{reconciliar_reservado()} refacciones corregidas')
+        while True:
+            liberadas = liberar_reservas_vencidas(limite=options['lote'])
+            if liberadas:
+                self.stdout.write(f'{liberadas} reservas liberadas')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['espera'])
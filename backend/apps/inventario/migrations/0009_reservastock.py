@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_inventario_observaciones'),
+        ('pedidos', '0004_pedido_direccion_snapshot_pedido_guest_email_and_more'),
+        ('productos', '0012_refaccion_marca_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('ACT', 'Activa'), ('CON', 'Consumida'), ('LIB', 'Liberada')], default='ACT', max_length=3)),
+                ('expira_en', models.DateTimeField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='pedidos.pedido')),
+                ('refaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='productos.refaccion')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'indexes': [models.Index(condition=models.Q(('estado', 'ACT')), fields=['refaccion', 'expira_en'], name='inventario_reserva_activa_idx'), models.Index(fields=['estado', 'expira_en'], name='inventario__estado_bc9aa9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_reservastock'),
+        ('productos', '0013_refaccion_reservado_disponible'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteInventario',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField()),
+                ('existencias', models.IntegerField(default=0)),
+                ('costo_unitario', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='productos.refaccion')),
+            ],
+            options={
+                'verbose_name': 'Corte de inventario',
+                'verbose_name_plural': 'Cortes de inventario',
+                'indexes': [models.Index(fields=['refaccion', 'fecha'], name='inventario__refacci_0aecd6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'refaccion'), name='inventario_corte_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_corteinventario'),
+        ('productos', '0013_refaccion_reservado_disponible'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['fecha', 'id'], name='inventario__fecha_42c7b2_idx'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.db.models import F
 from django.core.exceptions import ValidationError
@@ -33,8 +33,8 @@ class Inventario(models.Model):
         if self.cantidad is None or self.cantidad <= 0:
             raise ValidationError("La cantidad debe ser mayor a cero.")
         if self.tipo_movimiento == self.TipoMovimientoChoices.SALIDA and self.refaccion_id:
-            # Validación preventiva de stock
-            if self.cantidad > self.refaccion.existencias:
+            # Validación preventiva de stock: lo apartado por pedidos sin pagar no sale
+            if self.cantidad > self.refaccion.disponible:
                 raise ValidationError("Stock insuficiente para la salida.")
 
     def save(self, *args, **kwargs):
@@ -44,7 +44,9 @@ class Inventario(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['refaccion', 'fecha'])
+            models.Index(fields=['refaccion', 'fecha']),
+            # Paginación por llave de la bitácora
+            models.Index(fields=['fecha', 'id']),
         ]
 
 @receiver(post_save, sender=Inventario)
@@ -55,3 +57,91 @@ def post_save_receiver(sender, instance, created, **kwargs):
     # Actualización atómica para evitar condiciones de carrera
     Refaccion.objects.filter(pk=instance.refaccion_id).update(existencias=F('existencias') + delta)
 
+
+
+class ReservaStock(models.Model):
+    """Apartado temporal de existencias para un pedido aún no pagado.
+
+    Se crea en el checkout y deja de contar al surtirse el pedido (CONSUMIDA),
+    al cancelarse o al liberarse por vencida (LIBERADA). Una reserva activa
+    vencida sigue descontada de Refaccion.disponible hasta que el comando
+    `liberar_reservas` (o el barrido previo a una salida) la libera.
+    """
+
+    class EstadoChoices(models.TextChoices):
+        ACTIVA = 'ACT', _('Activa')
+        CONSUMIDA = 'CON', _('Consumida')
+        LIBERADA = 'LIB', _('Liberada')
+
+    id = models.BigAutoField(primary_key=True)
+    refaccion = models.ForeignKey(Refaccion, on_delete=models.CASCADE, related_name='reservas')
+    pedido = models.ForeignKey('pedidos.Pedido', on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=3, choices=EstadoChoices.choices, default=EstadoChoices.ACTIVA)
+    expira_en = models.DateTimeField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        indexes = [
+            # Disponibilidad: suma de reservas activas vigentes por refacción
+            models.Index(
+                fields=['refaccion', 'expira_en'],
+                condition=models.Q(estado='ACT'),
+                name='inventario_reserva_activa_idx',
+            ),
+            models.Index(fields=['estado', 'expira_en']),
+        ]
+
+    def __str__(self):
+        return f"Reserva {self.refaccion_id} x{self.cantidad} (pedido {self.pedido_id}) - {self.get_estado_display()}"
+
+
+class CorteInventario(models.Model):
+    """Foto de las existencias de una refacción al inicio de un mes.
+
+    `existencias` es la suma de todos los movimientos con fecha < `fecha`; para
+    conocer el stock en cualquier instante basta partir del corte anterior más
+    cercano y sumar solo los movimientos posteriores (ver services.stock_en).
+    `costo_unitario` es el precio de la última ENTRADA antes del corte.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    refaccion = models.ForeignKey(Refaccion, on_delete=models.CASCADE, related_name='cortes')
+    fecha = models.DateTimeField()
+    existencias = models.IntegerField(default=0)
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Corte de inventario'
+        verbose_name_plural = 'Cortes de inventario'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'refaccion'], name='inventario_corte_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['refaccion', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"Corte {self.fecha:%Y-%m-%d} - {self.refaccion_id}: {self.existencias}"
+
+
+@receiver(pre_save, sender=Inventario)
+def ajustar_cortes_al_editar_movimiento(sender, instance, **kwargs):
+    # Los movimientos no deberían editarse, pero el endpoint lo permite: los cortes
+    # posteriores se corrigen con la diferencia para no romper la reproducción.
+    if instance.pk is None:
+        return
+    from apps.inventario.services import ajustar_cortes_por_movimiento
+    anterior = Inventario.objects.filter(pk=instance.pk).first()
+    if anterior is not None:
+        ajustar_cortes_por_movimiento(anterior, signo=-1)
+        ajustar_cortes_por_movimiento(instance, signo=1, fecha=anterior.fecha)
+
+
+@receiver(post_delete, sender=Inventario)
+def ajustar_cortes_al_borrar_movimiento(sender, instance, **kwargs):
+    from apps.inventario.services import ajustar_cortes_por_movimiento
+    ajustar_cortes_por_movimiento(instance, signo=-1)
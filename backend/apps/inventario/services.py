@@ -1,14 +1,32 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
 from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, PositiveIntegerField, Q, Sum, When
+from django.utils import timezone
+
+from apps.inventario.models import CorteInventario, Inventario, ReservaStock
+from apps.productos.models import Refaccion
 
-from apps.inventario.models import Inventario
-from apps.productos.models import Marca, Refaccion
+
+def _bloquear_refaccion(pk) -> Refaccion:
+    """SELECT ... FOR UPDATE de la refacción trayendo marca y categoría con JOIN."""
+    return (
+        Refaccion.objects
+        .select_related('marca', 'categoria')
+        .select_for_update(of=('self',))
+        .get(pk=pk)
+    )
 
 
 def registrar_entrada_inicial_refaccion(refaccion: Refaccion, cantidad_inicial: int) -> None:
     """Crea un movimiento ENTRADA inicial para una refacción recién creada.
 
     - Evita el doble conteo llevando existencias a 0 antes de crear la entrada.
-    - Resuelve la relación de marca (FK) a partir del nombre en la refacción.
+    - La marca se toma directamente de la FK de la refacción.
     """
     if not cantidad_inicial or cantidad_inicial <= 0:
         return
@@ -17,21 +35,11 @@ def registrar_entrada_inicial_refaccion(refaccion: Refaccion, cantidad_inicial:
         # Llevar existencias a 0 para evitar doble conteo
         Refaccion.objects.filter(pk=refaccion.pk).update(existencias=0)
 
-        # Resolver Marca (Refaccion.marca es CharField)
-        marca_obj = None
-        try:
-            if isinstance(refaccion.marca, str):
-                marca_obj, _ = Marca.objects.get_or_create(nombre=refaccion.marca)
-            else:
-                marca_obj = refaccion.marca
-        except Exception:
-            marca_obj = None
-
         Inventario.objects.create(
             refaccion=refaccion,
             cantidad=cantidad_inicial,
             precio_unitario=refaccion.precio,
-            marca=marca_obj,
+            marca=refaccion.marca,
             categoria=refaccion.categoria,
             tipo_movimiento=Inventario.TipoMovimientoChoices.ENTRADA,
         )
@@ -50,25 +58,24 @@ def registrar_salida_por_compra(refaccion: Refaccion, cantidad: int, precio_unit
         raise ValueError("La cantidad debe ser mayor a cero.")
 
     with transaction.atomic():
-        # 1. Bloqueo pesimista (Esto está perfecto en tu código original)
-        ref = Refaccion.objects.select_for_update().get(pk=refaccion.pk)
-        
-        # Resolver marca (Tu lógica original)
-        marca_obj = None
-        try:
-            if isinstance(ref.marca, str):
-                marca_obj, _ = Marca.objects.get_or_create(nombre=ref.marca)
-            else:
-                marca_obj = ref.marca
-        except Exception:
-            marca_obj = None
+        # Los apartados vencidos no deben frenar la venta
+        liberar_reservas_vencidas(refaccion_ids=[refaccion.pk])
+        # 1. Bloqueo pesimista; la marca y la categoría llegan en la misma consulta
+        # (solo se bloquea la fila de la refacción)
+        ref = _bloquear_refaccion(refaccion.pk)
+        # Lo apartado por pedidos sin pagar no se puede vender en mostrador
+        if cantidad > ref.disponible:
+            raise ValueError(
+                f"Stock insuficiente para {ref.nombre}: disponible {ref.disponible} "
+                f"({ref.reservado} apartadas por pedidos sin pagar), solicitado {cantidad}."
+            )
 
         # 2. Instanciar el objeto SIN guardarlo todavía
         movimiento = Inventario(
             refaccion=ref,
             cantidad=cantidad,
             precio_unitario=precio_unitario if precio_unitario is not None else ref.precio,
-            marca=marca_obj,
+            marca=ref.marca,
             categoria=ref.categoria,
             tipo_movimiento=Inventario.TipoMovimientoChoices.SALIDA,
         )
@@ -94,28 +101,97 @@ def registrar_salida_por_compra(refaccion: Refaccion, cantidad: int, precio_unit
         return movimiento
 
 
+def _ajustar_existencias(deltas):
+    """Suma {refaccion_id: delta} a Refaccion.existencias en un solo UPDATE ... CASE."""
+    deltas = {refaccion_id: delta for refaccion_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Refaccion.objects.filter(pk__in=deltas).update(
+        existencias=Case(
+            *[When(pk=refaccion_id, then=F('existencias') + delta) for refaccion_id, delta in deltas.items()],
+            default=F('existencias'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def registrar_salidas_en_lote(lineas, apartado=None) -> list:
+    """Registra varias SALIDAS de inventario (p. ej. un pedido completo) con un número fijo de consultas.
+
+    `lineas` es una lista de (refaccion_id, cantidad, precio_unitario | None).
+    - Bloquea todas las refacciones en una sola consulta y en orden de pk (evita deadlocks).
+    - Valida en memoria contra Refaccion.disponible, sumando las líneas repetidas de una misma
+      refacción. `apartado` ({refaccion_id: cantidad}) es lo que el propio llamador tiene
+      reservado y puede tomar además (el pedido que se surte, ver reservado_por_pedido).
+    - Inserta los movimientos con bulk_create y descuenta las existencias con un solo UPDATE ... CASE
+      (bulk_create no dispara post_save, así que no hay doble descuento).
+    Regresa los movimientos en el mismo orden que `lineas`.
+    """
+    lineas = list(lineas)
+    if not lineas:
+        return []
+
+    totales = {}
+    for refaccion_id, cantidad, _ in lineas:
+        if not cantidad or cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor a cero.")
+        totales[refaccion_id] = totales.get(refaccion_id, 0) + cantidad
+
+    with transaction.atomic():
+        if apartado is None:
+            # Salida ajena a un pedido: los apartados vencidos no deben frenarla
+            liberar_reservas_vencidas(refaccion_ids=list(totales))
+        apartado = apartado or {}
+        refacciones = {
+            ref.pk: ref
+            for ref in Refaccion.objects
+            .select_related('marca', 'categoria')
+            .select_for_update(of=('self',))
+            .filter(pk__in=totales)
+            .order_by('pk')
+        }
+        for refaccion_id, total in totales.items():
+            ref = refacciones.get(refaccion_id)
+            if ref is None:
+                raise ValueError(f"La refacción {refaccion_id} no existe.")
+            disponible = ref.disponible + min(apartado.get(refaccion_id, 0), ref.reservado)
+            if total > disponible:
+                raise ValueError(
+                    f"Stock insuficiente para {ref.nombre}: disponible {disponible}, solicitado {total}."
+                )
+
+        movimientos = Inventario.objects.bulk_create([
+            Inventario(
+                refaccion=refacciones[refaccion_id],
+                cantidad=cantidad,
+                precio_unitario=precio_unitario if precio_unitario is not None else refacciones[refaccion_id].precio,
+                marca=refacciones[refaccion_id].marca,
+                categoria=refacciones[refaccion_id].categoria,
+                tipo_movimiento=Inventario.TipoMovimientoChoices.SALIDA,
+            )
+            for refaccion_id, cantidad, precio_unitario in lineas
+        ])
+
+        _ajustar_existencias({refaccion_id: -total for refaccion_id, total in totales.items()})
+        for refaccion_id, total in totales.items():
+            refacciones[refaccion_id].existencias -= total
+
+        return movimientos
+
+
 def registrar_entrada_manual(refaccion: Refaccion, cantidad: int, precio_unitario=None) -> Inventario:
     """Registra una ENTRADA manual de inventario (p. ej., reposición)."""
     if not cantidad or cantidad <= 0:
         raise ValueError("La cantidad debe ser mayor a cero.")
 
     with transaction.atomic():
-        ref = Refaccion.objects.select_for_update().get(pk=refaccion.pk)
-        # Resolver marca
-        marca_obj = None
-        try:
-            if isinstance(ref.marca, str):
-                marca_obj, _ = Marca.objects.get_or_create(nombre=ref.marca)
-            else:
-                marca_obj = ref.marca
-        except Exception:
-            marca_obj = None
+        ref = _bloquear_refaccion(refaccion.pk)
 
         movimiento = Inventario.objects.create(
             refaccion=ref,
             cantidad=cantidad,
             precio_unitario=precio_unitario if precio_unitario is not None else ref.precio,
-            marca=marca_obj,
+            marca=ref.marca,
             categoria=ref.categoria,
             tipo_movimiento=Inventario.TipoMovimientoChoices.ENTRADA,
         )
@@ -130,3 +206,472 @@ def registrar_entrada_por_devolucion(refaccion: Refaccion, cantidad: int, precio
     """Registra una ENTRADA por devolución de una compra."""
     return registrar_entrada_manual(refaccion=refaccion, cantidad=cantidad, precio_unitario=precio_unitario)
 
+
+# ── Importación masiva de movimientos ──────────────────────────────────────────
+# Un archivo CSV o JSON lines se lee en flujo y se procesa por lotes: cada lote
+# bloquea sus refacciones en una consulta, valida en memoria (con el saldo
+# corriente de cada refacción), inserta con bulk_create y ajusta existencias con
+# un solo UPDATE, todo en una transacción por lote. Las filas inválidas no
+# detienen la importación: se reportan con su número de fila.
+
+LOTE_IMPORTACION = 500
+TIPOS_IMPORTACION = {
+    'ENT': Inventario.TipoMovimientoChoices.ENTRADA,
+    'ENTRADA': Inventario.TipoMovimientoChoices.ENTRADA,
+    'SAL': Inventario.TipoMovimientoChoices.SALIDA,
+    'SALIDA': Inventario.TipoMovimientoChoices.SALIDA,
+}
+
+
+ERROR_CODIFICACION = 'El archivo no está en UTF-8 (guárdalo como "CSV UTF-8").'
+
+
+def leer_csv(archivo):
+    """Genera (número de fila, dict) de un CSV con encabezados; `archivo` puede ser binario o de texto.
+
+    Si el archivo no es UTF-8 la lectura se detiene: esa fila y las siguientes se
+    reportan como un solo error (lo anterior ya se importó).
+    """
+    if isinstance(archivo.read(0), bytes):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    numero = 1
+    try:
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            yield numero, fila
+    except UnicodeDecodeError:
+        yield numero + 1, {'__error__': f'{ERROR_CODIFICACION} No se leyó de esta fila en adelante.'}
+
+
+def leer_jsonl(archivo):
+    """Genera (número de línea, dict) de un archivo JSON lines; las líneas vacías se ignoran."""
+    for numero, linea in enumerate(archivo, start=1):
+        if isinstance(linea, bytes):
+            try:
+                linea = linea.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                yield numero, {'__error__': ERROR_CODIFICACION}
+                continue
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            fila = None
+        yield numero, fila if isinstance(fila, dict) else {'__error__': 'La línea no es un objeto JSON válido.'}
+
+
+# Límites de las columnas: una celda fuera de rango haría fallar todo el lote en Postgres
+MAX_CANTIDAD = 2147483647  # PositiveIntegerField
+_PRECIO_UNITARIO = Inventario._meta.get_field('precio_unitario')
+
+
+def _precio_unitario(valor):
+    """Decimal finito, no negativo y que cabe en Inventario.precio_unitario; si no, ValueError."""
+    try:
+        precio = Decimal(valor)
+    except InvalidOperation:
+        raise ValueError('precio_unitario no es un número válido.')
+    # NaN e Infinity sí se leen como Decimal, pero no se pueden comparar ni guardar
+    if not precio.is_finite():
+        raise ValueError('precio_unitario no es un número válido.')
+    enteros = _PRECIO_UNITARIO.max_digits - _PRECIO_UNITARIO.decimal_places
+    if precio < 0 or precio >= 10 ** enteros or precio != round(precio, _PRECIO_UNITARIO.decimal_places):
+        raise ValueError(
+            f'precio_unitario debe ser positivo, menor a {10 ** enteros} '
+            f'y con máximo {_PRECIO_UNITARIO.decimal_places} decimales.'
+        )
+    return precio
+
+
+def _normalizar_fila(fila):
+    """Valida los campos de una fila sin tocar la base; lanza ValueError con el motivo."""
+    if '__error__' in fila:
+        raise ValueError(fila['__error__'])
+    tipo = TIPOS_IMPORTACION.get(str(fila.get('tipo_movimiento') or '').strip().upper())
+    if tipo is None:
+        raise ValueError('tipo_movimiento debe ser ENT o SAL.')
+    try:
+        cantidad = int(str(fila.get('cantidad') or '').strip())
+    except ValueError:
+        raise ValueError('cantidad debe ser un número entero.')
+    if cantidad <= 0:
+        raise ValueError('La cantidad debe ser mayor a cero.')
+    if cantidad > MAX_CANTIDAD:
+        raise ValueError(f'cantidad no puede ser mayor a {MAX_CANTIDAD}.')
+    precio = str(fila.get('precio_unitario') or '').strip()
+    precio = _precio_unitario(precio) if precio else None
+
+    refaccion = str(fila.get('refaccion') or '').strip()
+    codigo_parte = str(fila.get('codigo_parte') or '').strip()
+    if refaccion:
+        if not refaccion.isdigit():
+            raise ValueError('refaccion debe ser un id numérico.')
+        llave = ('id', int(refaccion))
+    elif codigo_parte:
+        llave = ('codigo_parte', codigo_parte)
+    else:
+        raise ValueError('Falta refaccion (id) o codigo_parte.')
+    return llave, tipo, cantidad, precio, str(fila.get('observaciones') or '')
+
+
+def _importar_lote(lote, errores):
+    """Escribe un lote [(número, llave, tipo, cantidad, precio, observaciones)]; regresa cuántos movimientos creó."""
+    ids = {llave[1] for _, llave, *_ in lote if llave[0] == 'id'}
+    codigos = {llave[1] for _, llave, *_ in lote if llave[0] == 'codigo_parte'}
+
+    with transaction.atomic():
+        liberar_reservas_vencidas(
+            refaccion_ids=Refaccion.objects.filter(Q(pk__in=ids) | Q(codigo_parte__in=codigos)).values('pk')
+        )
+        refacciones = list(
+            Refaccion.objects
+            .select_related('marca', 'categoria')
+            .select_for_update(of=('self',))
+            .filter(Q(pk__in=ids) | Q(codigo_parte__in=codigos))
+            .order_by('pk')
+        )
+        por_llave = {('id', ref.pk): ref for ref in refacciones}
+        por_llave.update({('codigo_parte', ref.codigo_parte): ref for ref in refacciones})
+        # Saldo corriente de lo que se puede sacar: lo apartado por pedidos sin pagar no cuenta
+        saldos = {ref.pk: ref.disponible for ref in refacciones}
+
+        movimientos, deltas = [], {}
+        for numero, llave, tipo, cantidad, precio, observaciones in lote:
+            ref = por_llave.get(llave)
+            if ref is None:
+                errores.append({'fila': numero, 'error': f'La refacción {llave[1]} no existe.'})
+                continue
+            delta = cantidad if tipo == Inventario.TipoMovimientoChoices.ENTRADA else -cantidad
+            if saldos[ref.pk] + delta < 0:
+                errores.append({
+                    'fila': numero,
+                    'error': f'Stock insuficiente para {ref.nombre}: disponible {saldos[ref.pk]}, solicitado {cantidad}.',
+                })
+                continue
+            saldos[ref.pk] += delta
+            deltas[ref.pk] = deltas.get(ref.pk, 0) + delta
+            movimientos.append(Inventario(
+                refaccion=ref,
+                cantidad=cantidad,
+                precio_unitario=precio if precio is not None else ref.precio,
+                marca=ref.marca,
+                categoria=ref.categoria,
+                tipo_movimiento=tipo,
+                observaciones=observaciones,
+            ))
+
+        # bulk_create no dispara post_save: las existencias se ajustan aquí una sola vez
+        Inventario.objects.bulk_create(movimientos)
+        _ajustar_existencias(deltas)
+    return len(movimientos)
+
+
+def importar_movimientos(filas, tamano_lote=LOTE_IMPORTACION):
+    """Importa (número de fila, dict) con columnas refaccion | codigo_parte, tipo_movimiento,
+    cantidad y opcionalmente precio_unitario y observaciones.
+
+    Regresa {'procesadas', 'creadas', 'errores': [{'fila', 'error'}]}.
+    """
+    procesadas, creadas, errores, lote = 0, 0, [], []
+    for numero, fila in filas:
+        procesadas += 1
+        try:
+            lote.append((numero, *_normalizar_fila(fila)))
+        except ValueError as e:
+            errores.append({'fila': numero, 'error': str(e)})
+        if len(lote) >= tamano_lote:
+            creadas += _importar_lote(lote, errores)
+            lote = []
+    if lote:
+        creadas += _importar_lote(lote, errores)
+    errores.sort(key=lambda error: error['fila'])
+    return {'procesadas': procesadas, 'creadas': creadas, 'errores': errores}
+
+
+# ── Reservas de stock ───────────────────────────────────────────────────────────
+# Un pedido CREADO aparta sus piezas durante RESERVA_TTL (lo mismo que MisPedidosView
+# sigue mostrando un pedido sin pagar). Cada cambio en las reservas activas se refleja
+# en Refaccion.reservado con un solo UPDATE ... CASE, así que Refaccion.disponible
+# (existencias - reservado) siempre está al día sin recalcular nada.
+
+RESERVA_TTL = timedelta(days=3)
+
+
+def _ajustar_reservado(deltas):
+    """Suma {refaccion_id: delta} a Refaccion.reservado en un solo UPDATE."""
+    deltas = {refaccion_id: delta for refaccion_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Refaccion.objects.filter(pk__in=deltas).update(
+        reservado=Case(
+            *[When(pk=refaccion_id, then=F('reservado') + delta) for refaccion_id, delta in deltas.items()],
+            default=F('reservado'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def reservar_stock(pedido, cantidades, ttl=RESERVA_TTL):
+    """Aparta {refaccion_id: cantidad} para el pedido (un INSERT y un UPDATE).
+
+    Quien llama debe haber validado Refaccion.disponible con las refacciones bloqueadas.
+    """
+    expira_en = timezone.now() + ttl
+    with transaction.atomic(savepoint=False):
+        reservas = ReservaStock.objects.bulk_create([
+            ReservaStock(refaccion_id=refaccion_id, pedido=pedido, cantidad=cantidad, expira_en=expira_en)
+            for refaccion_id, cantidad in cantidades.items()
+        ])
+        _ajustar_reservado(cantidades)
+    return reservas
+
+
+def _cerrar_reservas(reservas, estado):
+    """Pasa reservas ACTIVAS a `estado` y descuenta su cantidad de Refaccion.reservado."""
+    with transaction.atomic(savepoint=False):
+        filas = list(
+            reservas.filter(estado=ReservaStock.EstadoChoices.ACTIVA)
+            .select_for_update()
+            .values_list('id', 'refaccion_id', 'cantidad')
+        )
+        if not filas:
+            return 0
+        deltas = {}
+        for _, refaccion_id, cantidad in filas:
+            deltas[refaccion_id] = deltas.get(refaccion_id, 0) - cantidad
+        ReservaStock.objects.filter(id__in=[fila[0] for fila in filas]).update(estado=estado)
+        _ajustar_reservado(deltas)
+    return len(filas)
+
+
+def reservado_por_pedido(pedido_id):
+    """{refaccion_id: cantidad} apartado por el pedido en reservas activas, bloqueándolas
+    (así ningún barrido las libera mientras el pedido se surte)."""
+    reservado = {}
+    filas = (
+        ReservaStock.objects.filter(pedido_id=pedido_id, estado=ReservaStock.EstadoChoices.ACTIVA)
+        .select_for_update()
+        .values_list('refaccion_id', 'cantidad')
+    )
+    for refaccion_id, cantidad in filas:
+        reservado[refaccion_id] = reservado.get(refaccion_id, 0) + cantidad
+    return reservado
+
+
+def consumir_reservas(pedido_id):
+    """Las reservas del pedido dejan de contar porque su stock ya salió del inventario."""
+    return _cerrar_reservas(ReservaStock.objects.filter(pedido_id=pedido_id), ReservaStock.EstadoChoices.CONSUMIDA)
+
+
+def liberar_reservas(pedido_id):
+    """Devuelve al disponible lo apartado por un pedido (p. ej. al cancelarlo)."""
+    return _cerrar_reservas(ReservaStock.objects.filter(pedido_id=pedido_id), ReservaStock.EstadoChoices.LIBERADA)
+
+
+def liberar_reservas_vencidas(limite=1000, refaccion_ids=None):
+    """Libera hasta `limite` reservas vencidas (opcionalmente solo de ciertas refacciones)."""
+    vencidas = ReservaStock.objects.filter(expira_en__lte=timezone.now())
+    if refaccion_ids is not None:
+        vencidas = vencidas.filter(refaccion_id__in=refaccion_ids)
+    ids = list(
+        vencidas.filter(estado=ReservaStock.EstadoChoices.ACTIVA)
+        .order_by('expira_en')
+        .values_list('id', flat=True)[:limite]
+    )
+    if not ids:
+        return 0
+    return _cerrar_reservas(ReservaStock.objects.filter(id__in=ids), ReservaStock.EstadoChoices.LIBERADA)
+
+
+def reconciliar_reservado():
+    """Recalcula Refaccion.reservado desde las reservas activas; regresa cuántas refacciones corrigió."""
+    with transaction.atomic():
+        esperado = dict(
+            ReservaStock.objects.filter(estado=ReservaStock.EstadoChoices.ACTIVA)
+            .order_by()
+            .values('refaccion_id')
+            .annotate(total=Sum('cantidad'))
+            .values_list('refaccion_id', 'total')
+        )
+        actual = dict(
+            Refaccion.objects.select_for_update()
+            .filter(Q(reservado__gt=0) | Q(pk__in=esperado))
+            .values_list('pk', 'reservado')
+        )
+        deltas = {pk: esperado.get(pk, 0) - reservado for pk, reservado in actual.items()}
+        _ajustar_reservado(deltas)
+    return sum(1 for delta in deltas.values() if delta)
+
+
+# ── Cortes (checkpoints) de inventario ─────────────────────────────────────────
+# Inventario es una bitácora de solo inserción. Al inicio de cada mes (hora local)
+# se guarda un CorteInventario por refacción; el stock o la valuación en una fecha
+# D se obtiene del corte más reciente <= D más los movimientos entre el corte y D,
+# en lugar de sumar toda la bitácora.
+
+# Un corte solo se genera cuando ya pasó este margen, para que ninguna transacción
+# abierta alcance a registrar movimientos anteriores a él
+MARGEN_CORTE = timedelta(hours=1)
+
+_CANTIDAD_CON_SIGNO = Case(
+    When(tipo_movimiento=Inventario.TipoMovimientoChoices.ENTRADA, then=F('cantidad')),
+    default=-F('cantidad'),
+    output_field=IntegerField(),
+)
+
+
+def _instante(fecha):
+    """Un `date` se interpreta como el cierre de ese día (inicio del siguiente, hora local)."""
+    if isinstance(fecha, datetime):
+        return fecha if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+
+def _inicio_de_mes(instante):
+    local = timezone.localtime(instante)
+    return timezone.make_aware(datetime.combine(local.date().replace(day=1), time.min))
+
+
+def _mes_siguiente(corte):
+    local = timezone.localtime(corte).date()
+    siguiente = (local.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return timezone.make_aware(datetime.combine(siguiente, time.min))
+
+
+def _delta_movimientos(desde, hasta, refaccion_ids=None, con_costo=True):
+    """{refaccion_id: (cantidad con signo, costo de la última entrada o None)} con desde <= fecha < hasta."""
+    movimientos = Inventario.objects.filter(fecha__lt=hasta)
+    if desde is not None:
+        movimientos = movimientos.filter(fecha__gte=desde)
+    if refaccion_ids is not None:
+        movimientos = movimientos.filter(refaccion_id__in=refaccion_ids)
+
+    deltas = {
+        refaccion_id: [total, None]
+        for refaccion_id, total in movimientos.order_by().values('refaccion_id')
+        .annotate(total=Sum(_CANTIDAD_CON_SIGNO)).values_list('refaccion_id', 'total')
+    }
+    if not con_costo:
+        return {refaccion_id: tuple(valores) for refaccion_id, valores in deltas.items()}
+    entradas = (
+        movimientos.filter(tipo_movimiento=Inventario.TipoMovimientoChoices.ENTRADA)
+        .order_by('refaccion_id', 'fecha', 'id')
+        .values_list('refaccion_id', 'precio_unitario')
+    )
+    for refaccion_id, precio in entradas.iterator():
+        deltas[refaccion_id][1] = precio
+    return {refaccion_id: tuple(valores) for refaccion_id, valores in deltas.items()}
+
+
+def _corte_anterior(instante):
+    """Fecha del corte más reciente <= instante (o None si aún no hay cortes)."""
+    return CorteInventario.objects.filter(fecha__lte=instante).aggregate(ultimo=Max('fecha'))['ultimo']
+
+
+def inventario_en(fecha, refaccion_ids=None):
+    """{refaccion_id: (existencias, costo_unitario)} en `fecha`, partiendo del corte más cercano."""
+    instante = _instante(fecha)
+    corte = _corte_anterior(instante)
+    resultado = {}
+    if corte is not None:
+        base = CorteInventario.objects.filter(fecha=corte)
+        if refaccion_ids is not None:
+            base = base.filter(refaccion_id__in=refaccion_ids)
+        for refaccion_id, existencias, costo in base.values_list('refaccion_id', 'existencias', 'costo_unitario'):
+            resultado[refaccion_id] = (existencias, costo)
+    for refaccion_id, (delta, costo) in _delta_movimientos(corte, instante, refaccion_ids).items():
+        existencias, costo_base = resultado.get(refaccion_id, (0, Decimal('0')))
+        resultado[refaccion_id] = (existencias + delta, costo if costo is not None else costo_base)
+    return resultado
+
+
+def stock_en(refaccion_id, fecha):
+    """Existencias de una refacción en `fecha` (datetime, o date = al cierre de ese día)."""
+    return inventario_en(fecha, refaccion_ids=[refaccion_id]).get(refaccion_id, (0, None))[0]
+
+
+def valuacion_en(fecha):
+    """Valuación del inventario en `fecha`: total de piezas y valor a costo de la última entrada."""
+    instante = _instante(fecha)
+    corte = _corte_anterior(instante)
+    if corte is not None and corte == instante:
+        # Cierre de mes exacto: basta con sumar el corte
+        totales = CorteInventario.objects.filter(fecha=corte).aggregate(piezas=Sum('existencias'), valor=Sum('valor'))
+        piezas, valor = totales['piezas'] or 0, totales['valor'] or Decimal('0')
+    else:
+        lineas = inventario_en(instante).values()
+        piezas = sum(existencias for existencias, _ in lineas)
+        valor = sum((existencias * costo for existencias, costo in lineas), Decimal('0'))
+    return {'fecha': instante, 'corte': corte, 'piezas': piezas, 'valor': valor}
+
+
+def _filas_de_corte(corte, inventario):
+    return [
+        CorteInventario(
+            refaccion_id=refaccion_id,
+            fecha=corte,
+            existencias=existencias,
+            costo_unitario=costo,
+            valor=existencias * costo,
+        )
+        for refaccion_id, (existencias, costo) in inventario.items()
+    ]
+
+
+def generar_cortes(hasta=None):
+    """Genera los cortes mensuales que falten hasta `hasta` (por omisión, ahora - MARGEN_CORTE).
+
+    Cada corte se construye a partir del anterior sumando solo los movimientos del mes.
+    Regresa el número de cortes (meses) creados.
+    """
+    limite = (hasta if hasta is not None else timezone.now()) - MARGEN_CORTE
+    ultimo = CorteInventario.objects.aggregate(ultimo=Max('fecha'))['ultimo']
+    if ultimo is not None:
+        corte = _mes_siguiente(ultimo)
+    else:
+        primero = Inventario.objects.aggregate(primero=Min('fecha'))['primero']
+        if primero is None:
+            return 0
+        corte = _mes_siguiente(primero)
+
+    creados = 0
+    while corte <= limite:
+        with transaction.atomic():
+            CorteInventario.objects.bulk_create(_filas_de_corte(corte, inventario_en(corte)), batch_size=1000)
+        creados += 1
+        corte = _mes_siguiente(corte)
+    return creados
+
+
+def reconstruir_cortes(hasta=None):
+    """Borra todos los cortes y los vuelve a generar desde la bitácora."""
+    CorteInventario.objects.all().delete()
+    return generar_cortes(hasta=hasta)
+
+
+def verificar_cortes():
+    """Compara cada corte contra la suma completa de la bitácora.
+
+    Regresa una lista de (fecha del corte, refaccion_id, existencias guardadas, esperadas).
+    """
+    diferencias = []
+    fechas = CorteInventario.objects.order_by('fecha').values_list('fecha', flat=True).distinct()
+    for corte in fechas:
+        esperado = {refaccion_id: delta for refaccion_id, (delta, _) in _delta_movimientos(None, corte, con_costo=False).items()}
+        guardado = dict(CorteInventario.objects.filter(fecha=corte).values_list('refaccion_id', 'existencias'))
+        for refaccion_id in sorted(esperado.keys() | guardado.keys()):
+            if esperado.get(refaccion_id, 0) != guardado.get(refaccion_id, 0):
+                diferencias.append((corte, refaccion_id, guardado.get(refaccion_id), esperado.get(refaccion_id, 0)))
+    return diferencias
+
+
+def ajustar_cortes_por_movimiento(movimiento, signo, fecha=None):
+    """Suma (signo=1) o resta (signo=-1) un movimiento a los cortes posteriores a su fecha."""
+    fecha = fecha or movimiento.fecha
+    if fecha is None or not movimiento.refaccion_id:
+        return
+    delta = movimiento.cantidad if movimiento.tipo_movimiento == Inventario.TipoMovimientoChoices.ENTRADA else -movimiento.cantidad
+    CorteInventario.objects.filter(refaccion_id=movimiento.refaccion_id, fecha__gt=fecha).update(
+        existencias=F('existencias') + signo * delta,
+        valor=(F('existencias') + signo * delta) * F('costo_unitario'),
+    )
@@ -1,12 +1,19 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from apps.productos.models import Refaccion, Categoria
-from apps.inventario.models import Inventario
-from apps.inventario.services import registrar_salida_por_compra
+from apps.productos.models import Marca, Refaccion, Categoria
+from apps.inventario.models import CorteInventario, Inventario
+from apps.inventario.services import (
+    generar_cortes, importar_movimientos, registrar_salida_por_compra, stock_en, valuacion_en, verificar_cortes,
+)
 
 
 class InventarioFlowsTest(TestCase):
@@ -15,7 +22,7 @@ class InventarioFlowsTest(TestCase):
         self.user = self.User.objects.create_user(username='u', password='p')
         self.categoria = Categoria.objects.create(nombre='Cat', descripcion='')
         self.ref = Refaccion.objects.create(
-            codigo_parte='X1', nombre='Ref', descripcion='', marca='MarcaX', categoria=self.categoria,
+            codigo_parte='X1', nombre='Ref', descripcion='', marca=Marca.objects.create(nombre='MarcaX'), categoria=self.categoria,
             precio=100, existencias=10, compatibilidad=''
         )
         self.client = APIClient()
@@ -49,4 +56,142 @@ class InventarioFlowsTest(TestCase):
         # Stock: 10 - 2 + 1 = 9
         self.assertEqual(self.ref.existencias, 9)
 
+    def test_salida_toma_marca_de_la_fk_sin_crear_marcas(self):
+        marcas = Marca.objects.count()
+        mov = registrar_salida_por_compra(self.ref, 1)
+        self.assertEqual(mov.marca.nombre, 'MarcaX')
+        self.assertEqual(Marca.objects.count(), marcas)
+
 # Create your tests here.
+
+
+class CortesInventarioTest(TestCase):
+    def setUp(self):
+        self.ref = Refaccion.objects.create(
+            codigo_parte='C1', nombre='Bomba', descripcion='', marca=Marca.objects.create(nombre='M'),
+            categoria=Categoria.objects.create(nombre='Cat', descripcion=''), precio=100, existencias=0, compatibilidad='',
+        )
+        self.movimientos = [
+            self._movimiento('ENT', 10, 80, datetime(2026, 1, 10)),
+            self._movimiento('SAL', 4, 100, datetime(2026, 1, 20)),
+            self._movimiento('ENT', 5, 90, datetime(2026, 2, 15)),
+            self._movimiento('SAL', 3, 100, datetime(2026, 3, 5)),
+        ]
+
+    def _movimiento(self, tipo, cantidad, precio, fecha):
+        self.ref.refresh_from_db()
+        mov = Inventario.objects.create(refaccion=self.ref, tipo_movimiento=tipo, cantidad=cantidad, precio_unitario=precio)
+        # fecha es auto_now_add: se fecha hacia atrás con update() (sin señales)
+        Inventario.objects.filter(pk=mov.pk).update(fecha=timezone.make_aware(fecha))
+        mov.refresh_from_db()
+        return mov
+
+    def test_cortes_mensuales_y_reproduccion_del_delta(self):
+        self.assertEqual(generar_cortes(hasta=timezone.make_aware(datetime(2026, 4, 10))), 3)
+        self.assertEqual(
+            list(CorteInventario.objects.order_by('fecha').values_list('existencias', 'costo_unitario')),
+            [(6, Decimal('80')), (11, Decimal('90')), (8, Decimal('90'))],
+        )
+        # Corte más cercano + movimientos posteriores, sin recorrer toda la bitácora
+        with self.assertNumQueries(4):
+            self.assertEqual(stock_en(self.ref.id, date(2026, 3, 10)), 8)
+        self.assertEqual(stock_en(self.ref.id, date(2026, 1, 15)), 10)
+        # Al cierre de mes basta con sumar el corte
+        with self.assertNumQueries(2):
+            valuacion = valuacion_en(date(2026, 3, 31))
+        self.assertEqual((valuacion['piezas'], valuacion['valor']), (8, Decimal('720')))
+        self.assertEqual(generar_cortes(hasta=timezone.make_aware(datetime(2026, 4, 10))), 0)
+
+    def test_borrar_un_movimiento_corrige_los_cortes(self):
+        generar_cortes(hasta=timezone.make_aware(datetime(2026, 4, 10)))
+        self.movimientos[1].delete()
+        self.assertEqual(verificar_cortes(), [])
+        self.assertEqual(stock_en(self.ref.id, date(2026, 3, 10)), 12)
+
+    def test_endpoint_historico_solo_admin(self):
+        client = APIClient()
+        res = client.get('/api/v1/inventario/historico/', {'fecha': '2026-03-10', 'refaccion': self.ref.id})
+        self.assertIn(res.status_code, (401, 403))
+        client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='x'))
+        res = client.get('/api/v1/inventario/historico/', {'fecha': '2026-03-10', 'refaccion': self.ref.id})
+        self.assertEqual(res.data['existencias'], 8)
+        self.assertEqual(client.get('/api/v1/inventario/historico/', {'fecha': 'ayer'}).status_code, 400)
+
+
+class ImportacionMovimientosTest(TestCase):
+    def setUp(self):
+        marca = Marca.objects.create(nombre='M')
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        self.refs = [
+            Refaccion.objects.create(
+                codigo_parte=f'P{i}', nombre=f'Ref {i}', descripcion='', marca=marca, categoria=categoria,
+                precio=50, existencias=2, compatibilidad='',
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='x'))
+
+    def test_lote_con_consultas_constantes(self):
+        filas = [(n, {'refaccion': self.refs[n % 3].id, 'tipo_movimiento': 'ENT', 'cantidad': 1}) for n in range(60)]
+        with self.assertNumQueries(6):  # savepoint, reservas vencidas, SELECT ... FOR UPDATE, INSERT, UPDATE, release
+            resultado = importar_movimientos(filas)
+        self.assertEqual((resultado['creadas'], resultado['errores']), (60, []))
+        self.assertEqual([r.existencias for r in Refaccion.objects.order_by('id')], [22, 22, 22])
+
+    def test_numeros_fuera_de_rango_son_error_de_fila(self):
+        filas = [
+            (n, {'refaccion': self.refs[0].id, 'tipo_movimiento': 'ENT', 'cantidad': cantidad, 'precio_unitario': precio})
+            for n, (cantidad, precio) in enumerate([
+                (1, 'NaN'), (1, 'Infinity'), (1, '1e20'), (1, '0.001'), (99999999999, ''), (1, '99999999.99'),
+            ], start=2)
+        ]
+        resultado = importar_movimientos(filas)
+        self.assertEqual(resultado['creadas'], 1)
+        self.assertEqual([e['fila'] for e in resultado['errores']], [2, 3, 4, 5, 6])
+
+    def test_csv_con_reporte_de_errores_por_fila(self):
+        contenido = (
+            'codigo_parte,refaccion,tipo_movimiento,cantidad,precio_unitario\n'
+            'P0,,ENT,5,40.50\n'
+            'P1,,SAL,3,\n'          # solo hay 2
+            ',%d,SAL,2,\n'          # saldo corriente: 2 - 2 = 0
+            'NOEXISTE,,ENT,1,\n'
+            'P2,,ENT,cero,\n'
+        ) % self.refs[2].id
+        archivo = SimpleUploadedFile('recepcion.csv', contenido.encode(), content_type='text/csv')
+        res = self.client.post('/api/v1/inventario/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data['procesadas'], res.data['creadas']), (5, 2))
+        self.assertEqual([e['fila'] for e in res.data['errores']], [3, 5, 6])
+        self.assertEqual(
+            list(Refaccion.objects.order_by('id').values_list('existencias', flat=True)), [7, 2, 0]
+        )
+        self.assertEqual(Inventario.objects.get(refaccion=self.refs[0]).precio_unitario, Decimal('40.50'))
+
+    def test_archivo_que_no_es_utf8_se_reporta(self):
+        contenido = 'codigo_parte,tipo_movimiento,cantidad,observaciones\nP0,ENT,1,recepción\n'.encode('latin-1')
+        archivo = SimpleUploadedFile('recepcion.csv', contenido, content_type='text/csv')
+        res = self.client.post('/api/v1/inventario/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+        self.assertTrue(res.data['errores'][0]['error'].startswith('El archivo no está en UTF-8'))
+
+        lineas = f'{{"refaccion": {self.refs[0].id}, "tipo_movimiento": "ENT", "cantidad": 1}}\n'.encode()
+        archivo = SimpleUploadedFile('recepcion.jsonl', lineas + '{"observaciones": "ñ"}\n'.encode('latin-1'))
+        res = self.client.post('/api/v1/inventario/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual((res.status_code, res.data['creadas'], [e['fila'] for e in res.data['errores']]), (201, 1, [2]))
+
+    def test_jsonl_con_bom(self):
+        lineas = ''.join(
+            f'{{"refaccion": {ref.id}, "tipo_movimiento": "ENT", "cantidad": 1}}\n' for ref in self.refs[:2]
+        )
+        archivo = SimpleUploadedFile('recepcion.jsonl', lineas.encode('utf-8-sig'))
+        res = self.client.post('/api/v1/inventario/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual((res.data['creadas'], res.data['errores']), (2, []))
+
+    def test_json_y_permisos(self):
+        anonimo = APIClient()
+        cuerpo = {'movimientos': [{'refaccion': self.refs[0].id, 'tipo_movimiento': 'entrada', 'cantidad': 1}]}
+        self.assertIn(anonimo.post('/api/v1/inventario/importar/', cuerpo, format='json').status_code, (401, 403))
+        res = self.client.post('/api/v1/inventario/importar/', cuerpo, format='json')
+        self.assertEqual((res.status_code, res.data['creadas']), (201, 1))
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import InventarioViewSet
+from .views import InventarioHistoricoView, InventarioViewSet
 
 urlpatterns = [
     path('', include([
@@ -8,5 +8,7 @@ urlpatterns = [
         path('salida/', InventarioViewSet.as_view({'post': 'registrar_salida'}), name='inventario-salida'),
         path('entrada/', InventarioViewSet.as_view({'post': 'registrar_entrada'}), name='inventario-entrada'),
         path('devolucion/', InventarioViewSet.as_view({'post': 'registrar_devolucion'}), name='inventario-devolucion'),
+        path('importar/', InventarioViewSet.as_view({'post': 'importar'}), name='inventario-importar'),
+        path('historico/', InventarioHistoricoView.as_view(), name='inventario-historico'),
     ])),
 ]
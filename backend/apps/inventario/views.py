@@ -1,11 +1,16 @@
 from django.shortcuts import render
+from datetime import date
+
 from rest_framework import permissions
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
 
+from apps.common.pagination import KeysetPagination
+
 from .models import Inventario
 from .serializer import (
     InventarioSerializer,
@@ -13,7 +18,14 @@ from .serializer import (
     RegistrarEntradaSerializer,
     RegistrarDevolucionSerializer,
 )
-from .services import registrar_salida_por_compra
+from .services import (
+    importar_movimientos,
+    leer_csv,
+    leer_jsonl,
+    registrar_salida_por_compra,
+    stock_en,
+    valuacion_en,
+)
 from apps.productos.models import Refaccion
 
 # Create your views here.
@@ -34,6 +46,15 @@ class InventarioViewSet(viewsets.ModelViewSet):
     search_fields = ['observaciones']
     ordering_fields = ['fecha', 'cantidad', 'precio_unitario']
     ordering = ['-fecha']
+    # ?cursor= pagina por llave en lugar de OFFSET (bitácora muy grande)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-fecha', '-id')
+
+    def get_permissions(self):
+        # La importación masiva es solo para administradores
+        if self.action == 'importar':
+            return [permissions.IsAdminUser()]
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         """
@@ -68,4 +89,53 @@ class InventarioViewSet(viewsets.ModelViewSet):
         serializer = RegistrarDevolucionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         movimiento = serializer.save()
-        return Response(InventarioSerializer(movimiento).data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response(InventarioSerializer(movimiento).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='importar')
+    def importar(self, request):
+        """Alta masiva de movimientos (p. ej. la recepción de un proveedor).
+
+        Acepta multipart con `archivo` (.csv o .jsonl) o JSON {"movimientos": [...]}; cada
+        movimiento lleva refaccion o codigo_parte, tipo_movimiento (ENT/SAL), cantidad y,
+        opcionalmente, precio_unitario y observaciones. Regresa el reporte de errores por fila.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is not None:
+            formato = (request.data.get('formato') or archivo.name.rsplit('.', 1)[-1]).lower()
+            if formato not in ('csv', 'jsonl', 'ndjson'):
+                return Response({'error': 'El archivo debe ser .csv o .jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+            filas = leer_csv(archivo) if formato == 'csv' else leer_jsonl(archivo)
+        else:
+            movimientos = request.data.get('movimientos') if isinstance(request.data, dict) else None
+            if not isinstance(movimientos, list):
+                return Response({'error': 'Envía un archivo o una lista "movimientos"'}, status=status.HTTP_400_BAD_REQUEST)
+            filas = (
+                (numero, fila if isinstance(fila, dict) else {'__error__': 'El movimiento debe ser un objeto.'})
+                for numero, fila in enumerate(movimientos, start=1)
+            )
+
+        resultado = importar_movimientos(filas)
+        return Response(resultado, status=status.HTTP_201_CREATED if resultado['creadas'] else status.HTTP_400_BAD_REQUEST)
+
+
+class InventarioHistoricoView(APIView):
+    """Existencias de una refacción o valuación total del inventario al cierre de un día.
+
+    GET ?fecha=YYYY-MM-DD[&refaccion=<id>]; se resuelve desde el corte mensual más cercano.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            fecha = date.fromisoformat(request.query_params.get('fecha', ''))
+        except ValueError:
+            return Response({'error': 'fecha debe tener el formato YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        refaccion = request.query_params.get('refaccion')
+        if refaccion:
+            if not refaccion.isdigit():
+                return Response({'error': 'refaccion debe ser un id numérico'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'fecha': fecha, 'refaccion': int(refaccion), 'existencias': stock_en(int(refaccion), fecha)})
+
+        valuacion = valuacion_en(fecha)
+        return Response({'fecha': fecha, 'piezas': valuacion['piezas'], 'valor': valuacion['valor']})
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import Pago
+from .models import Pago, WebhookEvento
 
 @admin.register(Pago)   
 class PagoAdmin(admin.ModelAdmin):
     list_display = ['id', 'pedido', 'usuario', 'status', 'amount', 'currency', 'payment_id', 'fecha_creacion']
     list_filter = ['status', 'currency', 'fecha_creacion']
     search_fields = ['payment_id', 'preference_id', 'usuario__email', 'usuario__username']
-    readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'fecha_aprobacion', 'mp_data']
+    readonly_fields = ['metodo_pago_display', 'fecha_creacion', 'fecha_actualizacion', 'fecha_aprobacion', 'mp_data']
     date_hierarchy = 'fecha_creacion'
     
     fieldsets = (
@@ -14,7 +14,7 @@ class PagoAdmin(admin.ModelAdmin):
             'fields': ('pedido', 'usuario', 'status', 'status_detail')
         }),
         ('Mercado Pago', {
-            'fields': ('preference_id', 'payment_id', 'payment_method_id', 'payment_type_id')
+            'fields': ('preference_id', 'payment_id', 'payment_method_id', 'payment_type_id', 'metodo_pago_display')
         }),
         ('Información Financiera', {
             'fields': ('amount', 'currency')
@@ -27,3 +27,11 @@ class PagoAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(WebhookEvento)
+class WebhookEventoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'payment_id', 'estado', 'intentos', 'disponible_en', 'fecha_recepcion']
+    list_filter = ['estado', 'topic']
+    search_fields = ['payment_id', 'request_id']
+    readonly_fields = ['payload', 'fecha_recepcion', 'fecha_procesado']
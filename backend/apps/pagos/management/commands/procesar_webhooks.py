@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.pagos.services import procesar_webhooks_pendientes
+
+
+class Command(BaseCommand):
+    help = "Procesa la bandeja de webhooks de Mercado Pago (worker con reintentos y backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help='Eventos a tomar por iteración')
+        parser.add_argument('--espera', type=float, default=2.0, help='Segundos de espera cuando no hay eventos')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        while True:
+            procesados = procesar_webhooks_pendientes(limite=options['lote'])
+            if procesados:
+                self.stdout.write(f'{procesados} eventos procesados')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['espera'])
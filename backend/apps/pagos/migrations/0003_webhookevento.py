@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0002_alter_pago_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvento',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('request_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('payment_id', models.CharField(max_length=255)),
+                ('topic', models.CharField(default='payment', max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PEN', 'Pendiente'), ('PRO', 'Procesando'), ('COM', 'Completado'), ('ERR', 'Fallido'), ('DES', 'Descartado')], default='PEN', max_length=3)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('fecha_recepcion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_procesado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de webhook',
+                'verbose_name_plural': 'Eventos de webhook',
+                'ordering': ['-fecha_recepcion'],
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='pagos_webho_estado_e52097_idx'), models.Index(fields=['payment_id'], name='pagos_webho_payment_8ddbb5_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'PEN')), fields=('payment_id',), name='pagos_webhook_pendiente_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+# Copia de apps.pagos.models al momento de esta migración: la migración no debe
+# cambiar si después cambian los nombres para mostrar.
+TIPOS_PAGO = {
+    'credit_card': 'Tarjeta de crédito',
+    'debit_card': 'Tarjeta de débito',
+    'ticket': 'Efectivo',
+    'bank_transfer': 'Transferencia bancaria',
+    'account_money': 'Dinero en cuenta',
+    'atm': 'Cajero automático',
+}
+
+METODOS_PAGO = {
+    'visa': 'Visa',
+    'master': 'Mastercard',
+    'amex': 'American Express',
+    'oxxo': 'OXXO',
+    'spei': 'SPEI',
+    'account_money': 'Dinero en cuenta',
+    'ticket': 'Efectivo',
+    'bank_transfer': 'Transferencia bancaria',
+    'atm': 'Cajero automático',
+}
+
+METODOS_SIN_DETALLE = {'credit_card', 'debit_card', 'ticket'}
+TIPOS_TARJETA = {'tarjeta de crédito', 'tarjeta de débito'}
+SIN_METODO = 'No especificado'
+
+
+def describir_metodo_pago(payment_type_id, payment_method_id):
+    if payment_type_id:
+        tipo = TIPOS_PAGO.get(payment_type_id.lower(), payment_type_id.title())
+        if payment_method_id and payment_method_id.lower() not in METODOS_SIN_DETALLE:
+            metodo = METODOS_PAGO.get(payment_method_id.lower(), payment_method_id.title())
+            if metodo.lower() != tipo.lower() and metodo.lower() not in TIPOS_TARJETA:
+                return f"{tipo} - {metodo}"
+        return tipo
+    if payment_method_id:
+        return METODOS_PAGO.get(payment_method_id.lower(), payment_method_id.title())
+    return SIN_METODO
+
+
+def poblar_metodo_pago_display(apps, schema_editor):
+    Pago = apps.get_model('pagos', 'Pago')
+    # Una actualización por combinación distinta de tipo y método, no por pago
+    combinaciones = (
+        Pago.objects.order_by()
+        .values_list('payment_type_id', 'payment_method_id')
+        .distinct()
+    )
+    for tipo, metodo in combinaciones:
+        Pago.objects.filter(payment_type_id=tipo, payment_method_id=metodo).update(
+            metodo_pago_display=describir_metodo_pago(tipo, metodo)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0003_webhookevento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='metodo_pago_display',
+            field=models.CharField(default='No especificado', editable=False, max_length=120),
+        ),
+        migrations.RunPython(poblar_metodo_pago_display, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,53 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+# Nombre para mostrar de payment_type_id (tipo principal de pago)
+TIPOS_PAGO = {
+    'credit_card': 'Tarjeta de crédito',
+    'debit_card': 'Tarjeta de débito',
+    'ticket': 'Efectivo',
+    'bank_transfer': 'Transferencia bancaria',
+    'account_money': 'Dinero en cuenta',
+    'atm': 'Cajero automático',
+}
+
+# Nombre para mostrar de payment_method_id (método específico)
+METODOS_PAGO = {
+    'visa': 'Visa',
+    'master': 'Mastercard',
+    'amex': 'American Express',
+    'oxxo': 'OXXO',
+    'spei': 'SPEI',
+    'account_money': 'Dinero en cuenta',
+    'ticket': 'Efectivo',
+    'bank_transfer': 'Transferencia bancaria',
+    'atm': 'Cajero automático',
+}
+
+# Métodos que no aportan detalle junto al tipo (son el tipo mismo)
+METODOS_SIN_DETALLE = {'credit_card', 'debit_card', 'ticket'}
+TIPOS_TARJETA = {'tarjeta de crédito', 'tarjeta de débito'}
+SIN_METODO = 'No especificado'
+
+
+def describir_metodo_pago(payment_type_id, payment_method_id):
+    """Método de pago para mostrar, p. ej. 'Efectivo - OXXO' o 'Tarjeta de crédito'."""
+    if payment_type_id:
+        tipo = TIPOS_PAGO.get(payment_type_id.lower(), payment_type_id.title())
+        # El método se agrega como detalle solo si es distinto del tipo y aporta información
+        if payment_method_id and payment_method_id.lower() not in METODOS_SIN_DETALLE:
+            metodo = METODOS_PAGO.get(payment_method_id.lower(), payment_method_id.title())
+            if metodo.lower() != tipo.lower() and metodo.lower() not in TIPOS_TARJETA:
+                return f"{tipo} - {metodo}"
+        return tipo
+    if payment_method_id:
+        return METODOS_PAGO.get(payment_method_id.lower(), payment_method_id.title())
+    return SIN_METODO
+
 
 class Pago(models.Model):
     """Modelo para almacenar información de pagos de Mercado Pago"""
@@ -42,6 +88,8 @@ class Pago(models.Model):
     # Información adicional de Mercado Pago
     payment_method_id = models.CharField(max_length=50, null=True, blank=True)
     payment_type_id = models.CharField(max_length=50, null=True, blank=True)
+    # Derivado de payment_type_id/payment_method_id al guardar (para listados de pedidos)
+    metodo_pago_display = models.CharField(max_length=120, default=SIN_METODO, editable=False)
     
     # Metadatos
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -61,3 +109,68 @@ class Pago(models.Model):
     
     def __str__(self):
         return f"Pago {self.id} - {self.get_status_display()} - ${self.amount}"
+
+    def save(self, *args, **kwargs):
+        self.metodo_pago_display = describir_metodo_pago(self.payment_type_id, self.payment_method_id)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'payment_type_id', 'payment_method_id'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'metodo_pago_display'}
+        super().save(*args, **kwargs)
+
+
+class WebhookEvento(models.Model):
+    """Bandeja de entrada de notificaciones de Mercado Pago.
+
+    El webhook solo guarda el evento y responde; el comando `procesar_webhooks`
+    consulta el pago en MP y lo aplica, con reintentos y backoff.
+    """
+
+    class EstadoChoices(models.TextChoices):
+        PENDIENTE = 'PEN', _('Pendiente')
+        PROCESANDO = 'PRO', _('Procesando')
+        COMPLETADO = 'COM', _('Completado')
+        FALLIDO = 'ERR', _('Fallido')
+        DESCARTADO = 'DES', _('Descartado')
+
+    id = models.BigAutoField(primary_key=True)
+    request_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    payment_id = models.CharField(max_length=255)
+    topic = models.CharField(max_length=50, default='payment')
+    payload = models.JSONField(default=dict, blank=True)
+
+    estado = models.CharField(max_length=3, choices=EstadoChoices.choices, default=EstadoChoices.PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    # Siguiente intento (PEN) o fin del lease del worker que lo tomó (PRO)
+    disponible_en = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True, default='')
+
+    fecha_recepcion = models.DateTimeField(auto_now_add=True)
+    fecha_procesado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_recepcion']
+        verbose_name = 'Evento de webhook'
+        verbose_name_plural = 'Eventos de webhook'
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en']),
+            models.Index(fields=['payment_id']),
+        ]
+        constraints = [
+            # Las ráfagas de reintentos de MP sobre el mismo pago se colapsan en un solo evento pendiente
+            models.UniqueConstraint(
+                fields=['payment_id'],
+                condition=models.Q(estado='PEN'),
+                name='pagos_webhook_pendiente_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.id} - pago {self.payment_id} - {self.get_estado_display()}"
+
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def pago_invalidar_estadisticas(sender, instance, **kwargs):
+    # El estado del pago forma parte de las estadísticas de pedidos
+    from apps.pedidos.services import invalidar_estadisticas_pedidos
+    invalidar_estadisticas_pedidos()
@@ -0,0 +1,175 @@
+"""
+Servicios de pagos: aplicación de notificaciones de Mercado Pago y la cola
+(WebhookEvento) que las procesa fuera del ciclo de la petición.
+"""
+import logging
+import os
+from datetime import timedelta
+
+import mercadopago
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.pedidos.services import PedidoYaProcesado, procesar_pedido_pagado
+from .models import Pago, WebhookEvento
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 8
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAXIMO = timedelta(hours=1)
+# Tiempo que un worker puede retener un evento antes de que otro lo vuelva a tomar
+LEASE = timedelta(minutes=5)
+
+ESTADOS_MP = {
+    'approved': Pago.EstadoChoices.APROBADO,
+    'rejected': Pago.EstadoChoices.RECHAZADO,
+    'cancelled': Pago.EstadoChoices.CANCELADO,
+    'refunded': Pago.EstadoChoices.REEMBOLSADO,
+}
+
+
+class ErrorPermanente(Exception):
+    """El evento no se puede aplicar y reintentarlo no cambiará el resultado."""
+
+
+def encolar_webhook(payment_id, request_id=None, topic='payment', payload=None):
+    """Guarda la notificación en la bandeja; regresa False si era duplicada.
+
+    Se deduplica por x-request-id y por pago con evento pendiente (índice único parcial).
+    """
+    try:
+        with transaction.atomic():
+            WebhookEvento.objects.create(
+                payment_id=str(payment_id),
+                request_id=request_id or None,
+                topic=topic or 'payment',
+                payload=payload or {},
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def consultar_pago_mp(payment_id):
+    access_token = os.getenv('MERCADOPAGO_ACCESS_TOKEN')
+    if not access_token:
+        raise RuntimeError('MERCADOPAGO_ACCESS_TOKEN faltante')
+    sdk = mercadopago.SDK(access_token)
+    payment_response = sdk.payment().get(payment_id)
+    payment_data = payment_response.get('response')
+    if not payment_data or payment_response.get('status') != 200:
+        raise RuntimeError(f"Error consultando MP (status {payment_response.get('status')})")
+    return payment_data
+
+
+def aplicar_pago_mp(payment_data):
+    """Actualiza el Pago local con los datos de MP y surte el pedido si quedó aprobado.
+
+    El estado del Pago se confirma aunque el surtido falle (MP ya cobró); el error
+    del surtido se propaga después para que el worker reintente solo el surtido.
+    """
+    external_reference = payment_data.get('external_reference')
+    if not external_reference:
+        raise ErrorPermanente('Sin external_reference')
+
+    error_surtido = None
+    with transaction.atomic():
+        # Bloqueamos el Pago para evitar condiciones de carrera
+        try:
+            pago = Pago.objects.select_for_update().get(id=int(external_reference))
+        except (Pago.DoesNotExist, ValueError):
+            raise ErrorPermanente(f'Pago local {external_reference} no encontrado')
+
+        pago.payment_id = str(payment_data['id'])
+        pago.status_detail = payment_data.get('status_detail')
+        pago.mp_data = payment_data
+        nuevo_estado = ESTADOS_MP.get(payment_data.get('status'), Pago.EstadoChoices.PENDIENTE)
+
+        if pago.status != nuevo_estado:
+            pago.status = nuevo_estado
+            if nuevo_estado == Pago.EstadoChoices.APROBADO:
+                pago.fecha_aprobacion = timezone.now()
+            pago.save()
+
+        if nuevo_estado == Pago.EstadoChoices.APROBADO and pago.pedido_id:
+            # IDEMPOTENCIA: el pedido solo se surte mientras siga CREADO. El surtido va en
+            # un savepoint: si falla se revierte solo él, el Pago aprobado se confirma y
+            # el worker reintenta el evento con backoff (el pago ya aprobado se vuelve a surtir).
+            try:
+                with transaction.atomic():
+                    procesar_pedido_pagado(pago.pedido_id)
+            except PedidoYaProcesado:
+                logger.info('Pedido %s del pago %s ya estaba surtido', pago.pedido_id, pago.id)
+            except Exception as exc:
+                error_surtido = exc
+
+    if error_surtido is not None:
+        raise error_surtido
+    return pago
+
+
+def _backoff(intentos):
+    return min(BACKOFF_BASE * (2 ** max(intentos - 1, 0)), BACKOFF_MAXIMO)
+
+
+def reclamar_eventos(limite=10):
+    """Toma hasta `limite` eventos listos para procesar (SKIP LOCKED entre workers).
+
+    Los eventos tomados pasan a PROCESANDO con un lease; si el worker muere,
+    vuelven a estar disponibles al vencer el lease.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        eventos = list(
+            WebhookEvento.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                estado__in=[WebhookEvento.EstadoChoices.PENDIENTE, WebhookEvento.EstadoChoices.PROCESANDO],
+                disponible_en__lte=ahora,
+            )
+            .order_by('disponible_en', 'id')[:limite]
+        )
+        for evento in eventos:
+            evento.estado = WebhookEvento.EstadoChoices.PROCESANDO
+            evento.intentos += 1
+            evento.disponible_en = ahora + LEASE
+        WebhookEvento.objects.bulk_update(eventos, ['estado', 'intentos', 'disponible_en'])
+    return eventos
+
+
+def procesar_evento(evento):
+    """Consulta el pago en MP y lo aplica; programa un reintento si falla."""
+    try:
+        aplicar_pago_mp(consultar_pago_mp(evento.payment_id))
+    except ErrorPermanente as e:
+        evento.estado = WebhookEvento.EstadoChoices.FALLIDO
+        evento.ultimo_error = str(e)
+    except Exception as e:
+        evento.ultimo_error = str(e)
+        if evento.intentos >= MAX_INTENTOS:
+            evento.estado = WebhookEvento.EstadoChoices.FALLIDO
+        else:
+            evento.estado = WebhookEvento.EstadoChoices.PENDIENTE
+            evento.disponible_en = timezone.now() + _backoff(evento.intentos)
+    else:
+        evento.estado = WebhookEvento.EstadoChoices.COMPLETADO
+        evento.ultimo_error = ''
+
+    evento.fecha_procesado = timezone.now()
+    try:
+        with transaction.atomic():
+            evento.save(update_fields=['estado', 'disponible_en', 'ultimo_error', 'fecha_procesado'])
+    except IntegrityError:
+        # Llegó otra notificación del mismo pago mientras tanto: esa lo volverá a consultar
+        evento.estado = WebhookEvento.EstadoChoices.DESCARTADO
+        evento.save(update_fields=['estado', 'disponible_en', 'ultimo_error', 'fecha_procesado'])
+    return evento
+
+
+def procesar_webhooks_pendientes(limite=10):
+    """Procesa un lote de la bandeja; regresa cuántos eventos se tomaron."""
+    eventos = reclamar_eventos(limite)
+    for evento in eventos:
+        procesar_evento(evento)
+    return len(eventos)
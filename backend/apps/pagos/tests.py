@@ -1,3 +1,212 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.pagos.models import Pago, WebhookEvento
+from apps.pagos.services import MAX_INTENTOS, procesar_webhooks_pendientes
+from apps.inventario.services import registrar_entrada_manual
+from apps.pedidos.models import Pedido, PedidoItem
+from apps.productos.models import Marca, Refaccion, Categoria
+
+
+class WebhookBandejaTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(username='buyer', password='secret')
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        self.ref = Refaccion.objects.create(
+            codigo_parte='CP-1', nombre='Ref1', descripcion='', marca=Marca.objects.create(nombre='Marca1'),
+            categoria=categoria, precio=100, existencias=5, compatibilidad=''
+        )
+        self.pedido = Pedido.objects.create(usuario=user, total=200)
+        PedidoItem.objects.create(pedido=self.pedido, refaccion=self.ref, cantidad=2, precio_unitario=100, subtotal=200)
+        self.pago = Pago.objects.create(pedido=self.pedido, usuario=user, amount=200)
+        self.url = reverse('pagos:webhook')
+
+    def _notificar(self, payment_id='555', request_id='req-1'):
+        return self.client.post(
+            f'{self.url}?type=payment&data.id={payment_id}', data={}, format='json',
+            HTTP_X_REQUEST_ID=request_id,
+        )
+
+    def _mock_mp(self, status_mp='approved', status_http=200):
+        sdk = mock.Mock()
+        sdk.payment.return_value.get.return_value = {
+            'status': status_http,
+            'response': {'id': 555, 'status': status_mp, 'external_reference': str(self.pago.id)},
+        }
+        return mock.patch('apps.pagos.services.mercadopago.SDK', return_value=sdk)
+
+    def test_webhook_solo_encola_y_deduplica(self):
+        with mock.patch('apps.pagos.services.mercadopago.SDK') as sdk:
+            self.assertEqual(self._notificar().data['status'], 'ok')
+            # Reintento de MP con el mismo x-request-id
+            self.assertEqual(self._notificar().data['status'], 'duplicate')
+            # Otra notificación del mismo pago mientras sigue pendiente
+            self.assertEqual(self._notificar(request_id='req-2').data['status'], 'duplicate')
+            sdk.assert_not_called()
+        self.assertEqual(WebhookEvento.objects.count(), 1)
+
+    @mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+    def test_worker_aplica_pago_y_surte_pedido(self):
+        self._notificar()
+        with self._mock_mp():
+            self.assertEqual(procesar_webhooks_pendientes(), 1)
+
+        evento = WebhookEvento.objects.get()
+        self.assertEqual(evento.estado, WebhookEvento.EstadoChoices.COMPLETADO)
+        self.pago.refresh_from_db()
+        self.pedido.refresh_from_db()
+        self.ref.refresh_from_db()
+        self.assertEqual(self.pago.status, Pago.EstadoChoices.APROBADO)
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.PAGADO)
+        self.assertEqual(self.ref.existencias, 3)
+
+        # Una vez procesado, una nueva notificación del mismo pago sí se encola
+        self.assertEqual(self._notificar(request_id='req-2').data['status'], 'ok')
+
+    @mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+    def test_error_de_mp_reintenta_con_backoff(self):
+        self._notificar()
+        with self._mock_mp(status_http=500):
+            procesar_webhooks_pendientes()
+
+        evento = WebhookEvento.objects.get()
+        self.assertEqual(evento.estado, WebhookEvento.EstadoChoices.PENDIENTE)
+        self.assertEqual(evento.intentos, 1)
+        self.assertGreater(evento.disponible_en, timezone.now())
+        # No vuelve a tomarse antes de tiempo
+        self.assertEqual(procesar_webhooks_pendientes(), 0)
+
+        WebhookEvento.objects.update(disponible_en=timezone.now() - timedelta(seconds=1))
+        with self._mock_mp():
+            self.assertEqual(procesar_webhooks_pendientes(), 1)
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, WebhookEvento.EstadoChoices.COMPLETADO)
+        self.assertEqual(evento.intentos, 2)
+
+    @mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+    def test_falla_transitoria_al_surtir_se_reintenta(self):
+        self._notificar()
+        with self._mock_mp(), mock.patch(
+            'apps.pagos.services.procesar_pedido_pagado', side_effect=OperationalError('lock timeout'),
+        ):
+            procesar_webhooks_pendientes()
+
+        evento = WebhookEvento.objects.get()
+        self.assertEqual(evento.estado, WebhookEvento.EstadoChoices.PENDIENTE)
+        # MP ya cobró: el Pago queda aprobado aunque el surtido se revierta
+        self.pago.refresh_from_db()
+        self.assertEqual(self.pago.status, Pago.EstadoChoices.APROBADO)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.CREADO)
+
+        WebhookEvento.objects.update(disponible_en=timezone.now() - timedelta(seconds=1))
+        with self._mock_mp():
+            procesar_webhooks_pendientes()
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.PAGADO)
+
+    @mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+    def test_sin_stock_al_surtir_conserva_el_pago_aprobado(self):
+        self.ref.existencias = 1
+        self.ref.save()
+        self._notificar()
+        for _ in range(MAX_INTENTOS):
+            WebhookEvento.objects.update(disponible_en=timezone.now() - timedelta(seconds=1))
+            with self._mock_mp():
+                procesar_webhooks_pendientes()
+
+        self.assertEqual(WebhookEvento.objects.get().estado, WebhookEvento.EstadoChoices.FALLIDO)
+        self.pago.refresh_from_db()
+        self.assertEqual(self.pago.status, Pago.EstadoChoices.APROBADO)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.CREADO)
+
+    @mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+    def test_pago_aprobado_con_pedido_sin_surtir_se_repara(self):
+        # Aprobado por el flujo síncrono, pero el surtido falló en ese momento
+        Pago.objects.filter(pk=self.pago.pk).update(status=Pago.EstadoChoices.APROBADO)
+        self._notificar()
+        with self._mock_mp():
+            procesar_webhooks_pendientes()
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.PAGADO)
+
+        # Una redelivery posterior no vuelve a surtir
+        self._notificar(request_id='req-2')
+        with self._mock_mp():
+            procesar_webhooks_pendientes()
+        self.assertEqual(WebhookEvento.objects.filter(estado=WebhookEvento.EstadoChoices.COMPLETADO).count(), 2)
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.existencias, 3)
+
+
+@mock.patch.dict('os.environ', {'MERCADOPAGO_ACCESS_TOKEN': 'test'})
+class CheckoutCardTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        self.ref = Refaccion.objects.create(
+            codigo_parte='CP-1', nombre='Ref1', descripcion='', marca=Marca.objects.create(nombre='Marca1'),
+            categoria=categoria, precio=100, existencias=0, compatibilidad=''
+        )
+        registrar_entrada_manual(self.ref, 5, precio_unitario=100)
+        self.datos = {
+            'items': [{'refaccion': self.ref.id, 'cantidad': 2}],
+            'token': 'tok', 'payment_method_id': 'visa', 'payer_email': 'ana@example.com',
+            'guest_name': 'Ana', 'calle': 'Centro 1',
+        }
+
+    def _mock_mp(self, status_mp):
+        sdk = mock.Mock()
+        sdk.payment.return_value.create.return_value = {
+            'status': 201,
+            'response': {'id': 777, 'status': status_mp, 'status_detail': 'x', 'payment_type_id': 'credit_card'},
+        }
+        return mock.patch('apps.pedidos.services.mercadopago.SDK', return_value=sdk)
+
+    def test_pago_aprobado_surte_pedido(self):
+        with self._mock_mp('approved') as sdk:
+            res = self.client.post(reverse('pagos:checkout_card'), data=self.datos, format='json')
+        self.assertEqual(res.status_code, 200, res.data)
+        payload = sdk.return_value.payment.return_value.create.call_args[0][0]
+        self.assertEqual(payload['transaction_amount'], 200.0)
+
+        pedido = Pedido.objects.get(id=res.data['pedido_id'])
+        self.assertEqual(pedido.estado, Pedido.EstadoChoices.PAGADO)
+        self.assertEqual(pedido.guest_email, 'ana@example.com')
+        self.assertEqual(pedido.pago.status, Pago.EstadoChoices.APROBADO)
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.existencias, 3)
+
+    def test_pago_rechazado_no_deja_pedido(self):
+        with self._mock_mp('rejected'):
+            res = self.client.post(reverse('pagos:checkout_card'), data=self.datos, format='json')
+        self.assertEqual(res.data['status'], 'rejected')
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(Pago.objects.exists())
+
+    def test_partidas_mal_formadas_son_400_y_errores_internos_500(self):
+        self.datos['items'] = [{'refaccion': 'abc', 'cantidad': 1}]
+        res = self.client.post(reverse('pagos:checkout_card'), data=self.datos, format='json')
+        self.assertEqual(res.status_code, 400)
+
+        self.datos['items'] = [{'refaccion': self.ref.id, 'cantidad': 1}]
+        with mock.patch('apps.pagos.views.checkout_con_mercado_pago', side_effect=TypeError('bug')):
+            res = self.client.post(reverse('pagos:checkout_card'), data=self.datos, format='json')
+        self.assertEqual(res.status_code, 500)
 
-# Create your tests here.
+    def test_sin_stock_no_llama_a_mp(self):
+        self.datos['items'][0]['cantidad'] = 9
+        with self._mock_mp('approved') as sdk:
+            res = self.client.post(reverse('pagos:checkout_card'), data=self.datos, format='json')
+        self.assertEqual(res.status_code, 400)
+        sdk.assert_not_called()
+        self.assertFalse(Pedido.objects.exists())
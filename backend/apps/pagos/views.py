@@ -1,7 +1,7 @@
 import os
 import hashlib 
 import hmac
-from django.db import transaction
+import logging
 import mercadopago
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
@@ -13,8 +13,11 @@ from rest_framework.permissions import AllowAny
 
 from .models import Pago
 from apps.pedidos.models import Pedido
-from apps.pedidos.services import procesar_pedido_pagado
+from apps.pedidos.services import procesar_pedido_pagado, checkout_con_mercado_pago, ErrorCobro
 from .serializers import PagoSerializer
+from .services import encolar_webhook
+
+logger = logging.getLogger(__name__)
 
 class CrearPreferenciaPagoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -114,7 +117,11 @@ class CrearPreferenciaPagoView(APIView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class WebhookView(APIView):
-    """Recibe notificaciones de webhook de Mercado Pago"""
+    """Recibe notificaciones de webhook de Mercado Pago.
+
+    Solo valida la firma y guarda el evento en la bandeja (WebhookEvento); el
+    procesamiento ocurre en el comando `procesar_webhooks`.
+    """
     permission_classes = [AllowAny]
 
     def post(self, request):
@@ -130,6 +137,8 @@ class WebhookView(APIView):
             
             if topic != 'payment':
                 return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+            if not data_id:
+                return Response({'error': 'Sin data.id'}, status=status.HTTP_400_BAD_REQUEST)
 
             # 2. VALIDACIÓN DE FIRMA
             x_signature = request.headers.get("x-signature")
@@ -154,76 +163,15 @@ class WebhookView(APIView):
                     if local_sha != v1_hash:
                         return Response({'error': 'Firma inválida'}, status=status.HTTP_403_FORBIDDEN)
 
-            # 3. CONSULTA A MERCADO PAGO
-            access_token = os.getenv('MERCADOPAGO_ACCESS_TOKEN')
-            if not access_token:
-                return Response({'error': 'Credenciales no configuradas'}, status=500)
-
-            sdk = mercadopago.SDK(access_token)
-            payment_response = sdk.payment().get(data_id)
-            payment_data = payment_response.get('response')
-
-            if not payment_data or payment_response.get('status') != 200:
-                return Response({'error': 'Error consultando MP'}, status=400)
-
-            external_reference = payment_data.get('external_reference')
-            if not external_reference:
-                return Response({'error': 'Sin external_reference'}, status=400)
-
-            # 4. ACTUALIZACIÓN DE BASE DE DATOS E INVENTARIO
-            try:
-                # Usamos transaction.atomic para que TODO (Pago + Inventario + Venta) sea atómico
-                with transaction.atomic():
-                    # Bloqueamos el Pago para evitar condiciones de carrera
-                    pago = Pago.objects.select_for_update().get(id=int(external_reference))
-                    pedido = pago.pedido 
-
-                    # Actualizar datos informativos del pago
-                    pago.payment_id = str(payment_data['id'])
-                    pago.status_detail = payment_data.get('status_detail')
-                    pago.mp_data = payment_data 
-
-                    # Determinar nuevo estado
-                    mp_status = payment_data.get('status')
-                    nuevo_estado = Pago.EstadoChoices.PENDIENTE
-                    
-                    if mp_status == 'approved':
-                        nuevo_estado = Pago.EstadoChoices.APROBADO
-                    elif mp_status == 'rejected':
-                        nuevo_estado = Pago.EstadoChoices.RECHAZADO
-                    elif mp_status == 'cancelled':
-                        nuevo_estado = Pago.EstadoChoices.CANCELADO
-                    elif mp_status == 'refunded':
-                        nuevo_estado = Pago.EstadoChoices.REEMBOLSADO
-
-                    # IDEMPOTENCIA: Solo actuamos si el estado cambió
-                    if pago.status != nuevo_estado:
-                        pago.status = nuevo_estado
-                        pago.save()
-                        
-                        # --- INTEGRACIÓN: PROCESAR EL PEDIDO SI ES APROBADO ---
-                        if nuevo_estado == Pago.EstadoChoices.APROBADO:
-                            print(f"💰 PAGO APROBADO: Pedido {pedido.id}. Iniciando proceso de inventario...")
-                            try:
-                                # Aquí llamamos a tu servicio externo
-                                resultado = procesar_pedido_pagado(pedido.id)
-                                print(f"✅ Pedido {pedido.id} procesado correctamente: {resultado.get('success')}")
-                                
-                            except ValueError as ve:
-                                # Errores de lógica (ej. Pedido ya pagado, sin stock)
-                                print(f"⚠️ Alerta de Negocio: {ve}")
-                                # Opcional: Podrías querer guardar un log de error en el modelo Pago
-                                
-                            except Exception as e:
-                                # Errores inesperados
-                                print(f"❌ Error crítico procesando inventario: {e}")
-                                # IMPORTANTE: Si falla el inventario, ¿queremos revertir el estado del pago?
-                                # Al estar dentro de transaction.atomic(), si lanzamos raise, se revierte todo.
-                                # Pero MP ya cobró. Lo mejor es NO revertir el pago, pero alertar al admin.
-                                # Por eso capturamos la excepción aquí y no dejamos que suba.
-
-            except (Pago.DoesNotExist, ValueError):
-                return Response({'error': 'Pago local no encontrado'}, status=404)
+            # 3. ENCOLAR: el worker (procesar_webhooks) consulta MP y surte el pedido
+            nuevo = encolar_webhook(
+                payment_id=data_id,
+                request_id=x_request_id,
+                topic=topic,
+                payload={'query': request.GET.dict(), 'body': dict(request.data.items())},
+            )
+            if not nuevo:
+                return Response({'status': 'duplicate'}, status=status.HTTP_200_OK)
 
             return Response({'status': 'ok'}, status=status.HTTP_200_OK)
 
@@ -299,14 +247,11 @@ class ProcesarPagoCardView(APIView):
                 pago.status = Pago.EstadoChoices.APROBADO
                 from django.utils import timezone as tz
                 pago.fecha_aprobacion = tz.now()
-                with transaction.atomic():
-                    pedido.estado = Pedido.EstadoChoices.PAGADO
-                    pedido.save(update_fields=['estado'])
-                    try:
-                        resultado = procesar_pedido_pagado(pedido.id)
-                        print(f"✅ Pedido {pedido.id} procesado: {resultado.get('success')}")
-                    except Exception as e:
-                        print(f"⚠️ Error procesando inventario pedido {pedido.id}: {e}")
+                # procesar_pedido_pagado surte el pedido y lo pasa a PAGADO
+                try:
+                    procesar_pedido_pagado(pedido.id)
+                except Exception:
+                    logger.exception('Pago %s aprobado pero el pedido %s no se pudo surtir', pago.id, pedido.id)
             elif mp_status == 'rejected':
                 pago.status = Pago.EstadoChoices.RECHAZADO
 
@@ -398,6 +343,37 @@ class ProcesarPagoEfectivoView(APIView):
             return Response({'error': str(e)}, status=500)
 
 
+def _datos_checkout(request, payer_email):
+    """Partidas, usuario, dirección y datos de invitado de una solicitud de checkout.
+
+    Lanza TypeError/ValueError/AttributeError si las partidas no tienen el formato esperado.
+    """
+    data = request.data
+    items = [
+        {'refaccion': int(item.get('refaccion')), 'cantidad': int(item.get('cantidad', 1))}
+        for item in data.get('items', [])
+    ]
+    is_auth = request.user and request.user.is_authenticated
+    direccion = {
+        'calle': data.get('calle', ''),
+        'ciudad': data.get('ciudad', ''),
+        'estado': data.get('estado_envio', ''),
+        'codigo_postal': data.get('codigo_postal', ''),
+        'notas': data.get('notas', ''),
+    }
+    invitado = None if is_auth else {
+        'guest_name': data.get('guest_name', ''),
+        'guest_email': data.get('guest_email', payer_email),
+        'guest_phone': data.get('guest_phone', ''),
+    }
+    return {
+        'items': items,
+        'usuario': request.user if is_auth else None,
+        'direccion': direccion,
+        'invitado': invitado,
+    }
+
+
 class CheckoutCardView(APIView):
     """Crea pedido + procesa pago con tarjeta en una operación.
     Si el pago es rechazado, el pedido se elimina (sin pedidos huérfanos).
@@ -405,153 +381,52 @@ class CheckoutCardView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        from apps.inventario.models import Inventario
-        from apps.productos.models import Refaccion as RefaccionModel
-        from apps.pedidos.models import PedidoItem
-
         try:
             access_token = os.getenv('MERCADOPAGO_ACCESS_TOKEN')
             if not access_token:
                 return Response({'error': 'MERCADOPAGO_ACCESS_TOKEN faltante'}, status=500)
 
             data = request.data
-            items_data = data.get('items', [])
             token = data.get('token')
             payment_method_id = data.get('payment_method_id')
             issuer_id = data.get('issuer_id')
             installments = data.get('installments', 1)
             payer_email = data.get('payer_email')
 
-            if not items_data or not token or not payment_method_id or not payer_email:
+            if not data.get('items') or not token or not payment_method_id or not payer_email:
                 return Response({'error': 'Faltan campos requeridos'}, status=400)
 
-            is_auth = request.user and request.user.is_authenticated
-            shipping = {
-                'calle': data.get('calle', ''),
-                'ciudad': data.get('ciudad', ''),
-                'estado': data.get('estado_envio', ''),
-                'codigo_postal': data.get('codigo_postal', ''),
-                'notas': data.get('notas', ''),
-            }
-
-            # 1. Crear pedido con items — si falla, el atomic rollback evita orphans
             try:
-                with transaction.atomic():
-                    if is_auth:
-                        pedido = Pedido.objects.create(
-                            usuario=request.user,
-                            estado=Pedido.EstadoChoices.CREADO,
-                            total=0,
-                            direccion_snapshot=shipping,
-                        )
-                    else:
-                        pedido = Pedido.objects.create(
-                            usuario=None,
-                            guest_name=data.get('guest_name', ''),
-                            guest_email=data.get('guest_email', payer_email),
-                            guest_phone=data.get('guest_phone', ''),
-                            direccion_snapshot=shipping,
-                            estado=Pedido.EstadoChoices.CREADO,
-                            total=0,
-                        )
-
-                    total = 0
-                    for item_data in items_data:
-                        refaccion_id = item_data.get('refaccion')
-                        cantidad = int(item_data.get('cantidad', 1))
-
-                        refaccion = RefaccionModel.objects.get(id=refaccion_id)
-                        inventario = Inventario.objects.filter(
-                            refaccion=refaccion, cantidad__gt=0
-                        ).order_by('fecha').first()
-
-                        if not inventario or inventario.cantidad < cantidad:
-                            raise ValueError(f'Stock insuficiente para {refaccion.nombre}')
-
-                        precio_unitario = inventario.precio_unitario
-                        subtotal_item = cantidad * precio_unitario
-                        PedidoItem.objects.create(
-                            pedido=pedido,
-                            refaccion=refaccion,
-                            cantidad=cantidad,
-                            precio_unitario=precio_unitario,
-                            subtotal=subtotal_item,
-                        )
-                        total += subtotal_item
-
-                    pedido.total = total
-                    pedido.save(update_fields=['total'])
-
-            except RefaccionModel.DoesNotExist:
-                return Response({'error': 'Producto no encontrado'}, status=400)
-            except ValueError as e:
-                return Response({'error': str(e)}, status=400)
-
-            # 2. Procesar pago con tarjeta via MP
-            sdk = mercadopago.SDK(access_token)
-            usuario = request.user if is_auth else None
-
-            pago = Pago.objects.create(
-                pedido=pedido,
-                usuario=usuario,
-                amount=pedido.total,
-                currency='MXN',
-                status=Pago.EstadoChoices.PENDIENTE,
-            )
+                datos_checkout = _datos_checkout(request, payer_email)
+                installments = int(installments)
+            except (TypeError, ValueError, AttributeError):
+                return Response({'error': 'Las partidas o las cuotas no tienen un formato válido'}, status=400)
 
             payment_payload = {
-                "transaction_amount": float(pedido.total),
                 "token": token,
                 "payment_method_id": payment_method_id,
-                "installments": int(installments),
+                "installments": installments,
                 "payer": {"email": payer_email},
             }
             if issuer_id:
                 payment_payload["issuer_id"] = issuer_id
 
-            payment_response = sdk.payment().create(payment_payload)
-
-            if payment_response["status"] not in [200, 201]:
-                pago.delete()
-                pedido.delete()
+            # Pedido en una transacción corta; el cobro a MP va fuera de ella
+            try:
+                pedido, payment = checkout_con_mercado_pago(payment_payload=payment_payload, **datos_checkout)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+            except ErrorCobro:
                 return Response({'error': 'Error procesando el pago'}, status=400)
 
-            payment = payment_response['response']
-            mp_status = payment.get('status')
-
-            if mp_status == 'rejected':
-                # Pago rechazado → eliminar pedido y pago (sin pedidos huérfanos)
-                with transaction.atomic():
-                    pago.delete()
-                    pedido.delete()
+            if pedido is None:
                 return Response({
                     'status': 'rejected',
                     'detail': payment.get('status_detail', 'rejected'),
                 }, status=status.HTTP_200_OK)
 
-            # Aprobado o pendiente → guardar pago
-            pago.payment_id = str(payment['id'])
-            pago.status_detail = payment.get('status_detail')
-            pago.payment_method_id = payment.get('payment_method_id')
-            pago.payment_type_id = payment.get('payment_type_id')
-            pago.mp_data = payment
-
-            if mp_status == 'approved':
-                pago.status = Pago.EstadoChoices.APROBADO
-                from django.utils import timezone as tz
-                pago.fecha_aprobacion = tz.now()
-                with transaction.atomic():
-                    pedido.estado = Pedido.EstadoChoices.PAGADO
-                    pedido.save(update_fields=['estado'])
-                    try:
-                        procesar_pedido_pagado(pedido.id)
-                    except Exception as e:
-                        print(f"⚠️ Error procesando inventario pedido {pedido.id}: {e}")
-
-            pago.save()
-
             return Response({
-                'status': mp_status,
+                'status': payment.get('status'),
                 'payment_id': payment['id'],
                 'detail': payment.get('status_detail', ''),
                 'pedido_id': pedido.id,
@@ -569,116 +444,43 @@ class CheckoutEfectivoView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        from apps.inventario.models import Inventario
-        from apps.productos.models import Refaccion as RefaccionModel
-        from apps.pedidos.models import PedidoItem
-
         try:
             access_token = os.getenv('MERCADOPAGO_ACCESS_TOKEN')
             if not access_token:
                 return Response({'error': 'MERCADOPAGO_ACCESS_TOKEN faltante'}, status=500)
 
             data = request.data
-            items_data = data.get('items', [])
             payment_method_id = data.get('payment_method_id', 'oxxo')
             payer_email = data.get('payer_email')
 
-            if not items_data or not payer_email:
+            if not data.get('items') or not payer_email:
                 return Response({'error': 'Faltan campos requeridos'}, status=400)
 
-            is_auth = request.user and request.user.is_authenticated
-            shipping = {
-                'calle': data.get('calle', ''),
-                'ciudad': data.get('ciudad', ''),
-                'estado': data.get('estado_envio', ''),
-                'codigo_postal': data.get('codigo_postal', ''),
-                'notas': data.get('notas', ''),
-            }
-
-            try:
-                with transaction.atomic():
-                    if is_auth:
-                        pedido = Pedido.objects.create(
-                            usuario=request.user,
-                            estado=Pedido.EstadoChoices.CREADO,
-                            total=0,
-                            direccion_snapshot=shipping,
-                        )
-                    else:
-                        pedido = Pedido.objects.create(
-                            usuario=None,
-                            guest_name=data.get('guest_name', ''),
-                            guest_email=data.get('guest_email', payer_email),
-                            guest_phone=data.get('guest_phone', ''),
-                            direccion_snapshot=shipping,
-                            estado=Pedido.EstadoChoices.CREADO,
-                            total=0,
-                        )
-
-                    total = 0
-                    for item_data in items_data:
-                        refaccion_id = item_data.get('refaccion')
-                        cantidad = int(item_data.get('cantidad', 1))
-
-                        refaccion = RefaccionModel.objects.get(id=refaccion_id)
-                        inventario = Inventario.objects.filter(
-                            refaccion=refaccion, cantidad__gt=0
-                        ).order_by('fecha').first()
-
-                        if not inventario or inventario.cantidad < cantidad:
-                            raise ValueError(f'Stock insuficiente para {refaccion.nombre}')
-
-                        precio_unitario = inventario.precio_unitario
-                        subtotal_item = cantidad * precio_unitario
-                        PedidoItem.objects.create(
-                            pedido=pedido,
-                            refaccion=refaccion,
-                            cantidad=cantidad,
-                            precio_unitario=precio_unitario,
-                            subtotal=subtotal_item,
-                        )
-                        total += subtotal_item
-
-                    pedido.total = total
-                    pedido.save(update_fields=['total'])
-
-            except RefaccionModel.DoesNotExist:
-                return Response({'error': 'Producto no encontrado'}, status=400)
-            except ValueError as e:
-                return Response({'error': str(e)}, status=400)
-
-            # 2. Generar ticket OXXO/7-Eleven via MP
-            sdk = mercadopago.SDK(access_token)
-            usuario = request.user if is_auth else None
-
-            pago = Pago.objects.create(
-                pedido=pedido,
-                usuario=usuario,
-                amount=pedido.total,
-                currency='MXN',
-                status=Pago.EstadoChoices.PENDIENTE,
-            )
-
             payment_payload = {
-                "transaction_amount": float(pedido.total),
                 "payment_method_id": payment_method_id,
                 "payer": {"email": payer_email},
             }
 
-            payment_response = sdk.payment().create(payment_payload)
+            try:
+                datos_checkout = _datos_checkout(request, payer_email)
+            except (TypeError, ValueError, AttributeError):
+                return Response({'error': 'Las partidas no tienen un formato válido'}, status=400)
 
-            if payment_response["status"] not in [200, 201]:
-                pago.delete()
-                pedido.delete()
+            # Pedido en una transacción corta; la referencia de MP se genera fuera de ella
+            try:
+                pedido, payment = checkout_con_mercado_pago(
+                    payment_payload=payment_payload, tipo_pago='ticket', **datos_checkout
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+            except ErrorCobro:
                 return Response({'error': 'Error generando referencia de pago'}, status=400)
 
-            payment = payment_response['response']
-            pago.payment_id = str(payment['id'])
-            pago.status_detail = payment.get('status_detail')
-            pago.payment_method_id = payment_method_id
-            pago.payment_type_id = 'ticket'
-            pago.mp_data = payment
-            pago.save()
+            if pedido is None:
+                return Response({
+                    'status': 'rejected',
+                    'detail': payment.get('status_detail', 'rejected'),
+                }, status=status.HTTP_200_OK)
 
             transaction_details = payment.get('transaction_details', {})
             voucher_url = transaction_details.get('external_resource_url', '')
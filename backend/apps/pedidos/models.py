@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from apps.productos.models import Refaccion
@@ -34,6 +36,10 @@ class Pedido(models.Model):
 
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Paginación por llave del listado de pedidos
+            models.Index(fields=['fecha_creacion', 'id']),
+        ]
 
     def __str__(self):
         if self.usuario:
@@ -51,3 +57,25 @@ class PedidoItem(models.Model):
 
     def __str__(self):
         return f"Item {self.refaccion} x{self.cantidad}"
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def pedido_invalidar_estadisticas(sender, instance, **kwargs):
+    from .services import invalidar_estadisticas_pedidos
+    invalidar_estadisticas_pedidos()
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_cancelado_libera_reservas(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.estado != Pedido.EstadoChoices.CANCELADO:
+        return
+    from apps.inventario.services import liberar_reservas
+    liberar_reservas(instance.pk)
+
+
+@receiver(pre_delete, sender=Pedido)
+def pedido_eliminado_libera_reservas(sender, instance, **kwargs):
+    # Las reservas se borran en cascada; antes se devuelve lo apartado a Refaccion.reservado
+    from apps.inventario.services import liberar_reservas
+    liberar_reservas(instance.pk)
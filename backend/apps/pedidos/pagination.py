@@ -1,5 +1,7 @@
 from rest_framework.pagination import PageNumberPagination
 
+from apps.common.pagination import KeysetPagination
+
 
 class PedidoPagination(PageNumberPagination):
     page_size = 20
@@ -14,3 +16,8 @@ class PedidoPagadoPagination(PageNumberPagination):
     max_page_size = 50
 
 
+class PedidoKeysetPagination(KeysetPagination):
+    """Como PedidoPagination, y por llave (fecha_creacion, id) con ?cursor=."""
+    page_size = 20
+    max_page_size = 100
+    ordering = ('-fecha_creacion', '-id')
@@ -1,13 +1,15 @@
-from django.db import transaction
-from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from apps.productos.models import Refaccion
+from apps.pagos.models import SIN_METODO
+from apps.usuarios.models import Direccion
 from .models import Pedido, PedidoItem
+from .services import crear_pedido
 
 
 class CheckoutItemSerializer(serializers.Serializer):
-    refaccion = serializers.PrimaryKeyRelatedField(queryset=Refaccion.objects.all())
+    # Solo el id: las refacciones se resuelven en lote al crear el pedido
+    refaccion = serializers.IntegerField(min_value=1)
     cantidad = serializers.IntegerField(min_value=1)
 
 
@@ -24,50 +26,12 @@ class CheckoutSerializer(serializers.Serializer):
         if not user or not user.is_authenticated:
             raise serializers.ValidationError({'detail': 'Autenticación requerida para checkout'})
 
-        with transaction.atomic():
-            # Crear pedido en estado CREADO (no procesar inventario aún)
-            pedido = Pedido.objects.create(usuario=user, estado=Pedido.EstadoChoices.CREADO, total=0)
-            total = 0
+        try:
+            # Pedido en estado CREADO con sus partidas en lote (no procesa inventario aún)
+            pedido = crear_pedido(validated_data['items'], usuario=user)
+        except ValueError as e:
+            raise serializers.ValidationError({'detail': str(e)})
 
-            for item in validated_data['items']:
-                try:
-                    # Obtener precio desde el inventario sin procesar salida
-                    from apps.inventario.models import Inventario
-                    inventario = Inventario.objects.filter(
-                        refaccion=item['refaccion'],
-                        cantidad__gt=0
-                    ).order_by('fecha').first()
-                    
-                    if not inventario:
-                        raise serializers.ValidationError({
-                            'detail': f'No hay stock disponible para {item["refaccion"].nombre}'
-                        })
-                    
-                    if inventario.cantidad < item['cantidad']:
-                        raise serializers.ValidationError({
-                            'detail': f'Stock insuficiente para {item["refaccion"].nombre}. Disponible: {inventario.cantidad}'
-                        })
-                    
-                    precio_unitario = inventario.precio_unitario
-                    subtotal = item['cantidad'] * precio_unitario
-                    
-                    # Guardar item del pedido (sin procesar inventario aún)
-                    PedidoItem.objects.create(
-                        pedido=pedido,
-                        refaccion=item['refaccion'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=precio_unitario,
-                        subtotal=subtotal,
-                    )
-                    total += subtotal
-                except DjangoValidationError as e:
-                    raise serializers.ValidationError(e.message_dict if hasattr(e, 'message_dict') else {'detail': e.messages})
-                except ValueError as e:
-                    raise serializers.ValidationError({'detail': str(e)})
-            
-            pedido.total = total
-            pedido.save(update_fields=['total'])
-        
         # Representación de respuesta
         return {
             'pedido_id': pedido.id,
@@ -97,51 +61,18 @@ class CheckoutInvitadoSerializer(serializers.Serializer):
             'notas': validated_data.pop('notas', ''),
         }
 
-        with transaction.atomic():
-            pedido = Pedido.objects.create(
-                usuario=None,
-                guest_name=validated_data['guest_name'],
-                guest_email=validated_data['guest_email'],
-                guest_phone=validated_data['guest_phone'],
-                direccion_snapshot=direccion_snapshot,
-                estado=Pedido.EstadoChoices.CREADO,
-                total=0,
+        try:
+            pedido = crear_pedido(
+                items_data,
+                direccion=direccion_snapshot,
+                invitado={
+                    'guest_name': validated_data['guest_name'],
+                    'guest_email': validated_data['guest_email'],
+                    'guest_phone': validated_data['guest_phone'],
+                },
             )
-            total = 0
-            for item in items_data:
-                try:
-                    from apps.inventario.models import Inventario
-                    inventario = Inventario.objects.filter(
-                        refaccion=item['refaccion'],
-                        cantidad__gt=0
-                    ).order_by('fecha').first()
-
-                    if not inventario:
-                        raise serializers.ValidationError({
-                            'detail': f'No hay stock disponible para {item["refaccion"].nombre}'
-                        })
-                    if inventario.cantidad < item['cantidad']:
-                        raise serializers.ValidationError({
-                            'detail': f'Stock insuficiente para {item["refaccion"].nombre}. Disponible: {inventario.cantidad}'
-                        })
-
-                    precio_unitario = inventario.precio_unitario
-                    subtotal_item = item['cantidad'] * precio_unitario
-                    PedidoItem.objects.create(
-                        pedido=pedido,
-                        refaccion=item['refaccion'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=precio_unitario,
-                        subtotal=subtotal_item,
-                    )
-                    total += subtotal_item
-                except DjangoValidationError as e:
-                    raise serializers.ValidationError(
-                        e.message_dict if hasattr(e, 'message_dict') else {'detail': e.messages}
-                    )
-
-            pedido.total = total
-            pedido.save(update_fields=['total'])
+        except ValueError as e:
+            raise serializers.ValidationError({'detail': str(e)})
 
         return {
             'pedido_id': pedido.id,
@@ -159,19 +90,51 @@ class PedidoItemListSerializer(serializers.ModelSerializer):
         fields = ['id', 'refaccion', 'refaccion_nombre', 'refaccion_imagen', 'cantidad', 'precio_unitario', 'subtotal']
 
 
+def prefetch_direccion_envio():
+    """Prefetch de las direcciones de los usuarios (principal primero) para PedidoListSerializer."""
+    return Prefetch(
+        'usuario__direcciones',
+        queryset=Direccion.objects.order_by('-is_primary', '-created_at'),
+        to_attr='direcciones_envio',
+    )
+
+
+PAGO_VACIO = {
+    'metodo_pago': SIN_METODO,
+    'metodo_pago_display': SIN_METODO,
+    'pago_id': None,
+    'pago_status': None,
+    'pago_status_display': None,
+    'pago_status_detail': None,
+    'pago_payment_id': None,
+    'pago_fecha_creacion': None,
+    'pago_fecha_aprobacion': None,
+}
+
+
+def resumen_pago(pedido):
+    """Campos de PedidoListSerializer derivados del pago, resueltos en una sola pasada."""
+    pago = getattr(pedido, 'pago', None)
+    if pago is None:
+        return PAGO_VACIO
+    return {
+        # metodo_pago se conserva por compatibilidad con clientes anteriores
+        'metodo_pago': pago.metodo_pago_display,
+        'metodo_pago_display': pago.metodo_pago_display,
+        'pago_id': pago.id,
+        'pago_status': pago.status,
+        'pago_status_display': pago.get_status_display(),
+        'pago_status_detail': pago.status_detail,
+        'pago_payment_id': pago.payment_id,
+        'pago_fecha_creacion': pago.fecha_creacion,
+        'pago_fecha_aprobacion': pago.fecha_aprobacion,
+    }
+
+
 class PedidoListSerializer(serializers.ModelSerializer):
     items = PedidoItemListSerializer(many=True, read_only=True)
     usuario_nombre = serializers.SerializerMethodField()
     usuario_email = serializers.ReadOnlyField(source='usuario.email')
-    metodo_pago = serializers.SerializerMethodField()
-    metodo_pago_display = serializers.SerializerMethodField()
-    pago_id = serializers.SerializerMethodField()
-    pago_status = serializers.SerializerMethodField()
-    pago_status_display = serializers.SerializerMethodField()
-    pago_status_detail = serializers.SerializerMethodField()
-    pago_payment_id = serializers.SerializerMethodField()
-    pago_fecha_creacion = serializers.SerializerMethodField()
-    pago_fecha_aprobacion = serializers.SerializerMethodField()
     numero_seguimiento = serializers.CharField(allow_null=True, required=False)
     direccion_envio = serializers.SerializerMethodField()
 
@@ -185,19 +148,17 @@ class PedidoListSerializer(serializers.ModelSerializer):
             'items',
             'usuario_nombre',
             'usuario_email',
-            'metodo_pago',
-            'metodo_pago_display',
-            'pago_id',
-            'pago_status',
-            'pago_status_display',
-            'pago_status_detail',
-            'pago_payment_id',
-            'pago_fecha_creacion',
-            'pago_fecha_aprobacion',
             'numero_seguimiento',
             'direccion_envio',
         ]
 
+    def to_representation(self, instance):
+        # Los campos del pago (ver PAGO_VACIO) salen de resumen_pago en lugar de
+        # nueve SerializerMethodField que accedían a obj.pago cada uno
+        data = super().to_representation(instance)
+        data.update(resumen_pago(instance))
+        return data
+
     def get_usuario_nombre(self, obj):
         """Retorna el nombre completo del usuario, o nombre de invitado si es guest"""
         if not obj.usuario:
@@ -207,130 +168,44 @@ class PedidoListSerializer(serializers.ModelSerializer):
             return nombre_completo if nombre_completo else obj.usuario.username
         return obj.usuario.username
 
-    def get_metodo_pago(self, obj):
-        """Retorna el método de pago formateado desde la relación con Pago (mantiene compatibilidad)"""
-        return self.get_metodo_pago_display(obj)
-
-    def get_metodo_pago_display(self, obj):
-        """Retorna el método de pago formateado desde la relación con Pago"""
-        try:
-            pago = obj.pago
-            if not pago:
-                return 'No especificado'
-            
-            # Mapeo de payment_type_id (tipo principal de pago)
-            tipo_map = {
-                'credit_card': 'Tarjeta de crédito',
-                'debit_card': 'Tarjeta de débito',
-                'ticket': 'Efectivo',
-                'bank_transfer': 'Transferencia bancaria',
-                'account_money': 'Dinero en cuenta',
-                'atm': 'Cajero automático',
-            }
-            
-            # Mapeo de payment_method_id (método específico)
-            metodo_map = {
-                'visa': 'Visa',
-                'master': 'Mastercard',
-                'amex': 'American Express',
-                'oxxo': 'OXXO',
-                'spei': 'SPEI',
-                'account_money': 'Dinero en cuenta',
-                'ticket': 'Efectivo',
-                'bank_transfer': 'Transferencia bancaria',
-                'atm': 'Cajero automático',
-            }
-            
-            # Priorizar payment_type_id si existe
-            if pago.payment_type_id:
-                tipo = tipo_map.get(pago.payment_type_id.lower(), pago.payment_type_id.title())
-                
-                # Si también hay payment_method_id, agregarlo como detalle
-                if pago.payment_method_id and pago.payment_method_id.lower() not in ['credit_card', 'debit_card', 'ticket']:
-                    metodo = metodo_map.get(pago.payment_method_id.lower(), pago.payment_method_id.title())
-                    # Solo agregar si es diferente y aporta información
-                    if metodo.lower() != tipo.lower() and metodo.lower() not in ['tarjeta de crédito', 'tarjeta de débito']:
-                        return f"{tipo} - {metodo}"
-                
-                return tipo
-            
-            # Si solo hay payment_method_id
-            if pago.payment_method_id:
-                return metodo_map.get(pago.payment_method_id.lower(), pago.payment_method_id.title())
-            
-            return 'No especificado'
-        except Exception:
-            return 'No especificado'
-
-    def get_pago_id(self, obj):
-        """Retorna el ID del pago asociado"""
-        try:
-            return obj.pago.id if obj.pago else None
-        except Exception:
-            return None
-
-    def get_pago_status(self, obj):
-        """Retorna el status del pago"""
-        try:
-            return obj.pago.status if obj.pago else None
-        except Exception:
-            return None
-
-    def get_pago_status_display(self, obj):
-        """Retorna el status del pago formateado"""
-        try:
-            if obj.pago:
-                return obj.pago.get_status_display()
-            return None
-        except Exception:
-            return None
-
-    def get_pago_status_detail(self, obj):
-        """Retorna el detalle del status del pago"""
-        try:
-            return obj.pago.status_detail if obj.pago else None
-        except Exception:
-            return None
-
-    def get_pago_payment_id(self, obj):
-        """Retorna el payment_id de Mercado Pago"""
-        try:
-            return obj.pago.payment_id if obj.pago else None
-        except Exception:
-            return None
-
-    def get_pago_fecha_creacion(self, obj):
-        """Retorna la fecha de creación del pago"""
-        try:
-            return obj.pago.fecha_creacion if obj.pago else None
-        except Exception:
-            return None
-
-    def get_pago_fecha_aprobacion(self, obj):
-        """Retorna la fecha de aprobación del pago"""
-        try:
-            return obj.pago.fecha_aprobacion if obj.pago else None
-        except Exception:
+    def _direccion_principal(self, obj):
+        """Dirección principal del usuario del pedido (prefetch_direccion_envio evita la consulta)."""
+        if not obj.usuario_id:
             return None
+        # Con prefetch_direccion_envio() ya vienen ordenadas (principal primero)
+        direcciones = getattr(obj.usuario, 'direcciones_envio', None)
+        if direcciones is None:
+            return obj.usuario.direcciones.order_by('-is_primary', '-created_at').first()
+        return direcciones[0] if direcciones else None
 
     def get_direccion_envio(self, obj):
-        """Retorna la dirección principal del usuario como snapshot"""
-        try:
-            addr = obj.usuario.direcciones.filter(is_primary=True).first()
-            if not addr:
-                addr = obj.usuario.direcciones.order_by('-created_at').first()
-            if not addr:
-                return None
+        """Dirección de envío: la capturada en el checkout o, si no hay, la principal del usuario"""
+        snapshot = obj.direccion_snapshot or {}
+        if any(snapshot.values()):
+            nombre = obj.guest_name
+            if not nombre and obj.usuario_id:
+                # Los pedidos de usuarios registrados también guardan snapshot, sin nombre
+                addr = self._direccion_principal(obj)
+                nombre = addr.nombre if addr else self.get_usuario_nombre(obj)
             return {
-                'nombre': addr.nombre,
-                'street': addr.street,
-                'colony': addr.colony,
-                'city': addr.city,
-                'state': addr.state,
-                'postal_code': addr.postal_code,
-                'references': addr.references,
+                'nombre': nombre or '',
+                'street': snapshot.get('calle', ''),
+                'colony': snapshot.get('colonia', ''),
+                'city': snapshot.get('ciudad', ''),
+                'state': snapshot.get('estado', ''),
+                'postal_code': snapshot.get('codigo_postal', ''),
+                'references': snapshot.get('notas', ''),
             }
-        except Exception:
-            return None
-
 
+        addr = self._direccion_principal(obj)
+        if not addr:
+            return None
+        return {
+            'nombre': addr.nombre,
+            'street': addr.street,
+            'colony': addr.colony,
+            'city': addr.city,
+            'state': addr.state,
+            'postal_code': addr.postal_code,
+            'references': addr.references,
+        }
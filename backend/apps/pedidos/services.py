@@ -1,12 +1,103 @@
 """
-Servicios para procesar pedidos después de la aprobación del pago
+Servicios de pedidos: checkout (alta del pedido y cobro con Mercado Pago),
+surtido después de la aprobación del pago y estadísticas para el panel.
 """
+import logging
+import os
+
+import mercadopago
+from django.core.cache import cache
 from django.db import transaction
-from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
-from apps.inventario.services import registrar_salida_por_compra
+from apps.common.cache import clave_cache
+from apps.inventario.models import Inventario
+from apps.inventario.services import (
+    consumir_reservas, liberar_reservas_vencidas, registrar_salidas_en_lote, reservado_por_pedido,
+    reservar_stock,
+)
+from apps.pagos.models import Pago
+from apps.productos.models import Refaccion
 from apps.ventas.models import Ventas
-from .models import Pedido
+from apps.ventas.services import acumular_registros
+from .models import Pedido, PedidoItem
+
+logger = logging.getLogger(__name__)
+
+
+def _bloquear_refacciones_para_checkout(refaccion_ids):
+    """{id: Refaccion} bloqueadas (orden de pk) con el precio de checkout anotado.
+
+    Antes se liberan las reservas vencidas de esas refacciones, para que
+    Refaccion.disponible no cuente apartados que ya expiraron. El precio sigue
+    saliendo del movimiento de inventario más antiguo con cantidad disponible
+    (o del precio de la refacción si no hay movimientos).
+    """
+    liberar_reservas_vencidas(refaccion_ids=refaccion_ids)
+    primer_movimiento = (
+        Inventario.objects
+        .filter(refaccion=OuterRef('pk'), cantidad__gt=0)
+        .order_by('fecha', 'id')
+    )
+    refacciones = (
+        Refaccion.objects
+        .filter(pk__in=refaccion_ids)
+        .only('id', 'nombre', 'disponible', 'precio')
+        .select_for_update(of=('self',))
+        .order_by('pk')
+        .annotate(
+            precio_checkout=Coalesce(Subquery(primer_movimiento.values('precio_unitario')[:1]), F('precio')),
+        )
+    )
+    return {refaccion.pk: refaccion for refaccion in refacciones}
+
+
+def crear_items_pedido(pedido, items):
+    """Valida en memoria, crea en lote (bulk_create) las partidas del pedido y reserva su stock.
+
+    `items` es una lista de {'refaccion': id, 'cantidad'}; regresa el total.
+    Lanza ValueError si alguna refacción no existe o no tiene stock disponible
+    (Refaccion.disponible: existencias menos lo reservado por pedidos sin pagar).
+    Debe llamarse dentro de una transacción: las refacciones quedan bloqueadas hasta el commit.
+    """
+    refacciones = _bloquear_refacciones_para_checkout({item['refaccion'] for item in items})
+
+    pedidas = {}
+    partidas = []
+    total = 0
+    for item in items:
+        if item['cantidad'] < 1:
+            raise ValueError('La cantidad debe ser mayor a cero')
+        refaccion = refacciones.get(item['refaccion'])
+        if refaccion is None:
+            raise ValueError(f'La refacción {item["refaccion"]} no existe')
+        disponible = refaccion.disponible
+        if not disponible:
+            raise ValueError(f'No hay stock disponible para {refaccion.nombre}')
+        # Las partidas repetidas de una misma refacción se validan contra su suma
+        pedidas[refaccion.pk] = pedidas.get(refaccion.pk, 0) + item['cantidad']
+        if disponible < pedidas[refaccion.pk]:
+            raise ValueError(f'Stock insuficiente para {refaccion.nombre}. Disponible: {disponible}')
+
+        subtotal = item['cantidad'] * refaccion.precio_checkout
+        partidas.append(PedidoItem(
+            pedido=pedido,
+            refaccion=refaccion,
+            cantidad=item['cantidad'],
+            precio_unitario=refaccion.precio_checkout,
+            subtotal=subtotal,
+        ))
+        total += subtotal
+
+    PedidoItem.objects.bulk_create(partidas)
+    reservar_stock(pedido, pedidas)
+    return total
+
+
+class PedidoYaProcesado(ValueError):
+    """El pedido ya no está CREADO: otra notificación del mismo pago lo surtió antes."""
 
 
 def procesar_pedido_pagado(pedido_id):
@@ -16,47 +107,201 @@ def procesar_pedido_pagado(pedido_id):
     - Registrar salidas de inventario
     - Registrar ventas
     - Actualizar estado del pedido
+
+    Todo el pedido se surte en lote (registrar_salidas_en_lote + bulk_create de ventas),
+    así que el número de consultas no crece con la cantidad de partidas.
     """
     try:
-        pedido = Pedido.objects.select_related('usuario').prefetch_related('items__refaccion').get(id=pedido_id)
-        
-        # Verificar que el pedido esté en estado CREADO
-        if pedido.estado != Pedido.EstadoChoices.CREADO:
-            raise ValueError(f'El pedido {pedido_id} ya fue procesado o está en estado {pedido.estado}')
-        
-        movimientos = []
         with transaction.atomic():
-            # Procesar cada item del pedido
-            for item in pedido.items.all():
-                # Registrar salida de inventario
-                movimiento = registrar_salida_por_compra(
-                    refaccion=item.refaccion,
-                    cantidad=item.cantidad,
-                )
-                movimientos.append(movimiento)
-                
-                # Registrar venta
-                Ventas.objects.create(
+            # Bloquear el pedido evita que dos webhooks lo surtan a la vez
+            pedido = Pedido.objects.select_for_update(of=('self',)).select_related('usuario').get(id=pedido_id)
+
+            # Verificar que el pedido esté en estado CREADO
+            if pedido.estado != Pedido.EstadoChoices.CREADO:
+                raise PedidoYaProcesado(f'El pedido {pedido_id} ya fue procesado o está en estado {pedido.estado}')
+
+            items = list(pedido.items.order_by('id'))
+            # El pedido puede tomar lo que él mismo apartó en el checkout
+            movimientos = registrar_salidas_en_lote(
+                ((item.refaccion_id, item.cantidad, None) for item in items),
+                apartado=reservado_por_pedido(pedido.id),
+            )
+
+            # Registrar ventas (bulk_create no dispara señales: el resumen diario se acumula aparte)
+            ventas = Ventas.objects.bulk_create([
+                Ventas(
                     usuario=pedido.usuario,
                     marca=movimiento.marca,
-                    refaccion=item.refaccion,
+                    refaccion=movimiento.refaccion,
                     cantidad=movimiento.cantidad,
                     precio_unitario=movimiento.precio_unitario,
                     total=item.subtotal,
                 )
-            
+                for item, movimiento in zip(items, movimientos)
+            ])
+            acumular_registros(ventas)
+
+            # El stock apartado en el checkout ya salió del inventario
+            consumir_reservas(pedido.id)
+
             # Actualizar estado del pedido a PAGADO
             pedido.estado = Pedido.EstadoChoices.PAGADO
             pedido.save(update_fields=['estado'])
-        
+
         return {
             'pedido_id': pedido.id,
             'movimientos': movimientos,
             'success': True
         }
-    
+
     except Pedido.DoesNotExist:
         raise ValueError(f'Pedido {pedido_id} no encontrado')
-    except Exception as e:
-        raise ValueError(f'Error al procesar pedido: {str(e)}')
 
+
+# ── Checkout ─────────────────────────────────────────────────────────────────────
+# El pedido (y su Pago pendiente) se crea en una transacción corta; la llamada a
+# Mercado Pago ocurre después del commit, sin bloqueos abiertos, y el resultado
+# se registra en otra transacción corta.
+
+class ErrorCobro(Exception):
+    """Mercado Pago no aceptó la solicitud de cobro; el pedido se descartó."""
+
+
+def crear_pedido(items, usuario=None, direccion=None, invitado=None, con_pago=False):
+    """Crea un pedido CREADO con sus partidas (y opcionalmente su Pago PENDIENTE).
+
+    `invitado` es {'guest_name', 'guest_email', 'guest_phone'} para compras sin cuenta.
+    Lanza ValueError si alguna partida no es válida; en ese caso no se crea nada.
+    """
+    with transaction.atomic():
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            estado=Pedido.EstadoChoices.CREADO,
+            total=0,
+            direccion_snapshot=direccion or {},
+            **(invitado or {}),
+        )
+        pedido.total = crear_items_pedido(pedido, items)
+        pedido.save(update_fields=['total'])
+        if con_pago:
+            pedido.pago = Pago.objects.create(
+                pedido=pedido,
+                usuario=usuario,
+                amount=pedido.total,
+                currency='MXN',
+                status=Pago.EstadoChoices.PENDIENTE,
+            )
+    return pedido
+
+
+def _descartar_pedido(pedido):
+    with transaction.atomic():
+        Pago.objects.filter(pedido=pedido).delete()
+        pedido.delete()
+
+
+def _solicitar_cobro_mp(payload):
+    access_token = os.getenv('MERCADOPAGO_ACCESS_TOKEN')
+    if not access_token:
+        raise RuntimeError('MERCADOPAGO_ACCESS_TOKEN faltante')
+    return mercadopago.SDK(access_token).payment().create(payload)
+
+
+def checkout_con_mercado_pago(items, payment_payload, usuario=None, direccion=None, invitado=None,
+                              tipo_pago=None):
+    """Crea el pedido y lo cobra con Mercado Pago.
+
+    `payment_payload` es el cuerpo para MP sin `transaction_amount` (se toma del
+    total del pedido). Regresa (pedido, payment); si MP rechaza el pago el pedido se
+    elimina y `pedido` es None. Lanza ValueError (partidas) o ErrorCobro (MP).
+    """
+    pedido = crear_pedido(items, usuario=usuario, direccion=direccion, invitado=invitado, con_pago=True)
+    pago = pedido.pago
+
+    # Fuera de toda transacción: no se retienen bloqueos durante la llamada HTTP
+    try:
+        respuesta = _solicitar_cobro_mp({**payment_payload, 'transaction_amount': float(pedido.total)})
+    except Exception:
+        _descartar_pedido(pedido)
+        raise
+    if respuesta.get('status') not in [200, 201]:
+        _descartar_pedido(pedido)
+        raise ErrorCobro(respuesta.get('response', {}))
+
+    payment = respuesta['response']
+    mp_status = payment.get('status')
+    if mp_status == 'rejected':
+        # Pago rechazado → eliminar pedido y pago (sin pedidos huérfanos)
+        _descartar_pedido(pedido)
+        return None, payment
+
+    pago.payment_id = str(payment['id'])
+    pago.status_detail = payment.get('status_detail')
+    pago.payment_method_id = payment.get('payment_method_id') or payment_payload.get('payment_method_id')
+    pago.payment_type_id = payment.get('payment_type_id') or tipo_pago
+    pago.mp_data = payment
+    if mp_status == 'approved':
+        pago.status = Pago.EstadoChoices.APROBADO
+        pago.fecha_aprobacion = timezone.now()
+    pago.save()
+
+    if mp_status == 'approved':
+        try:
+            # Surte el pedido y lo pasa a PAGADO
+            procesar_pedido_pagado(pedido.id)
+        except Exception:
+            # MP ya cobró: no revertimos el pago; la notificación de MP (aplicar_pago_mp)
+            # vuelve a intentar surtir el pedido mientras siga CREADO
+            logger.exception('Pago %s aprobado pero el pedido %s no se surtió', pago.id, pedido.id)
+        pedido.refresh_from_db(fields=['estado'])
+    return pedido, payment
+
+
+# ── Estadísticas del panel ──────────────────────────────────────────────────────
+# El panel consulta este resumen con frecuencia; se calcula en una sola consulta
+# (agregación condicional) y se guarda unos segundos en caché. Los receivers de
+# Pedido y Pago lo invalidan al cambiar un pedido o su pago.
+
+ESTADISTICAS_CACHE_KEY = clave_cache('pedidos', 'estadisticas')
+ESTADISTICAS_TTL = 30  # segundos
+PAGO_ESTADOS_CONTADOS = ['APR', 'PEN']
+
+
+def _calcular_estadisticas():
+    agregados = {
+        'pedidos': Count('id'),
+        'ingresos': Sum('total'),
+        'sin_pago': Count('id', filter=Q(pago__isnull=True)),
+        'pago_otro': Count('id', filter=Q(pago__isnull=False) & ~Q(pago__status__in=PAGO_ESTADOS_CONTADOS)),
+    }
+    for estado in Pedido.EstadoChoices.values:
+        agregados[f'estado_{estado}'] = Count('id', filter=Q(estado=estado))
+    for status in PAGO_ESTADOS_CONTADOS:
+        agregados[f'pago_{status}'] = Count('id', filter=Q(pago__status=status))
+    fila = Pedido.objects.order_by().aggregate(**agregados)
+
+    return {
+        'total': fila['pedidos'],
+        'revenue': float(fila['ingresos'] or 0),
+        'por_estado': {estado: fila[f'estado_{estado}'] for estado in Pedido.EstadoChoices.values},
+        'por_pago': {
+            'APR': fila['pago_APR'],
+            'PEN': fila['pago_PEN'],
+            'REJ': fila['pago_otro'],
+            'sin_pago': fila['sin_pago'],
+        },
+    }
+
+
+def estadisticas_pedidos():
+    """Conteos por estado de pedido y de pago, más el total vendido (cacheado ESTADISTICAS_TTL s)."""
+    datos = cache.get(ESTADISTICAS_CACHE_KEY)
+    if datos is None:
+        datos = _calcular_estadisticas()
+        cache.set(ESTADISTICAS_CACHE_KEY, datos, ESTADISTICAS_TTL)
+    return datos
+
+
+def invalidar_estadisticas_pedidos():
+    """Descarta el resumen cacheado al confirmarse la transacción en curso."""
+    transaction.on_commit(lambda: cache.delete(ESTADISTICAS_CACHE_KEY))
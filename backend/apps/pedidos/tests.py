@@ -1,9 +1,21 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta
 
-from apps.productos.models import Refaccion, Categoria
+from apps.productos.models import Marca, Refaccion, Categoria
+from apps.pedidos.models import Pedido, PedidoItem
+from apps.pedidos.services import procesar_pedido_pagado
+from apps.inventario.models import ReservaStock
+from apps.inventario.services import liberar_reservas_vencidas, reconciliar_reservado, registrar_entrada_manual
+from apps.pagos.models import Pago
+from apps.ventas.models import Ventas
+from apps.usuarios.models import Direccion
 
 
 class CheckoutFlowTest(TestCase):
@@ -13,7 +25,7 @@ class CheckoutFlowTest(TestCase):
         self.user = self.User.objects.create_user(username='buyer', password='secret')
         self.categoria = Categoria.objects.create(nombre='Cat', descripcion='')
         self.ref = Refaccion.objects.create(
-            codigo_parte='CP-1', nombre='Ref1', descripcion='', marca='Marca1', categoria=self.categoria,
+            codigo_parte='CP-1', nombre='Ref1', descripcion='', marca=Marca.objects.create(nombre='Marca1'), categoria=self.categoria,
             precio=150, existencias=10, compatibilidad=''
         )
 
@@ -49,4 +61,257 @@ class CheckoutFlowTest(TestCase):
         self.assertEqual(res_self.status_code, 200)
         self.assertGreaterEqual(len(res_self.data), 1)
 
+
+class CheckoutEnLoteTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='buyer', password='secret')
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        marca = Marca.objects.create(nombre='Marca1')
+        self.refs = []
+        for i in range(5):
+            ref = Refaccion.objects.create(
+                codigo_parte=f'CP-{i}', nombre=f'Ref{i}', descripcion='', marca=marca, categoria=categoria,
+                precio=100, existencias=0, compatibilidad=''
+            )
+            registrar_entrada_manual(ref, 4, precio_unitario=100 + i)
+            self.refs.append(ref)
+
+    def test_partidas_en_lote_con_consultas_constantes(self):
+        self.client.force_authenticate(user=self.user)
+        items = [{'refaccion': ref.id, 'cantidad': 2} for ref in self.refs]
+        with self.assertNumQueries(9):
+            res = self.client.post(reverse('pedidos:checkout'), data={'items': items}, format='json')
+        self.assertEqual(res.status_code, 201, res.data)
+        pedido = Pedido.objects.get(id=res.data['pedido_id'])
+        self.assertEqual(pedido.items.count(), 5)
+        self.assertEqual(pedido.total, sum(2 * (100 + i) for i in range(5)))
+
+    def test_valida_stock_sumando_partidas_repetidas(self):
+        self.client.force_authenticate(user=self.user)
+        items = [{'refaccion': self.refs[0].id, 'cantidad': 3}, {'refaccion': self.refs[0].id, 'cantidad': 2}]
+        res = self.client.post(reverse('pedidos:checkout'), data={'items': items}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Stock insuficiente', str(res.data))
+        self.assertFalse(Pedido.objects.exists())
+
+        res = self.client.post(reverse('pedidos:checkout'), data={'items': [{'refaccion': 999, 'cantidad': 1}]}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+
+class ReservaStockTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='buyer', password='secret')
+        self.client.force_authenticate(user=self.user)
+        self.ref = Refaccion.objects.create(
+            codigo_parte='CP-1', nombre='Ref1', descripcion='', marca=Marca.objects.create(nombre='Marca1'),
+            categoria=Categoria.objects.create(nombre='Cat', descripcion=''),
+            precio=100, existencias=0, compatibilidad=''
+        )
+        registrar_entrada_manual(self.ref, 3)
+
+    def _checkout(self, cantidad):
+        return self.client.post(
+            reverse('pedidos:checkout'), data={'items': [{'refaccion': self.ref.id, 'cantidad': cantidad}]}, format='json'
+        )
+
+    def test_checkout_reserva_y_evita_sobreventa(self):
+        res = self._checkout(2)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(ReservaStock.objects.get().cantidad, 2)
+
+        res = self._checkout(2)
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Disponible: 1', str(res.data))
+        self.assertEqual(self._checkout(1).status_code, 201)
+
+    def test_pago_consume_y_cancelacion_libera(self):
+        pagado = Pedido.objects.get(id=self._checkout(2).data['pedido_id'])
+        procesar_pedido_pagado(pagado.id)
+        self.assertEqual(pagado.reservas.get().estado, ReservaStock.EstadoChoices.CONSUMIDA)
+
+        cancelado = Pedido.objects.get(id=self._checkout(1).data['pedido_id'])
+        cancelado.estado = Pedido.EstadoChoices.CANCELADO
+        cancelado.save()
+        self.assertEqual(cancelado.reservas.get().estado, ReservaStock.EstadoChoices.LIBERADA)
+        self.assertEqual(self._checkout(1).status_code, 201)
+
+    def test_reservas_vencidas_se_liberan(self):
+        self._checkout(3)
+        self.ref.refresh_from_db()
+        self.assertEqual((self.ref.existencias, self.ref.reservado, self.ref.disponible), (3, 3, 0))
+        self.assertEqual(self._checkout(1).status_code, 400)
+
+        ReservaStock.objects.update(expira_en=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_reservas_vencidas(), 1)
+        self.ref.refresh_from_db()
+        self.assertEqual((self.ref.reservado, self.ref.disponible), (0, 3))
+
+        # El checkout también libera en línea lo vencido de sus refacciones
+        self._checkout(3)
+        ReservaStock.objects.filter(estado=ReservaStock.EstadoChoices.ACTIVA).update(
+            expira_en=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(self._checkout(2).status_code, 201)
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.reservado, 2)
+
+    def test_venta_de_mostrador_no_toma_lo_apartado(self):
+        pedido = Pedido.objects.get(id=self._checkout(2).data['pedido_id'])
+        admin = get_user_model().objects.create_superuser(username='admin', password='secret')
+        self.client.force_authenticate(user=admin)
+
+        venta = {'refaccion': self.ref.id, 'cantidad': 2, 'precio_unitario': '100.00'}
+        res = self.client.post(reverse('ventas-list'), data=venta, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('disponible 1', str(res.data))
+        self.assertEqual(self.client.post(reverse('ventas-list'), data={**venta, 'cantidad': 1}, format='json').status_code, 201)
+
+        # El pedido pagado sí surte lo que apartó
+        procesar_pedido_pagado(pedido.id)
+        self.ref.refresh_from_db()
+        self.assertEqual((self.ref.existencias, self.ref.reservado), (0, 0))
+
+    def test_reconciliar_reservado(self):
+        self._checkout(2)
+        Refaccion.objects.filter(pk=self.ref.pk).update(reservado=0)
+        self.assertEqual(reconciliar_reservado(), 1)
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.reservado, 2)
+
+class ProcesarPedidoPagadoTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='buyer', password='secret')
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        marca = Marca.objects.create(nombre='Marca1')
+        self.refs = [
+            Refaccion.objects.create(
+                codigo_parte=f'CP-{i}', nombre=f'Ref{i}', descripcion='', marca=marca, categoria=categoria,
+                precio=100, existencias=5, compatibilidad=''
+            )
+            for i in range(3)
+        ]
+        self.pedido = Pedido.objects.create(usuario=self.user, total=0)
+
+    def _item(self, ref, cantidad):
+        PedidoItem.objects.create(
+            pedido=self.pedido, refaccion=ref, cantidad=cantidad, precio_unitario=100, subtotal=100 * cantidad
+        )
+
+    def test_surte_todo_el_pedido_en_lote(self):
+        self._item(self.refs[0], 2)
+        self._item(self.refs[1], 1)
+        self._item(self.refs[0], 1)
+        self._item(self.refs[2], 5)
+
+        with self.assertNumQueries(17):
+            resultado = procesar_pedido_pagado(self.pedido.id)
+
+        self.assertEqual(len(resultado['movimientos']), 4)
+        existencias = dict(Refaccion.objects.values_list('codigo_parte', 'existencias'))
+        self.assertEqual(existencias, {'CP-0': 2, 'CP-1': 4, 'CP-2': 0})
+        self.assertEqual(Ventas.objects.filter(usuario=self.user).count(), 4)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.PAGADO)
+
+    def test_stock_insuficiente_no_surte_nada(self):
+        self._item(self.refs[0], 3)
+        self._item(self.refs[0], 3)
+        with self.assertRaises(ValueError):
+            procesar_pedido_pagado(self.pedido.id)
+        self.refs[0].refresh_from_db()
+        self.assertEqual(self.refs[0].existencias, 5)
+        self.assertFalse(Ventas.objects.exists())
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, Pedido.EstadoChoices.CREADO)
+
+
+class PedidosStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='secret'))
+        self.pagado = Pedido.objects.create(total=100, estado=Pedido.EstadoChoices.PAGADO)
+        Pedido.objects.create(total=50)
+        self.pago = Pago.objects.create(pedido=self.pagado, amount=100, status=Pago.EstadoChoices.APROBADO)
+
+    def test_estadisticas_en_una_consulta_y_cacheadas(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('pedidos:pedidos_stats'))
+        self.assertEqual(res.data['total'], 2)
+        self.assertEqual(res.data['revenue'], 150.0)
+        self.assertEqual(res.data['por_estado'], {'CRE': 1, 'PAG': 1, 'ENV': 0, 'ENT': 0, 'CAN': 0})
+        self.assertEqual(res.data['por_pago'], {'APR': 1, 'PEN': 0, 'REJ': 0, 'sin_pago': 1})
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('pedidos:pedidos_stats'))
+
+    def test_cambio_de_pago_invalida_cache(self):
+        self.client.get(reverse('pedidos:pedidos_stats'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pago.status = Pago.EstadoChoices.RECHAZADO
+            self.pago.save()
+        res = self.client.get(reverse('pedidos:pedidos_stats'))
+        self.assertEqual(res.data['por_pago']['REJ'], 1)
+
 # Create your tests here.
+
+
+class DireccionEnvioListadoTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='secret'))
+
+    def _crear_pedidos(self, n):
+        User = get_user_model()
+        for i in range(n):
+            usuario = User.objects.create_user(username=f'cliente{Pedido.objects.count()}', password='x')
+            for principal in (False, True):
+                Direccion.objects.create(
+                    usuario=usuario, nombre='Casa' if principal else 'Oficina', street='Calle 1', colony='Centro',
+                    city='CDMX', state='CDMX', postal_code='01000', is_primary=principal,
+                )
+            Pedido.objects.create(usuario=usuario, total=10)
+
+    def test_listado_sin_consultas_por_pedido(self):
+        self._crear_pedidos(2)
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get(reverse('pedidos:all_pedidos'))
+        self._crear_pedidos(6)
+        with CaptureQueriesContext(connection) as muchos:
+            res = self.client.get(reverse('pedidos:all_pedidos'))
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual({p['direccion_envio']['nombre'] for p in res.data['results']}, {'Casa'})
+
+    def test_snapshot_del_checkout_tiene_prioridad(self):
+        Pedido.objects.create(
+            total=10, guest_name='Ana', guest_email='ana@example.com',
+            direccion_snapshot={'calle': 'Reforma 10', 'ciudad': 'CDMX', 'estado': 'CDMX', 'codigo_postal': '06600', 'notas': ''},
+        )
+        res = self.client.get(reverse('pedidos:all_pedidos'))
+        direccion = res.data['results'][0]['direccion_envio']
+        self.assertEqual((direccion['nombre'], direccion['street'], direccion['postal_code']), ('Ana', 'Reforma 10', '06600'))
+
+    def test_snapshot_de_usuario_registrado_conserva_el_nombre(self):
+        self._crear_pedidos(1)
+        Pedido.objects.update(direccion_snapshot={'calle': 'Juárez 5', 'ciudad': 'Puebla', 'codigo_postal': '72000'})
+        sin_direcciones = get_user_model().objects.create_user(username='luis', password='x', first_name='Luis', last_name='Pérez')
+        Pedido.objects.create(usuario=sin_direcciones, total=10, direccion_snapshot={'calle': 'Hidalgo 1'})
+
+        res = self.client.get(reverse('pedidos:all_pedidos'))
+        direcciones = {p['usuario_nombre']: p['direccion_envio'] for p in res.data['results']}
+        self.assertEqual((direcciones['cliente0']['nombre'], direcciones['cliente0']['street']), ('Casa', 'Juárez 5'))
+        self.assertEqual(direcciones['Luis Pérez']['nombre'], 'Luis Pérez')
+
+    def test_campos_del_pago(self):
+        con_pago = Pedido.objects.create(total=10, guest_name='Ana')
+        Pago.objects.create(pedido=con_pago, amount=10, payment_type_id='ticket', payment_method_id='oxxo', status='APR')
+        Pedido.objects.create(total=10, guest_name='Luis')
+        res = self.client.get(reverse('pedidos:all_pedidos'))
+        por_id = {p['id']: p for p in res.data['results']}
+        pagado = por_id[con_pago.id]
+        self.assertEqual((pagado['metodo_pago'], pagado['metodo_pago_display']), ('Efectivo - OXXO', 'Efectivo - OXXO'))
+        self.assertEqual((pagado['pago_status'], pagado['pago_status_display']), ('APR', 'Aprobado'))
+        sin_pago = next(p for p in res.data['results'] if p['id'] != con_pago.id)
+        self.assertEqual((sin_pago['metodo_pago_display'], sin_pago['pago_id']), ('No especificado', None))
@@ -1,14 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.utils import timezone
-from datetime import timedelta
 
 from rest_framework.permissions import AllowAny
-from .serializers import CheckoutSerializer, CheckoutInvitadoSerializer, PedidoListSerializer
+from .serializers import CheckoutSerializer, CheckoutInvitadoSerializer, PedidoListSerializer, prefetch_direccion_envio
 from .models import Pedido
-from .pagination import PedidoPagination, PedidoPagadoPagination
+from .pagination import PedidoKeysetPagination, PedidoPagination, PedidoPagadoPagination
+from apps.common.services import brevo_configurado, encolar_correo
+from .services import estadisticas_pedidos
+from apps.inventario.services import RESERVA_TTL
 
 class CheckoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -45,8 +47,8 @@ class MisPedidosView(APIView):
     pagination_class = PedidoPagination
 
     def get(self, request):
-        # Fecha límite: 3 días atrás
-        fecha_limite = timezone.now() - timedelta(days=3)
+        # Fecha límite: 3 días atrás (mismo plazo que duran las reservas de stock)
+        fecha_limite = timezone.now() - RESERVA_TTL
         
         # Filtrar pedidos:
         # 1. Pagados (PAG) o Enviados (ENV) - siempre se muestran
@@ -68,7 +70,7 @@ class MisPedidosView(APIView):
                 fecha_creacion__gte=fecha_limite,
                 pago__status__in=['PEN', 'REC', 'CAN']  # Pago pendiente, rechazado o cancelado
             )
-        ).select_related('usuario', 'pago').prefetch_related('items__refaccion').order_by('-fecha_creacion')
+        ).select_related('usuario', 'pago').prefetch_related('items__refaccion', prefetch_direccion_envio()).order_by('-fecha_creacion')
         
         # Aplicar paginación
         paginator = self.pagination_class()
@@ -94,7 +96,7 @@ class MisPedidosPagadosView(APIView):
             usuario=request.user,
             estado='ENT',  # Solo pedidos entregados
             pago__status='APR'  # Con pago aprobado
-        ).select_related('usuario', 'pago').prefetch_related('items__refaccion').order_by('-fecha_creacion')
+        ).select_related('usuario', 'pago').prefetch_related('items__refaccion', prefetch_direccion_envio()).order_by('-fecha_creacion')
         
         # Aplicar paginación
         paginator = self.pagination_class()
@@ -110,14 +112,14 @@ class MisPedidosPagadosView(APIView):
     
 class AllPedidosView(APIView):
     permission_classes = [permissions.IsAdminUser]
-    pagination_class = PedidoPagination
+    pagination_class = PedidoKeysetPagination
 
     def get(self, request):
-        pedidos = Pedido.objects.all().select_related('usuario', 'pago').prefetch_related('items__refaccion')
+        pedidos = Pedido.objects.all().select_related('usuario', 'pago').prefetch_related('items__refaccion', prefetch_direccion_envio())
         
-        # Aplicar paginación
+        # Aplicar paginación (por página, o por llave con ?cursor=)
         paginator = self.pagination_class()
-        page = paginator.paginate_queryset(pedidos, request)
+        page = paginator.paginate_queryset(pedidos, request, view=self)
         
         if page is not None:
             serializer = PedidoListSerializer(page, many=True)
@@ -129,13 +131,10 @@ class AllPedidosView(APIView):
 
 
 def _enviar_email_pedido_enviado(pedido):
-    """Envía email de notificación cuando un pedido cambia a estado ENV (Enviado)."""
+    """Encola el email de notificación cuando un pedido cambia a estado ENV (Enviado)."""
     try:
-        import brevo_python
         from django.conf import settings
-        if not getattr(settings, 'BREVO_API_KEY', None):
-            return
-        if not getattr(settings, 'BREVO_SENDER_EMAIL', None):
+        if not brevo_configurado():
             return
         if not pedido.usuario.email:
             return
@@ -237,32 +236,23 @@ def _enviar_email_pedido_enviado(pedido):
         </div>
         """
 
-        configuration = brevo_python.Configuration()
-        configuration.api_key['api-key'] = settings.BREVO_API_KEY
-        api = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-        api.send_transac_email(brevo_python.SendSmtpEmail(
-            to=[{"email": pedido.usuario.email}],
-            subject=f'Tu pedido #{pedido.id} fue enviado — {empresa}',
-            html_content=html_content,
-            sender={
-                "email": settings.BREVO_SENDER_EMAIL,
-                "name": getattr(settings, 'BREVO_SENDER_NAME', empresa),
-            },
-        ))
+        encolar_correo(
+            pedido.usuario.email,
+            asunto=f'Tu pedido #{pedido.id} fue enviado — {empresa}',
+            html=html_content,
+            categoria='pedido_enviado',
+        )
     except Exception as e:
         from django.conf import settings as _s
         if getattr(_s, 'DEBUG', False):
-            print(f"Error enviando email de envío (pedido #{pedido.id}): {e}")
+            print(f"Error encolando email de envío (pedido #{pedido.id}): {e}")
 
 
 def _enviar_email_pedido_entregado(pedido):
-    """Envía email de notificación cuando un pedido cambia a estado ENT (Entregado)."""
+    """Encola el email de notificación cuando un pedido cambia a estado ENT (Entregado)."""
     try:
-        import brevo_python
         from django.conf import settings
-        if not getattr(settings, 'BREVO_API_KEY', None):
-            return
-        if not getattr(settings, 'BREVO_SENDER_EMAIL', None):
+        if not brevo_configurado():
             return
         if not pedido.usuario.email:
             return
@@ -334,22 +324,16 @@ def _enviar_email_pedido_entregado(pedido):
         </div>
         """
 
-        configuration = brevo_python.Configuration()
-        configuration.api_key['api-key'] = settings.BREVO_API_KEY
-        api = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-        api.send_transac_email(brevo_python.SendSmtpEmail(
-            to=[{"email": pedido.usuario.email}],
-            subject=f'Tu pedido #{pedido.id} fue entregado — {empresa}',
-            html_content=html_content,
-            sender={
-                "email": settings.BREVO_SENDER_EMAIL,
-                "name": getattr(settings, 'BREVO_SENDER_NAME', empresa),
-            },
-        ))
+        encolar_correo(
+            pedido.usuario.email,
+            asunto=f'Tu pedido #{pedido.id} fue entregado — {empresa}',
+            html=html_content,
+            categoria='pedido_entregado',
+        )
     except Exception as e:
         from django.conf import settings as _s
         if getattr(_s, 'DEBUG', False):
-            print(f"Error enviando email de entrega (pedido #{pedido.id}): {e}")
+            print(f"Error encolando email de entrega (pedido #{pedido.id}): {e}")
 
 
 class UpdatePedidoEstadoView(APIView):
@@ -358,7 +342,7 @@ class UpdatePedidoEstadoView(APIView):
     def patch(self, request, pedido_id):
         """Actualiza el estado y/o número de seguimiento de un pedido"""
         try:
-            pedido = Pedido.objects.select_related('usuario', 'pago').prefetch_related('items__refaccion').get(id=pedido_id)
+            pedido = Pedido.objects.select_related('usuario', 'pago').prefetch_related('items__refaccion', prefetch_direccion_envio()).get(id=pedido_id)
         except Pedido.DoesNotExist:
             return Response({'error': 'Pedido no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -402,20 +386,6 @@ class PedidosStatsView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
-        qs = Pedido.objects.all()
-        total = qs.count()
-        revenue = qs.aggregate(total=Sum('total'))['total'] or 0
-        por_estado = {e: qs.filter(estado=e).count() for e in ['CRE', 'PAG', 'ENV', 'ENT', 'CAN']}
-        por_pago = {
-            'APR': qs.filter(pago__status='APR').count(),
-            'PEN': qs.filter(pago__status='PEN').count(),
-            'REJ': qs.exclude(pago__status__in=['APR', 'PEN']).filter(pago__isnull=False).count(),
-            'sin_pago': qs.filter(pago__isnull=True).count(),
-        }
-        return Response({
-            'total': total,
-            'revenue': float(revenue),
-            'por_estado': por_estado,
-            'por_pago': por_pago,
-        })
+        # Una sola consulta con agregación condicional, cacheada unos segundos
+        return Response(estadisticas_pedidos())
 
@@ -0,0 +1,141 @@
+"""
+Índice estructurado de compatibilidad (modelo de aparato <-> refacción).
+
+Refaccion.compatibilidad es texto libre ("LG WM3400, LG WM3500; Whirlpool WTW5000").
+Aquí se separa en modelos, se normaliza cada uno a una clave (ModeloAparato.clave) y
+se mantiene la relación many-to-many, para responder "¿qué piezas le quedan al
+modelo X?" con una búsqueda exacta o por prefijo sobre un índice. Cada modelo
+guarda también su clave sin la marca, así "WM3400" encuentra "LG WM3400".
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ModeloAparato, Refaccion
+from .search import normalizar
+
+TAMANO_LOTE = 500
+
+_SEPARADORES_RE = re.compile(r'[,;|\n\r]+')
+_NO_ALFANUMERICO_RE = re.compile(r'[^0-9a-z]+')
+_DIGITO_RE = re.compile(r'[0-9]')
+LARGO_CLAVE = ModeloAparato._meta.get_field('clave').max_length
+
+
+def clave_modelo(texto):
+    """'LG  wm-3400' -> 'LGWM3400' (recortada al largo de ModeloAparato.clave)"""
+    return _NO_ALFANUMERICO_RE.sub('', normalizar(texto)).upper()[:LARGO_CLAVE]
+
+
+def clave_sin_marca(nombre):
+    """'LG WM-3400' -> 'WM3400': quita las palabras iniciales sin dígitos (la marca) si queda un modelo."""
+    palabras = (nombre or '').split()
+    for i, palabra in enumerate(palabras):
+        if _DIGITO_RE.search(palabra):
+            return clave_modelo(' '.join(palabras[i:]))
+    return clave_modelo(nombre)
+
+
+def separar_modelos(texto):
+    """Regresa {clave: nombre} con los modelos mencionados en el texto de compatibilidad."""
+    modelos = {}
+    for parte in _SEPARADORES_RE.split(texto or ''):
+        nombre = ' '.join(parte.split())
+        clave = clave_modelo(nombre)
+        if clave and clave not in modelos:
+            modelos[clave] = nombre[:200]
+    return modelos
+
+
+def _resolver_modelos(modelos):
+    """Obtiene (creando los faltantes) los ModeloAparato de {clave: nombre}; regresa {clave: id}."""
+    if not modelos:
+        return {}
+    ids = dict(ModeloAparato.objects.filter(clave__in=modelos).values_list('clave', 'id'))
+    faltantes = [
+        ModeloAparato(clave=clave, clave_sin_marca=clave_sin_marca(nombre), nombre=nombre)
+        for clave, nombre in modelos.items() if clave not in ids
+    ]
+    if faltantes:
+        ModeloAparato.objects.bulk_create(faltantes, ignore_conflicts=True)
+        ids.update(ModeloAparato.objects.filter(clave__in=[m.clave for m in faltantes]).values_list('clave', 'id'))
+    return ids
+
+
+def sincronizar_compatibilidad(refaccion):
+    """Actualiza de forma incremental los modelos compatibles de una refacción.
+
+    Solo inserta/borra las filas de la relación que cambiaron.
+    """
+    sincronizar_catalogo([refaccion])
+
+
+def sincronizar_catalogo(refacciones):
+    """Sincroniza varias refacciones con un número fijo de consultas por lote."""
+    refacciones = list(refacciones)
+    if not refacciones:
+        return 0
+    deseados_por_refaccion = {r.pk: separar_modelos(r.compatibilidad) for r in refacciones}
+    todos = {}
+    for modelos in deseados_por_refaccion.values():
+        todos.update(modelos)
+
+    Relacion = ModeloAparato.refacciones.through
+    with transaction.atomic():
+        ids = _resolver_modelos(todos)
+        actuales = {}
+        for refaccion_id, modelo_id in Relacion.objects.filter(
+            refaccion_id__in=deseados_por_refaccion
+        ).values_list('refaccion_id', 'modeloaparato_id'):
+            actuales.setdefault(refaccion_id, set()).add(modelo_id)
+
+        nuevas = []
+        sobrantes = {}
+        for refaccion_id, modelos in deseados_por_refaccion.items():
+            deseados = {ids[clave] for clave in modelos if clave in ids}
+            existentes = actuales.get(refaccion_id, set())
+            nuevas.extend(
+                Relacion(refaccion_id=refaccion_id, modeloaparato_id=modelo_id)
+                for modelo_id in deseados - existentes
+            )
+            if existentes - deseados:
+                sobrantes[refaccion_id] = existentes - deseados
+
+        if nuevas:
+            Relacion.objects.bulk_create(nuevas, ignore_conflicts=True)
+        for refaccion_id, modelo_ids in sobrantes.items():
+            Relacion.objects.filter(refaccion_id=refaccion_id, modeloaparato_id__in=modelo_ids).delete()
+    return len(refacciones)
+
+
+def reconstruir_indice(queryset=None, tamano_lote=TAMANO_LOTE):
+    """Recorre el catálogo completo (o el queryset dado) sincronizando por lotes."""
+    if queryset is None:
+        queryset = Refaccion.objects.all()
+    queryset = queryset.only('pk', 'compatibilidad').order_by('pk')
+    total = 0
+    lote = []
+    for refaccion in queryset.iterator(chunk_size=tamano_lote):
+        lote.append(refaccion)
+        if len(lote) >= tamano_lote:
+            total += sincronizar_catalogo(lote)
+            lote = []
+    total += sincronizar_catalogo(lote)
+    return total
+
+
+def refacciones_compatibles(modelo, prefijo=False, queryset=None):
+    """Refacciones compatibles con un modelo (coincidencia exacta o por prefijo, con o sin marca)."""
+    if queryset is None:
+        queryset = Refaccion.objects.all()
+    clave = clave_modelo(modelo)
+    if not clave:
+        return queryset.none()
+    Relacion = ModeloAparato.refacciones.through
+    if prefijo:
+        coincide = Q(modeloaparato__clave__startswith=clave) | Q(modeloaparato__clave_sin_marca__startswith=clave)
+    else:
+        coincide = Q(modeloaparato__clave=clave) | Q(modeloaparato__clave_sin_marca=clave)
+    relaciones = Relacion.objects.filter(coincide)
+    return queryset.filter(pk__in=relaciones.values('refaccion_id'))
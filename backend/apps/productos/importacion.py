@@ -0,0 +1,256 @@
+"""
+Importación masiva del catálogo (lista de precios de un proveedor).
+
+Las filas se procesan por lotes, cada uno en una transacción: las refacciones se
+insertan o actualizan por `codigo_parte` con bulk_create/bulk_update, los slugs se
+asignan para todo el lote con una o dos consultas (en lugar del ciclo de
+Refaccion.save), las entradas iniciales de inventario se crean con un solo
+bulk_create y el índice de búsqueda y el de compatibilidad se actualizan por lote.
+"""
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify as django_slugify
+
+from .compatibility import sincronizar_catalogo
+from .listados import invalidar_listado_categoria
+from .models import Categoria, Marca, Refaccion
+from .search import indexar_refacciones
+
+TAMANO_LOTE = 500
+MAX_EXISTENCIAS = 2147483647  # PositiveIntegerField en Postgres
+
+# Columnas de texto que se copian tal cual si vienen en la fila
+CAMPOS_TEXTO = ('descripcion', 'compatibilidad', 'ubicacion_estante', 'imagen', 'descripcion_corta')
+
+
+def _slug_base(nombre, codigo_parte):
+    # Mismo criterio que Refaccion.save
+    return django_slugify(f"{nombre} {codigo_parte}")[:200]
+
+
+def _slugs_con_sufijo(bases):
+    """Slugs '<base>-N' ya guardados para las bases dadas."""
+    condicion = Q()
+    for base in bases:
+        condicion |= Q(slug__startswith=f'{base[:195]}-')
+    return set(Refaccion.objects.filter(condicion).values_list('slug', flat=True))
+
+
+def asignar_slugs(refacciones):
+    """Asigna slugs únicos a refacciones nuevas (sin slug) con un número fijo de consultas."""
+    pendientes = [ref for ref in refacciones if not ref.slug]
+    if not pendientes:
+        return
+    bases = [_slug_base(ref.nombre, ref.codigo_parte) for ref in pendientes]
+    ocupados = set(Refaccion.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+    # Las bases que chocan con la base de datos o se repiten en el lote necesitan
+    # conocer sus sufijos -N ya usados
+    repetidas = Counter(bases)
+    con_choque = {base for base in bases if base in ocupados or repetidas[base] > 1}
+    if con_choque:
+        ocupados.update(_slugs_con_sufijo(con_choque))
+
+    for ref, base in zip(pendientes, bases):
+        if base in ocupados and base not in con_choque:
+            # Choca con un slug asignado en este mismo lote ('a' -> 'a-1' y otra base 'a-1')
+            con_choque.add(base)
+            ocupados.update(_slugs_con_sufijo([base]))
+        slug, contador = base, 1
+        while slug in ocupados:
+            slug = f"{base[:195]}-{contador}"
+            contador += 1
+        ocupados.add(slug)
+        ref.slug = slug
+
+
+# Campo del modelo contra el que se valida cada columna (longitud, dígitos, URL, opciones);
+# una celda que no cabe en su columna haría fallar todo el lote en Postgres
+_CAMPOS_COLUMNA = {
+    'codigo_parte': Refaccion._meta.get_field('codigo_parte'),
+    'nombre': Refaccion._meta.get_field('nombre'),
+    'marca': Marca._meta.get_field('nombre'),
+    'categoria': Categoria._meta.get_field('nombre'),
+    'precio': Refaccion._meta.get_field('precio'),
+    'precio_tachado': Refaccion._meta.get_field('precio_tachado'),
+    'existencias': Refaccion._meta.get_field('existencias'),
+    'estado': Refaccion._meta.get_field('estado'),
+    **{campo: Refaccion._meta.get_field(campo) for campo in CAMPOS_TEXTO},
+}
+
+
+def _limpiar(campo, valor):
+    """Convierte y valida `valor` con el campo del modelo de la columna; lanza ValueError."""
+    try:
+        return _CAMPOS_COLUMNA[campo].clean(valor, None)
+    except ValidationError as e:
+        raise ValueError(f'{campo}: {" ".join(e.messages)}')
+
+
+def _normalizar_fila(fila):
+    """Valida una fila sin tocar la base; regresa un dict limpio o lanza ValueError."""
+    if '__error__' in fila:
+        raise ValueError(fila['__error__'])
+    datos = {}
+    codigo_parte = str(fila.get('codigo_parte') or '').strip()
+    if not codigo_parte:
+        raise ValueError('Falta codigo_parte.')
+    datos['codigo_parte'] = _limpiar('codigo_parte', codigo_parte)
+
+    for campo in ('nombre', 'marca', 'categoria', 'precio', 'precio_tachado'):
+        valor = str(fila.get(campo) or '').strip()
+        if valor:
+            datos[campo] = _limpiar(campo, valor)
+    if datos.get('precio_tachado') is not None and datos['precio_tachado'] < 0:
+        raise ValueError('precio_tachado no puede ser negativo.')
+
+    existencias = str(fila.get('existencias') or '').strip()
+    datos['existencias'] = _limpiar('existencias', existencias) if existencias else 0
+    # El rango del entero depende del motor (SQLite no lo limita): se fija el de Postgres
+    if datos['existencias'] > MAX_EXISTENCIAS:
+        raise ValueError(f'existencias no puede ser mayor a {MAX_EXISTENCIAS}.')
+
+    estado = str(fila.get('estado') or '').strip().upper()
+    if estado:
+        datos['estado'] = _limpiar('estado', estado)
+
+    for campo in CAMPOS_TEXTO:
+        if fila.get(campo) not in (None, ''):
+            datos[campo] = _limpiar(campo, str(fila[campo]).strip())
+    return datos
+
+
+def _resolver_catalogos(lote):
+    """Crea las marcas y categorías que falten; regresa ({nombre: Marca}, {nombre: Categoria})."""
+    marcas = {datos['marca'] for _, datos in lote if 'marca' in datos}
+    categorias = {datos['categoria'] for _, datos in lote if 'categoria' in datos}
+    if marcas:
+        Marca.objects.bulk_create([Marca(nombre=nombre) for nombre in marcas], ignore_conflicts=True)
+    if categorias:
+        Categoria.objects.bulk_create(
+            [Categoria(nombre=nombre, descripcion='') for nombre in categorias], ignore_conflicts=True
+        )
+    return (
+        {marca.nombre: marca for marca in Marca.objects.filter(nombre__in=marcas)} if marcas else {},
+        {categoria.nombre: categoria for categoria in Categoria.objects.filter(nombre__in=categorias)} if categorias else {},
+    )
+
+
+def _importar_lote(lote, errores):
+    """Inserta o actualiza un lote [(número, datos)]; regresa (creadas, actualizadas)."""
+    from apps.inventario.models import Inventario
+
+    with transaction.atomic():
+        marcas, categorias = _resolver_catalogos(lote)
+        existentes = {
+            ref.codigo_parte: ref
+            for ref in Refaccion.objects.select_related('categoria').select_for_update(of=('self',))
+            .filter(codigo_parte__in=[datos['codigo_parte'] for _, datos in lote])
+        }
+
+        nuevas, actualizadas, campos_actualizados = [], [], set()
+        ahora = timezone.now()
+        for numero, datos in lote:
+            ref = existentes.get(datos['codigo_parte'])
+            categoria = categorias.get(datos.get('categoria'))
+            if ref is None:
+                faltantes = [campo for campo in ('nombre', 'marca', 'categoria', 'precio') if campo not in datos]
+                if faltantes:
+                    errores.append({'fila': numero, 'error': f'Refacción nueva sin {", ".join(faltantes)}.'})
+                    continue
+                ref = Refaccion(
+                    codigo_parte=datos['codigo_parte'],
+                    nombre=datos['nombre'],
+                    marca=marcas[datos['marca']],
+                    categoria=categoria,
+                    precio=datos['precio'],
+                    precio_tachado=datos.get('precio_tachado'),
+                    # La entrada inicial se registra abajo como movimiento (sin doble conteo:
+                    # bulk_create no dispara el post_save de Inventario)
+                    existencias=datos['existencias'],
+                    estado=datos.get('estado', Refaccion.EstadoChoices.NUEVO),
+                    compatibilidad=datos.get('compatibilidad', ''),
+                    **{campo: datos[campo] for campo in CAMPOS_TEXTO if campo in datos and campo != 'compatibilidad'},
+                )
+                nuevas.append(ref)
+                continue
+
+            # Las existencias de refacciones ya dadas de alta solo cambian con movimientos
+            cambios = {campo: valor for campo, valor in datos.items() if campo not in ('codigo_parte', 'existencias')}
+            if 'categoria' in cambios:
+                cambios['categoria'] = categoria
+            for campo, valor in cambios.items():
+                # marca apunta a Marca.nombre: basta con asignar la llave
+                setattr(ref, 'marca_id' if campo == 'marca' else campo, valor)
+            ref.ultima_actualizacion = ahora
+            campos_actualizados.update(cambios)
+            actualizadas.append(ref)
+
+        asignar_slugs(nuevas)
+        Refaccion.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+        if actualizadas:
+            Refaccion.objects.bulk_update(
+                actualizadas, sorted(campos_actualizados | {'ultima_actualizacion'}), batch_size=TAMANO_LOTE
+            )
+
+        Inventario.objects.bulk_create([
+            Inventario(
+                refaccion=ref,
+                cantidad=ref.existencias,
+                precio_unitario=ref.precio,
+                marca=ref.marca,
+                categoria=ref.categoria,
+                tipo_movimiento=Inventario.TipoMovimientoChoices.ENTRADA,
+                observaciones='Entrada inicial (importación de catálogo)',
+            )
+            for ref in nuevas if ref.existencias > 0
+        ])
+
+        # bulk_create/bulk_update no disparan post_save: índices de búsqueda y compatibilidad por lote
+        indexar_refacciones(nuevas + actualizadas)
+        sincronizar_catalogo(nuevas + [ref for ref in actualizadas if 'compatibilidad' in campos_actualizados])
+        invalidar_listado_categoria(
+            *{ref.categoria_id for ref in nuevas + actualizadas},
+            *{ref._categoria_cargada for ref in actualizadas},
+        )
+    return len(nuevas), len(actualizadas)
+
+
+def importar_catalogo(filas, tamano_lote=TAMANO_LOTE):
+    """Inserta o actualiza refacciones por `codigo_parte` a partir de (número de fila, dict).
+
+    Columnas: codigo_parte (obligatoria), nombre, marca, categoria y precio (obligatorias
+    para altas), existencias (solo altas: se registra como entrada inicial), precio_tachado,
+    estado y las de texto de CAMPOS_TEXTO. Regresa {'procesadas', 'creadas', 'actualizadas', 'errores'}.
+    """
+    resultado = {'procesadas': 0, 'creadas': 0, 'actualizadas': 0, 'errores': []}
+    lote, codigos = [], {}
+
+    def escribir():
+        creadas, actualizadas = _importar_lote(lote, resultado['errores'])
+        resultado['creadas'] += creadas
+        resultado['actualizadas'] += actualizadas
+        lote.clear()
+        codigos.clear()
+
+    for numero, fila in filas:
+        resultado['procesadas'] += 1
+        try:
+            datos = _normalizar_fila(fila)
+        except ValueError as e:
+            resultado['errores'].append({'fila': numero, 'error': str(e)})
+            continue
+        if datos['codigo_parte'] in codigos:
+            # Un mismo código dos veces en el lote: se escribe lo anterior y se sigue
+            escribir()
+        codigos[datos['codigo_parte']] = numero
+        lote.append((numero, datos))
+        if len(lote) >= tamano_lote:
+            escribir()
+    if lote:
+        escribir()
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    return resultado
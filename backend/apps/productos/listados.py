@@ -0,0 +1,67 @@
+"""
+Listado paginado y memorizado de refacciones por categoría.
+
+Las respuestas se guardan en caché por URL completa (filtros, página o cursor,
+vista y campos) bajo un número de versión por categoría; al guardar o borrar una
+refacción de la categoría se sube la versión y todas sus páginas quedan obsoletas.
+Los cambios de existencias por movimientos (UPDATE con F, sin post_save) solo se
+reflejan al vencer LISTADO_TTL.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import Http404
+from rest_framework.pagination import PageNumberPagination
+
+from apps.common.cache import clave_cache, invalidar_grupo, version_grupo
+from apps.common.pagination import KeysetPagination
+
+from .models import Categoria
+
+LISTADO_TTL = 60 * 2  # segundos
+# Orden estable para paginar por página o por llave
+ORDEN_LISTADO = ('-fecha_ingreso', '-id')
+
+
+class RefaccionCategoriaPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def _clave_version(categoria_id):
+    return clave_cache('productos', 'categoria', categoria_id, 'version')
+
+
+def invalidar_listado_categoria(*categoria_ids):
+    """Marca como obsoletas todas las páginas memorizadas de las categorías dadas (al confirmar)."""
+    invalidar_grupo(*(_clave_version(c) for c in {c for c in categoria_ids if c is not None}))
+
+
+def clave_listado(categoria_id, request):
+    """
+    Llave de caché de una respuesta: versión de la categoría + hash de la URL pedida.
+    La versión (sin vencimiento) solo se crea para categorías que existen; un id
+    inexistente responde 404 sin dejar llaves en la caché.
+    """
+    version = cache.get(_clave_version(categoria_id))
+    if version is None:
+        if not Categoria.objects.filter(id=categoria_id).exists():
+            raise Http404('No existe la categoría')
+        version = version_grupo(_clave_version(categoria_id))
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return clave_cache('productos', 'categoria', categoria_id, version, url)
+
+
+def pagina_por_cursor(queryset, cursor, tamano):
+    """Regresa (refacciones de la página, cursor siguiente o None) en orden ORDEN_LISTADO.
+
+    `cursor` es el texto recibido ('' para la primera página), con el formato de
+    KeysetPagination; uno inválido lanza ValidationError.
+    """
+    valores = KeysetPagination.decodificar_cursor(queryset.model, ORDEN_LISTADO, cursor)
+    if valores is not None:
+        queryset = queryset.filter(KeysetPagination.despues_de(ORDEN_LISTADO, valores))
+    filas = list(queryset.order_by(*ORDEN_LISTADO)[:tamano + 1])
+    siguiente = KeysetPagination.codificar_cursor(filas[tamano - 1], ORDEN_LISTADO) if len(filas) > tamano else None
+    return filas[:tamano], siguiente
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.inventario.services import leer_csv, leer_jsonl
+from apps.productos.importacion import TAMANO_LOTE, importar_catalogo
+
+
+class Command(BaseCommand):
+    help = "Inserta o actualiza refacciones por codigo_parte desde un archivo CSV o JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo (.csv o .jsonl)')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default=None, help='Por omisión se toma de la extensión')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Refacciones por transacción')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or options['archivo'].rsplit('.', 1)[-1].lower()
+        if formato not in ('csv', 'jsonl', 'ndjson'):
+            raise CommandError('No se reconoce el formato; usa --formato csv|jsonl')
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        with archivo:
+            filas = leer_csv(archivo) if formato == 'csv' else leer_jsonl(archivo)
+            resultado = importar_catalogo(filas, tamano_lote=options['lote'])
+
+        for error in resultado['errores']:
+            self.stdout.write(f"Fila {error['fila']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creadas']} refacciones creadas y {resultado['actualizadas']} actualizadas "
+            f"de {resultado['procesadas']} filas ({len(resultado['errores'])} con error)"
+        ))
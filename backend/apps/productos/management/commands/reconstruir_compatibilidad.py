@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.productos.compatibility import reconstruir_indice, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de compatibilidad (modelos de aparato) a partir del texto de cada refacción"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Refacciones por lote')
+
+    def handle(self, *args, **options):
+        total = reconstruir_indice(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} refacciones sincronizadas'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.productos.search import reindexar_catalogo, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda del catálogo de refacciones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Refacciones por lote')
+
+    def handle(self, *args, **options):
+        total = reindexar_catalogo(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} refacciones indexadas'))
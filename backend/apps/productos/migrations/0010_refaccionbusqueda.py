@@ -0,0 +1,86 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:12
+
+import re
+import unicodedata
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+INDICES_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS productos_busqueda_vector_gin "
+    "ON productos_refaccionbusqueda USING gin (vector)",
+    "CREATE INDEX IF NOT EXISTS productos_busqueda_documento_trgm "
+    "ON productos_refaccionbusqueda USING gin (documento gin_trgm_ops)",
+]
+
+
+def crear_indices(apps, schema_editor):
+    # GIN (tsvector) y trigramas solo existen en PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in INDICES_POSTGRES:
+        schema_editor.execute(sql)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS productos_busqueda_documento_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS productos_busqueda_vector_gin")
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def construir_documento(refaccion):
+    codigo = _normalizar(refaccion.codigo_parte)
+    compacto = re.sub(r'[\s\-_./]+', '', codigo)
+    titulo = f"{_normalizar(refaccion.nombre)} {codigo if compacto == codigo else f'{codigo} {compacto}'}".strip()
+    partes = [titulo, _normalizar(refaccion.marca), _normalizar(refaccion.categoria.nombre), _normalizar(refaccion.compatibilidad)]
+    return titulo, ' '.join(p for p in partes if p)
+
+
+def poblar_indice(apps, schema_editor):
+    Refaccion = apps.get_model('productos', 'Refaccion')
+    RefaccionBusqueda = apps.get_model('productos', 'RefaccionBusqueda')
+    filas = []
+    for refaccion in Refaccion.objects.select_related('categoria').iterator(chunk_size=500):
+        titulo, documento = construir_documento(refaccion)
+        filas.append(RefaccionBusqueda(refaccion_id=refaccion.pk, titulo=titulo, documento=documento))
+    RefaccionBusqueda.objects.bulk_create(filas, batch_size=500)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE productos_refaccionbusqueda SET vector = "
+            "setweight(to_tsvector('simple', titulo), 'A') || setweight(to_tsvector('simple', documento), 'B')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_refaccion_seo_specs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefaccionBusqueda',
+            fields=[
+                ('refaccion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='productos.refaccion')),
+                ('titulo', models.CharField(max_length=400)),
+                ('documento', models.TextField()),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de búsqueda',
+                'verbose_name_plural': 'Índice de búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indices, eliminar_indices),
+        migrations.RunPython(poblar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:14
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def crear_indice_prefijo(apps, schema_editor):
+    # varchar_pattern_ops permite usar el índice con LIKE 'PREFIJO%' sin importar el collation
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS productos_modeloaparato_clave_prefijo "
+        "ON productos_modeloaparato (clave varchar_pattern_ops)"
+    )
+
+
+def eliminar_indice_prefijo(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS productos_modeloaparato_clave_prefijo")
+
+
+def _clave(texto):
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]+', '', texto.lower()).upper()[:150]
+
+
+def poblar_compatibilidad(apps, schema_editor):
+    Refaccion = apps.get_model('productos', 'Refaccion')
+    ModeloAparato = apps.get_model('productos', 'ModeloAparato')
+    Relacion = ModeloAparato.refacciones.through
+
+    modelos = {}
+    pares = set()
+    for refaccion_id, texto in Refaccion.objects.values_list('pk', 'compatibilidad').iterator(chunk_size=500):
+        for parte in re.split(r'[,;|\n\r]+', texto or ''):
+            nombre = ' '.join(parte.split())
+            clave = _clave(nombre)
+            if clave:
+                modelos.setdefault(clave, nombre[:200])
+                pares.add((refaccion_id, clave))
+
+    ModeloAparato.objects.bulk_create(
+        [ModeloAparato(clave=clave, nombre=nombre) for clave, nombre in modelos.items()],
+        batch_size=500,
+    )
+    ids = dict(ModeloAparato.objects.values_list('clave', 'id'))
+    Relacion.objects.bulk_create(
+        [Relacion(refaccion_id=refaccion_id, modeloaparato_id=ids[clave]) for refaccion_id, clave in pares],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_refaccionbusqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeloAparato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=150, unique=True)),
+                ('nombre', models.CharField(max_length=200)),
+                ('refacciones', models.ManyToManyField(blank=True, related_name='modelos_compatibles', to='productos.refaccion')),
+            ],
+            options={
+                'verbose_name': 'Modelo de aparato',
+                'verbose_name_plural': 'Modelos de aparatos',
+                'ordering': ['clave'],
+            },
+        ),
+        migrations.RunPython(crear_indice_prefijo, eliminar_indice_prefijo),
+        migrations.RunPython(poblar_compatibilidad, migrations.RunPython.noop),
+    ]
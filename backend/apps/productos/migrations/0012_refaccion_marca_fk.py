@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_marcas_faltantes(apps, schema_editor):
+    # Antes de la FK, cada nombre usado en Refaccion.marca debe existir en Marca
+    Marca = apps.get_model('productos', 'Marca')
+    Refaccion = apps.get_model('productos', 'Refaccion')
+    usadas = set(Refaccion.objects.values_list('marca', flat=True).distinct())
+    existentes = set(Marca.objects.filter(nombre__in=usadas).values_list('nombre', flat=True))
+    Marca.objects.bulk_create(
+        [Marca(nombre=nombre) for nombre in sorted(usadas - existentes)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_modeloaparato'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_marcas_faltantes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='refaccion',
+            name='marca',
+            field=models.ForeignKey(db_column='marca', on_delete=django.db.models.deletion.PROTECT, related_name='refacciones', to='productos.marca', to_field='nombre'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:35
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def poblar_reservado(apps, schema_editor):
+    ReservaStock = apps.get_model('inventario', 'ReservaStock')
+    Refaccion = apps.get_model('productos', 'Refaccion')
+    totales = (
+        ReservaStock.objects.filter(estado='ACT')
+        .order_by()
+        .values('refaccion_id')
+        .annotate(total=Sum('cantidad'))
+    )
+    for fila in totales.iterator():
+        Refaccion.objects.filter(pk=fila['refaccion_id']).update(reservado=fila['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_refaccion_marca_fk'),
+        ('inventario', '0009_reservastock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refaccion',
+            name='reservado',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(poblar_reservado, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='refaccion',
+            name='disponible',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Greatest(django.db.models.expressions.CombinedExpression(models.F('existencias'), '-', models.F('reservado')), models.Value(0)), output_field=models.IntegerField()),
+        ),
+    ]
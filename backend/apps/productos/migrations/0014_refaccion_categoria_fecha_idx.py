@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_refaccion_reservado_disponible'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='refaccion',
+            index=models.Index(fields=['categoria', '-fecha_ingreso', '-id'], name='refaccion_categoria_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:20
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+_NO_ALFANUMERICO_RE = re.compile(r'[^0-9a-z]+')
+_DIGITO_RE = re.compile(r'[0-9]')
+
+
+def _clave(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO_RE.sub('', texto.lower()).upper()[:150]
+
+
+def _clave_sin_marca(nombre):
+    palabras = (nombre or '').split()
+    for i, palabra in enumerate(palabras):
+        if _DIGITO_RE.search(palabra):
+            return _clave(' '.join(palabras[i:]))
+    return _clave(nombre)
+
+
+def llenar_clave_sin_marca(apps, schema_editor):
+    ModeloAparato = apps.get_model('productos', 'ModeloAparato')
+    lote = []
+    for modelo in ModeloAparato.objects.only('pk', 'nombre').iterator(chunk_size=500):
+        modelo.clave_sin_marca = _clave_sin_marca(modelo.nombre)
+        lote.append(modelo)
+        if len(lote) >= 500:
+            ModeloAparato.objects.bulk_update(lote, ['clave_sin_marca'])
+            lote = []
+    ModeloAparato.objects.bulk_update(lote, ['clave_sin_marca'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_refaccion_categoria_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modeloaparato',
+            name='clave_sin_marca',
+            field=models.CharField(blank=True, db_index=True, max_length=150),
+        ),
+        migrations.RunPython(llenar_clave_sin_marca, migrations.RunPython.noop),
+    ]
@@ -2,9 +2,12 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify as django_slugify
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from decimal import Decimal
 
 class Marca(models.Model):
@@ -45,7 +48,11 @@ class Refaccion(models.Model):
     proveedor = models.ForeignKey('Proveedor', on_delete=models.PROTECT, related_name='refacciones', null=True, blank=True)
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField(blank=True)
-    marca = models.CharField(max_length=100)
+    # FK por nombre: la columna sigue guardando el nombre de la marca (marca_id == Marca.nombre)
+    marca = models.ForeignKey(
+        Marca, on_delete=models.PROTECT, related_name='refacciones',
+        to_field='nombre', db_column='marca'
+    )
     categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, related_name='refacciones')
     imagen = models.URLField(blank=True, null=True)
     precio = models.DecimalField(
@@ -54,6 +61,14 @@ class Refaccion(models.Model):
         validators=[MinValueValidator(Decimal('0'))]
     )
     existencias = models.PositiveIntegerField(default=0)
+    # Apartado por pedidos sin pagar (ReservaStock activas); se mantiene con UPDATE atómicos
+    reservado = models.PositiveIntegerField(default=0, editable=False)
+    # Lo que se puede vender: existencias - reservado (columna generada por la base de datos)
+    disponible = models.GeneratedField(
+        expression=Greatest(F('existencias') - F('reservado'), Value(0)),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     estado = models.CharField(
         max_length=3, 
         choices=EstadoChoices.choices, 
@@ -93,6 +108,15 @@ class Refaccion(models.Model):
     fecha_ingreso = models.DateTimeField(auto_now_add=True)
     ultima_actualizacion = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permite detectar cambios en compatibilidad sin volver a consultar
+        instance._compatibilidad_cargada = instance.__dict__.get('compatibilidad')
+        # Al cambiar de categoría también se invalida el listado de la anterior
+        instance._categoria_cargada = instance.__dict__.get('categoria_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base = django_slugify(f"{self.nombre} {self.codigo_parte}")[:200]
@@ -108,6 +132,13 @@ class Refaccion(models.Model):
                 if self.pk:
                     qs = qs.exclude(pk=self.pk)
             self.slug = slug
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # reservado se mantiene con UPDATE atómicos (F): no se sobrescribe
+            # con el valor que haya quedado en memoria
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.generated and f.name != 'reservado'
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -117,6 +148,10 @@ class Refaccion(models.Model):
         verbose_name = "Refacción"
         verbose_name_plural = "Refacciones"
         ordering = ['-fecha_ingreso']
+        indexes = [
+            # Listado por categoría (listados.ORDEN_LISTADO), por página o por llave
+            models.Index(fields=['categoria', '-fecha_ingreso', '-id'], name='refaccion_categoria_fecha_idx'),
+        ]
 
 class Proveedor(models.Model):
     """Modelo para gestionar proveedores de refacciones"""
@@ -170,4 +205,89 @@ class ComentarioProducto(models.Model):
     def __str__(self):
         return f'Comentario de {self.usuario.username} en {self.refaccion.nombre}'
 
+class ModeloAparato(models.Model):
+    """Modelo de electrodoméstico normalizado a partir de Refaccion.compatibilidad"""
+    # Clave normalizada: mayúsculas, sin acentos ni separadores ('LG WM-3400' -> 'LGWM3400')
+    clave = models.CharField(max_length=150, unique=True)
+    # La misma clave sin la marca al inicio ('LG WM-3400' -> 'WM3400'), para buscar solo por modelo
+    clave_sin_marca = models.CharField(max_length=150, db_index=True, blank=True)
+    nombre = models.CharField(max_length=200)
+    refacciones = models.ManyToManyField(
+        Refaccion,
+        related_name='modelos_compatibles',
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = "Modelo de aparato"
+        verbose_name_plural = "Modelos de aparatos"
+        ordering = ['clave']
+
+    def __str__(self):
+        return self.nombre
+
+
+class RefaccionBusqueda(models.Model):
+    """Documento de búsqueda desnormalizado de una refacción (ver apps.productos.search)"""
+    refaccion = models.OneToOneField(
+        Refaccion,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='busqueda'
+    )
+    # Nombre + código de parte normalizados (mayor peso en el ranking)
+    titulo = models.CharField(max_length=400)
+    # Nombre, código, marca, categoría y compatibilidad normalizados
+    documento = models.TextField()
+    # tsvector mantenido solo en PostgreSQL; los índices GIN se crean en la migración 0010
+    vector = SearchVectorField(null=True, editable=False)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Índice de búsqueda"
+        verbose_name_plural = "Índice de búsqueda"
+
+    def __str__(self):
+        return f"Búsqueda {self.refaccion_id}"
+
+
+@receiver(post_save, sender=Refaccion)
+def refaccion_post_save_indexar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .search import indexar_refaccion
+    indexar_refaccion(instance)
+
+
+@receiver(post_save, sender=Refaccion)
+def refaccion_post_save_compatibilidad(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and instance.compatibilidad == getattr(instance, '_compatibilidad_cargada', None):
+        return
+    from .compatibility import sincronizar_compatibilidad
+    sincronizar_compatibilidad(instance)
+    instance._compatibilidad_cargada = instance.compatibilidad
+
+
+@receiver(post_save, sender=Refaccion)
+@receiver(post_delete, sender=Refaccion)
+def refaccion_invalidar_listado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .listados import invalidar_listado_categoria
+    invalidar_listado_categoria(instance.categoria_id, getattr(instance, '_categoria_cargada', None))
+    instance._categoria_cargada = instance.categoria_id
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_post_save_indexar(sender, instance, created, raw=False, **kwargs):
+    # El nombre de la categoría forma parte del documento de sus refacciones
+    if created or raw:
+        return
+    from .listados import invalidar_listado_categoria
+    invalidar_listado_categoria(instance.pk)
+    from .search import reindexar_catalogo
+    reindexar_catalogo(instance.refacciones.all())
+
 # La lógica de creación de movimiento inicial se movió a un servicio
@@ -0,0 +1,152 @@
+"""
+Índice de búsqueda del catálogo de refacciones.
+
+Cada refacción tiene un documento desnormalizado (RefaccionBusqueda) con su nombre,
+código de parte, marca, categoría y modelos compatibles ya normalizados (minúsculas,
+sin acentos). En PostgreSQL el documento se indexa con un tsvector (GIN) para
+coincidencias por prefijo y con trigramas (GIN, pg_trgm) para tolerar errores de
+escritura; en otros motores se usa una búsqueda por subcadena como respaldo.
+"""
+import re
+import unicodedata
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Coalesce
+
+from .models import Refaccion, RefaccionBusqueda
+
+CONFIG_TS = 'simple'
+TAMANO_LOTE = 500
+
+_TOKEN_RE = re.compile(r'\w+')
+_SEPARADORES_CODIGO_RE = re.compile(r'[\s\-_./]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con espacios colapsados."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _variantes_codigo(codigo):
+    """'WM-3400' -> 'wm-3400 wm3400' para que el código se encuentre con o sin separadores."""
+    codigo = normalizar(codigo)
+    compacto = _SEPARADORES_CODIGO_RE.sub('', codigo)
+    return codigo if compacto == codigo else f'{codigo} {compacto}'
+
+
+def construir_documento(refaccion):
+    """Regresa (titulo, documento) normalizados para una refacción.
+
+    Espera `categoria` cargada (select_related) para no consultar por cada fila.
+    """
+    titulo = f'{normalizar(refaccion.nombre)} {_variantes_codigo(refaccion.codigo_parte)}'
+    partes = [
+        titulo,
+        normalizar(refaccion.marca_id),
+        normalizar(refaccion.categoria.nombre if refaccion.categoria_id else ''),
+        normalizar(refaccion.compatibilidad),
+    ]
+    return titulo.strip(), ' '.join(p for p in partes if p)
+
+
+def _es_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _actualizar_vectores(pks):
+    """Recalcula el tsvector de las filas indicadas en un solo UPDATE (solo PostgreSQL)."""
+    if not _es_postgres() or not pks:
+        return
+    RefaccionBusqueda.objects.filter(refaccion_id__in=pks).update(
+        vector=(
+            SearchVector('titulo', weight='A', config=CONFIG_TS)
+            + SearchVector('documento', weight='B', config=CONFIG_TS)
+        )
+    )
+
+
+def indexar_refacciones(refacciones):
+    """Inserta o actualiza el documento de búsqueda de varias refacciones a la vez."""
+    filas = []
+    for refaccion in refacciones:
+        titulo, documento = construir_documento(refaccion)
+        filas.append(RefaccionBusqueda(refaccion_id=refaccion.pk, titulo=titulo, documento=documento))
+    if not filas:
+        return 0
+    RefaccionBusqueda.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=['refaccion'],
+        update_fields=['titulo', 'documento', 'actualizado'],
+    )
+    _actualizar_vectores([f.refaccion_id for f in filas])
+    return len(filas)
+
+
+def indexar_refaccion(refaccion):
+    indexar_refacciones([refaccion])
+
+
+def reindexar_catalogo(queryset=None, tamano_lote=TAMANO_LOTE):
+    """Reconstruye el índice completo (o el del queryset dado) en lotes."""
+    if queryset is None:
+        queryset = Refaccion.objects.all()
+    queryset = queryset.select_related('categoria').order_by('pk')
+    total = 0
+    lote = []
+    for refaccion in queryset.iterator(chunk_size=tamano_lote):
+        lote.append(refaccion)
+        if len(lote) >= tamano_lote:
+            total += indexar_refacciones(lote)
+            lote = []
+    total += indexar_refacciones(lote)
+    return total
+
+
+def buscar_refacciones(termino, queryset=None):
+    """Filtra y ordena por relevancia las refacciones que coinciden con `termino`.
+
+    - Cada palabra se busca como prefijo ("lava" encuentra "lavadora").
+    - En PostgreSQL, si no hay coincidencia exacta/prefijo se acepta por similitud
+      de trigramas ("lavadroa" encuentra "lavadora").
+    """
+    if queryset is None:
+        queryset = Refaccion.objects.all()
+    normalizado = normalizar(termino)
+    tokens = _TOKEN_RE.findall(normalizado)
+    if not tokens:
+        return queryset.none()
+
+    if not _es_postgres():
+        condicion = Q()
+        for token in tokens:
+            condicion &= Q(busqueda__documento__contains=token)
+        return queryset.filter(condicion).annotate(
+            relevancia=Value(0.0, output_field=FloatField())
+        )
+
+    consulta = SearchQuery(
+        ' & '.join(f'{token}:*' for token in tokens),
+        search_type='raw',
+        config=CONFIG_TS,
+    )
+    return (
+        queryset
+        .filter(
+            Q(busqueda__vector=consulta)
+            | Q(busqueda__documento__trigram_word_similar=normalizado)
+        )
+        .annotate(
+            relevancia=(
+                Coalesce(SearchRank(F('busqueda__vector'), consulta), Value(0.0), output_field=FloatField())
+                + TrigramWordSimilarity(normalizado, 'busqueda__documento')
+            )
+        )
+        .order_by('-relevancia', 'pk')
+    )
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Marca, Categoria, Refaccion, Proveedor, ComentarioProducto
+from .models import Marca, Categoria, Refaccion, Proveedor, ComentarioProducto, ModeloAparato
 from apps.inventario.services import registrar_entrada_inicial_refaccion
 
 class MarcaSerializer(serializers.ModelSerializer):
@@ -12,7 +12,40 @@ class CategoriaSerializer(serializers.ModelSerializer):
         model = Categoria
         fields = ['id', 'nombre', 'descripcion', 'imagen']
 
-class RefaccionSerializer(serializers.ModelSerializer):
+class MarcaNombreField(serializers.SlugRelatedField):
+    """Expone Refaccion.marca por nombre; al escribir crea la marca si aún no existe."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Marca.objects.all())
+        super().__init__(slug_field='nombre', **kwargs)
+
+    def use_pk_only_optimization(self):
+        # marca_id ya es el nombre: no hace falta cargar la Marca para serializar
+        return True
+
+    def to_representation(self, value):
+        return value.pk
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data.strip():
+            self.fail('invalid')
+        nombre = data.strip()
+        if len(nombre) > 100:
+            raise serializers.ValidationError('Asegúrese de que este campo no tenga más de 100 caracteres.')
+        marca, _ = Marca.objects.get_or_create(nombre=nombre)
+        return marca
+
+class CamposDinamicosMixin:
+    """Acepta fields=[...] para serializar solo esos campos (sparse fieldsets)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for nombre in set(self.fields) - set(fields):
+                self.fields.pop(nombre)
+
+class RefaccionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    marca = MarcaNombreField()
     marca_nombre = serializers.SerializerMethodField(read_only=True)
     categoria_nombre = serializers.ReadOnlyField(source='categoria.nombre')
 
@@ -21,18 +54,15 @@ class RefaccionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'codigo_parte', 'nombre', 'descripcion', 'descripcion_corta',
             'marca', 'marca_nombre', 'categoria', 'categoria_nombre',
-            'precio', 'precio_tachado', 'existencias', 'estado',
+            'precio', 'precio_tachado', 'existencias', 'reservado', 'disponible', 'estado',
             'compatibilidad', 'ubicacion_estante',
             'slug', 'titulo_seo', 'descripcion_seo', 'specs',
             'fecha_ingreso', 'ultima_actualizacion', 'proveedor', 'imagen'
         ]
 
     def get_marca_nombre(self, obj):
-        # Refaccion.marca es CharField; si luego se normaliza a FK, esto puede simplificarse
-        try:
-            return getattr(obj.marca, 'nombre', None) if not isinstance(obj.marca, str) else obj.marca
-        except Exception:
-            return None
+        # La FK apunta a Marca.nombre, así que no requiere JOIN
+        return obj.marca_id
 
     def create(self, validated_data):
         # Guardamos existencias iniciales para crear el movimiento ENTRADA
@@ -42,6 +72,76 @@ class RefaccionSerializer(serializers.ModelSerializer):
             registrar_entrada_inicial_refaccion(refaccion, cantidad_inicial)
         return refaccion
 
+class RefaccionTarjetaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Representación compacta para grids y listados (sin descripción, specs ni SEO)."""
+    marca = serializers.CharField(source='marca_id', read_only=True)
+    marca_nombre = serializers.CharField(source='marca_id', read_only=True)
+    categoria_nombre = serializers.ReadOnlyField(source='categoria.nombre')
+
+    class Meta:
+        model = Refaccion
+        fields = [
+            'id', 'codigo_parte', 'nombre', 'slug', 'descripcion_corta',
+            'marca', 'marca_nombre', 'categoria', 'categoria_nombre',
+            'precio', 'precio_tachado', 'existencias', 'disponible', 'estado', 'imagen',
+        ]
+        read_only_fields = fields
+
+
+# ── Selección de representación y columnas para listados ─────────────────────
+# ?vista=tarjeta usa RefaccionTarjetaSerializer y ?fields=a,b limita los campos;
+# en ambos casos la consulta trae solo las columnas necesarias (.only()).
+
+VISTA_TARJETA = 'tarjeta'
+
+# Campos cuyo valor no sale de una columna con su mismo nombre
+COLUMNAS_POR_CAMPO = {
+    'marca': ('marca',),
+    'marca_nombre': ('marca',),
+}
+
+
+def serializer_de_listado(request, por_omision=RefaccionSerializer):
+    """RefaccionTarjetaSerializer con ?vista=tarjeta; si no, `por_omision`."""
+    if request.query_params.get('vista') == VISTA_TARJETA:
+        return RefaccionTarjetaSerializer
+    return por_omision
+
+
+def campos_solicitados(request, serializer_class):
+    """Campos pedidos con ?fields=a,b (None si no se pidieron); ValidationError si alguno no existe."""
+    crudo = request.query_params.get('fields')
+    if not crudo:
+        return None
+    campos = [campo.strip() for campo in crudo.split(',') if campo.strip()]
+    disponibles = serializer_class().fields
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos:
+        raise serializers.ValidationError({
+            'fields': f'Campos desconocidos: {", ".join(desconocidos)}. Disponibles: {", ".join(disponibles)}.'
+        })
+    return campos
+
+
+def limitar_columnas(queryset, serializer_class, campos=None, extra=()):
+    """Restringe el queryset (.only()) a las columnas que usan los campos a serializar (más `extra`)."""
+    columnas = {'id', *extra}
+    for nombre, campo in serializer_class(fields=campos).fields.items():
+        if nombre in COLUMNAS_POR_CAMPO:
+            columnas.update(COLUMNAS_POR_CAMPO[nombre])
+        elif campo.source != '*':
+            columnas.add(campo.source.replace('.', '__'))
+    queryset = queryset.select_related(None)
+    if any(columna.startswith('categoria__') for columna in columnas):
+        queryset = queryset.select_related('categoria')
+    return queryset.only(*columnas)
+
+
+class ModeloAparatoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ModeloAparato
+        fields = ['id', 'clave', 'nombre']
+
 class ProveedorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Proveedor
@@ -1,3 +1,366 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.common.cache import clave_cache
+from apps.productos.models import Marca, Refaccion, Categoria, RefaccionBusqueda, ModeloAparato
+from apps.productos.compatibility import clave_modelo, refacciones_compatibles
+from apps.productos.importacion import importar_catalogo
+from apps.productos.search import buscar_refacciones, normalizar
+from apps.inventario.models import Inventario
+
+
+class BusquedaCatalogoTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Partes', descripcion='')
+        self.bomba = Refaccion.objects.create(
+            codigo_parte='WM-3400', nombre='Bomba de drenado', descripcion='', marca=Marca.objects.create(nombre='LG'),
+            categoria=self.categoria, precio=350, existencias=5, compatibilidad='LG WM3400, LG WM3500'
+        )
+        self.motor = Refaccion.objects.create(
+            codigo_parte='MT-100', nombre='Motor de lavado', descripcion='', marca=Marca.objects.create(nombre='Whirlpool'),
+            categoria=self.categoria, precio=1200, existencias=2, compatibilidad='Whirlpool WTW5000'
+        )
+
+    def test_normalizar_quita_acentos_y_mayusculas(self):
+        self.assertEqual(normalizar('  Válvula  DE Agua '), 'valvula de agua')
+
+    def test_indice_se_mantiene_al_guardar(self):
+        self.assertTrue(RefaccionBusqueda.objects.filter(refaccion=self.bomba).exists())
+        self.bomba.nombre = 'Bomba reforzada'
+        self.bomba.save()
+        self.assertIn('reforzada', RefaccionBusqueda.objects.get(refaccion=self.bomba).documento)
+
+    def test_busqueda_por_prefijo_y_codigo_sin_separador(self):
+        self.assertEqual(list(buscar_refacciones('bom')), [self.bomba])
+        self.assertEqual(list(buscar_refacciones('wm3400')), [self.bomba])
+        self.assertEqual(list(buscar_refacciones('whirl motor')), [self.motor])
+
+    def test_renombrar_categoria_reindexa(self):
+        self.categoria.nombre = 'Secadora'
+        self.categoria.save()
+        self.assertEqual(set(buscar_refacciones('secadora')), {self.bomba, self.motor})
+
+    def test_endpoint_search(self):
+        url = reverse('refaccion-search')
+        res = self.client.get(url, {'q': 'lavado'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r['id'] for r in res.data['results']], [self.motor.id])
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class CompatibilidadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Partes', descripcion='')
+        self.bomba = Refaccion.objects.create(
+            codigo_parte='WM-3400', nombre='Bomba de drenado', descripcion='', marca=Marca.objects.create(nombre='LG'),
+            categoria=categoria, precio=350, existencias=5, compatibilidad='LG WM3400, LG WM-3500'
+        )
+        self.motor = Refaccion.objects.create(
+            codigo_parte='MT-100', nombre='Motor de lavado', descripcion='', marca=Marca.objects.create(nombre='Whirlpool'),
+            categoria=categoria, precio=1200, existencias=2, compatibilidad='Whirlpool WTW5000; LG WM3400'
+        )
+
+    def test_clave_modelo(self):
+        self.assertEqual(clave_modelo('  lg wm-3400 '), 'LGWM3400')
+
+    def test_indice_se_crea_al_guardar(self):
+        self.assertEqual(ModeloAparato.objects.count(), 3)
+        self.assertEqual(set(refacciones_compatibles('LG WM 3400')), {self.bomba, self.motor})
+        self.assertEqual(list(refacciones_compatibles('lg wm3500')), [self.bomba])
+        self.assertEqual(set(refacciones_compatibles('lg wm', prefijo=True)), {self.bomba, self.motor})
+
+    def test_modelo_sin_marca(self):
+        self.assertEqual(set(refacciones_compatibles('WM-3400')), {self.bomba, self.motor})
+        self.assertEqual(set(refacciones_compatibles('wm', prefijo=True)), {self.bomba, self.motor})
+        res = self.client.get(reverse('refaccion-compatibles'), {'modelo': 'WM3400'})
+        self.assertEqual({r['id'] for r in res.data['results']}, {self.bomba.id, self.motor.id})
+
+    def test_clave_larga_se_recorta_igual_al_guardar_y_al_buscar(self):
+        largo = 'LG ' + 'X' * 200
+        self.bomba.compatibilidad = largo
+        self.bomba.save()
+        self.assertEqual(len(clave_modelo(largo)), 150)
+        self.assertEqual(list(refacciones_compatibles(largo)), [self.bomba])
+        self.bomba.save()
+        self.assertEqual(self.bomba.modelos_compatibles.count(), 1)
+
+    def test_actualizar_compatibilidad_es_incremental(self):
+        self.motor.compatibilidad = 'Whirlpool WTW5000'
+        self.motor.save()
+        self.assertEqual(list(refacciones_compatibles('LG WM3400')), [self.bomba])
+        self.assertEqual(
+            list(self.motor.modelos_compatibles.values_list('clave', flat=True)),
+            ['WHIRLPOOLWTW5000'],
+        )
+
+    def test_endpoints(self):
+        res = self.client.get(reverse('refaccion-compatibles'), {'modelo': 'whirlpool wtw5000'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r['id'] for r in res.data['results']], [self.motor.id])
+        self.assertEqual(self.client.get(reverse('refaccion-compatibles')).status_code, 400)
+
+        res = self.client.get(reverse('modeloaparato-list'), {'q': 'lg wm'})
+        self.assertEqual([m['clave'] for m in res.data['results']], ['LGWM3400', 'LGWM3500'])
+
+
+class MarcaRefaccionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Partes', descripcion='')
+        self.marca = Marca.objects.create(nombre='LG')
+        self.ref = Refaccion.objects.create(
+            codigo_parte='WM-3400', nombre='Bomba de drenado', descripcion='', marca=self.marca,
+            categoria=self.categoria, precio=350, existencias=0, compatibilidad=''
+        )
+
+    def test_api_acepta_y_regresa_nombre_de_marca(self):
+        res = self.client.post(reverse('refaccion-list'), {
+            'codigo_parte': 'MT-100', 'nombre': 'Motor', 'marca': 'Mabe', 'categoria': self.categoria.id,
+            'precio': '100.00', 'compatibilidad': 'Mabe LMA1',
+        }, format='json')
+        self.assertEqual(res.status_code, 201, res.data)
+        self.assertEqual(res.data['marca'], 'Mabe')
+        self.assertEqual(res.data['marca_nombre'], 'Mabe')
+        self.assertTrue(Marca.objects.filter(nombre='Mabe').exists())
+
+        res = self.client.get(reverse('refaccion-list'), {'marca': 'LG'})
+        self.assertEqual([r['id'] for r in res.data['results']], [self.ref.id])
+
+    def test_renombrar_marca_actualiza_refacciones(self):
+        cache.clear()
+        listado = f'/api/v1/productos/categorias/{self.categoria.id}/refacciones/'
+        self.client.get(listado)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(reverse('marca-detail', args=[self.marca.id]), {'nombre': 'LG Electronics'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.get(listado).data['refacciones'][0]['marca'], 'LG Electronics')
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.marca_id, 'LG Electronics')
+        self.assertEqual(list(buscar_refacciones('electronics')), [self.ref])
+
+    def test_eliminar_marca_en_uso(self):
+        res = self.client.delete(reverse('marca-detail', args=[self.marca.id]))
+        self.assertEqual(res.status_code, 400)
+
+
+class DisponibilidadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Partes', descripcion='')
+        marca = Marca.objects.create(nombre='LG')
+        self.refs = [
+            Refaccion.objects.create(
+                codigo_parte=f'CP-{i}', nombre=f'Ref{i}', descripcion='', marca=marca,
+                categoria=categoria, precio=100, existencias=5, compatibilidad=''
+            )
+            for i in range(2)
+        ]
+        Refaccion.objects.filter(pk=self.refs[0].pk).update(reservado=2)
+
+    def test_guardar_no_pisa_reservado(self):
+        ref = Refaccion.objects.get(pk=self.refs[0].pk)
+        Refaccion.objects.filter(pk=ref.pk).update(reservado=3)
+        ref.nombre = 'Otro nombre'
+        ref.save()
+        ref.refresh_from_db()
+        self.assertEqual((ref.reservado, ref.disponible), (3, 2))
+
+    def test_endpoints(self):
+        res = self.client.get(reverse('refaccion-disponibilidad', args=[self.refs[0].pk]))
+        self.assertEqual(res.data, {'id': self.refs[0].pk, 'existencias': 5, 'reservado': 2, 'disponible': 3})
+        self.assertEqual(self.client.get('/api/v1/productos/refacciones/abc/disponibilidad/').status_code, 404)
+
+        ids = f'{self.refs[0].pk},{self.refs[1].pk}'
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('refaccion-disponibilidad-lote'), {'ids': ids})
+        self.assertEqual([fila['disponible'] for fila in res.data], [3, 5])
+        self.assertEqual(self.client.get(reverse('refaccion-disponibilidad-lote'), {'ids': 'x'}).status_code, 400)
+
+        res = self.client.get(reverse('refaccion-detail', args=[self.refs[0].pk]))
+        self.assertEqual(res.data['disponible'], 3)
+
+
+class ImportacionCatalogoTest(TestCase):
+    def setUp(self):
+        self.existente = Refaccion.objects.create(
+            codigo_parte='BOM-1', nombre='Bomba', descripcion='', marca=Marca.objects.create(nombre='LG'),
+            categoria=Categoria.objects.create(nombre='Lavado', descripcion=''), precio=100, existencias=3,
+            compatibilidad='',
+        )
+        # Ocupa el slug que le tocaría a otra refacción
+        Refaccion.objects.filter(pk=self.existente.pk).update(slug='motor-mot-1')
+
+    def _filas(self, n, inicio=0):
+        return [
+            (i, {'codigo_parte': f'MOT-{i}', 'nombre': 'Motor', 'marca': 'Mabe', 'categoria': 'Motores',
+                 'precio': '250.00', 'existencias': '4', 'compatibilidad': 'Mabe LMA1'})
+            for i in range(inicio + 1, inicio + n + 1)
+        ]
+
+    def test_celdas_que_no_caben_son_error_de_fila(self):
+        base = self._filas(1)[0][1]
+        malas = [
+            {'precio': 'NaN'}, {'precio': 'Infinity'}, {'precio': '1e20'}, {'precio_tachado': '-5'},
+            {'nombre': 'x' * 201}, {'marca': 'm' * 101}, {'ubicacion_estante': 'e' * 51},
+            {'descripcion_corta': 'd' * 301}, {'imagen': 'no es url'}, {'existencias': '99999999999'},
+            {'estado': 'ROTO'}, {'codigo_parte': 'C' * 51},
+        ]
+        filas = [(n, {**base, 'codigo_parte': f'MAL-{n}', **cambio}) for n, cambio in enumerate(malas, start=2)]
+        resultado = importar_catalogo(filas + [(99, {**base, 'codigo_parte': 'BIEN-1'})])
+        self.assertEqual(resultado['creadas'], 1)
+        self.assertEqual([e['fila'] for e in resultado['errores']], list(range(2, 2 + len(malas))))
+        self.assertTrue(resultado['errores'][0]['error'].startswith('precio:'))
+
+    def test_upsert_slugs_y_entradas_iniciales(self):
+        filas = self._filas(3) + [
+            (10, {'codigo_parte': 'BOM-1', 'precio': '120.50', 'existencias': '99'}),
+            (11, {'codigo_parte': 'NUEVA', 'nombre': 'Sin precio'}),
+        ]
+        resultado = importar_catalogo(filas)
+        self.assertEqual((resultado['creadas'], resultado['actualizadas']), (3, 1))
+        self.assertEqual([e['fila'] for e in resultado['errores']], [11])
+
+        self.assertEqual(Refaccion.objects.get(codigo_parte='MOT-1').slug, 'motor-mot-1-1')
+        self.existente.refresh_from_db()
+        self.assertEqual((str(self.existente.precio), self.existente.existencias), ('120.50', 3))
+
+        nuevas = Refaccion.objects.filter(codigo_parte__startswith='MOT-')
+        self.assertEqual(sorted(nuevas.values_list('existencias', flat=True)), [4, 4, 4])
+        self.assertEqual(Inventario.objects.filter(refaccion__in=nuevas, cantidad=4).count(), 3)
+        self.assertEqual(RefaccionBusqueda.objects.filter(refaccion__in=nuevas).count(), 3)
+        self.assertEqual(refacciones_compatibles('Mabe LMA1').count(), 3)
+
+    def test_bases_repetidas_en_el_lote_no_duplican_slug(self):
+        Refaccion.objects.filter(pk=self.existente.pk).update(slug='a-b-1-1')
+        base = self._filas(1)[0][1]
+        resultado = importar_catalogo([
+            (2, {**base, 'nombre': 'A B', 'codigo_parte': '1'}),
+            (3, {**base, 'nombre': 'A', 'codigo_parte': 'B 1'}),
+            # Su base es el sufijo que le tocaría a la primera repetida
+            (4, {**base, 'nombre': 'A B 1', 'codigo_parte': '2'}),
+            (5, {**base, 'nombre': 'A B', 'codigo_parte': '1 2'}),
+        ])
+        self.assertEqual((resultado['creadas'], resultado['errores']), (4, []))
+        slugs = list(Refaccion.objects.exclude(pk=self.existente.pk).values_list('slug', flat=True))
+        self.assertEqual(len(slugs), len(set(slugs)))
+        self.assertIn('a-b-1-2', slugs)
+
+    def test_consultas_no_crecen_con_el_lote(self):
+        importar_catalogo(self._filas(1))  # marca, categoría y modelo compatible ya existen
+        with CaptureQueriesContext(connection) as pocas:
+            importar_catalogo(self._filas(5, inicio=10))
+        with CaptureQueriesContext(connection) as muchas:
+            importar_catalogo(self._filas(30, inicio=100))
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_endpoint_csv_solo_admin(self):
+        contenido = 'codigo_parte,nombre,marca,categoria,precio,existencias\nCSV-1,Filtro,LG,Lavado,80,2\n'
+        archivo = SimpleUploadedFile('lista.csv', contenido.encode(), content_type='text/csv')
+        client = APIClient()
+        self.assertIn(client.post('/api/v1/productos/refacciones/importar/', {'archivo': archivo}).status_code, (401, 403))
+        client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='x'))
+        archivo.seek(0)
+        res = client.post('/api/v1/productos/refacciones/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual((res.status_code, res.data['creadas']), (200, 1))
+
+        latin1 = SimpleUploadedFile('lista.csv', 'codigo_parte,nombre,precio\nCSV-2,Cañería,80\n'.encode('latin-1'))
+        res = client.post('/api/v1/productos/refacciones/importar/', {'archivo': latin1}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+        self.assertTrue(res.data['errores'][0]['error'].startswith('El archivo no está en UTF-8'))
+
+
+class CamposListadoTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Lavado', descripcion='')
+        Refaccion.objects.create(
+            codigo_parte='T-1', nombre='Tarjeta', descripcion='larga', marca=Marca.objects.create(nombre='LG'),
+            categoria=self.categoria, precio=100, existencias=5, compatibilidad='LG WM1',
+            specs=[{'clave': 'Voltaje', 'valor': '127V'}],
+        )
+
+    def test_vista_tarjeta_trae_solo_sus_columnas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.get('/api/v1/productos/refacciones/', {'vista': 'tarjeta'})
+        item = res.data['results'][0] if 'results' in res.data else res.data[0]
+        self.assertEqual((item['marca_nombre'], item['categoria_nombre'], item['disponible']), ('LG', 'Lavado', 5))
+        self.assertNotIn('specs', item)
+        sql = ' '.join(q['sql'] for q in consultas.captured_queries)
+        self.assertNotIn('"specs"', sql)
+        self.assertNotIn('"descripcion_seo"', sql)
+
+    def test_fields_en_catalogo_y_por_categoria(self):
+        res = self.client.get('/api/v1/productos/refacciones/', {'fields': 'id,nombre,precio'})
+        item = res.data['results'][0] if 'results' in res.data else res.data[0]
+        self.assertEqual(set(item), {'id', 'nombre', 'precio'})
+
+        res = self.client.get(
+            f'/api/v1/productos/categorias/{self.categoria.id}/refacciones/', {'vista': 'tarjeta', 'fields': 'nombre'}
+        )
+        self.assertEqual(res.data['refacciones'], [{'nombre': 'Tarjeta'}])
+        self.assertEqual(self.client.get('/api/v1/productos/refacciones/', {'fields': 'nombre,x'}).status_code, 400)
+
+        # Sin parámetros la representación completa no cambia
+        res = self.client.get('/api/v1/productos/refacciones/')
+        item = res.data['results'][0] if 'results' in res.data else res.data[0]
+        self.assertEqual(item['specs'], [{'clave': 'Voltaje', 'valor': '127V'}])
+
+
+class RefaccionesPorCategoriaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Lavadora', descripcion='')
+        marca = Marca.objects.create(nombre='LG')
+        self.refs = [
+            Refaccion.objects.create(
+                codigo_parte=f'L-{i}', nombre=f'Pieza {i}', descripcion='', marca=marca,
+                categoria=self.categoria, precio=10, existencias=1, compatibilidad='',
+            )
+            for i in range(5)
+        ]
+        self.url = f'/api/v1/productos/categorias/{self.categoria.id}/refacciones/'
+
+    def test_paginado_y_memorizado(self):
+        with self.assertNumQueries(4):  # existencia (solo sin versión en caché), categoría, COUNT y página
+            res = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual((res.data['total'], len(res.data['refacciones'])), (5, 2))
+        self.assertEqual(res.data['categoria']['nombre'], 'Lavadora')
+        self.assertIsNotNone(res.data['next'])
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'page_size': 2})
+
+        # Guardar una refacción de la categoría invalida sus páginas
+        self.refs[0].nombre = 'Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refs[0].save()
+        res = self.client.get(self.url, {'page_size': 10})
+        self.assertIn('Renombrada', [r['nombre'] for r in res.data['refacciones']])
+
+    def test_version_perdida_no_sirve_paginas_viejas(self):
+        self.client.get(self.url, {'page_size': 10})
+        Refaccion.objects.filter(pk=self.refs[0].pk).update(nombre='Sin señal')
+        cache.delete(clave_cache('productos', 'categoria', self.categoria.id, 'version'))
+        res = self.client.get(self.url, {'page_size': 10})
+        self.assertIn('Sin señal', [r['nombre'] for r in res.data['refacciones']])
+
+    def test_cursor_recorre_todo_sin_repetir(self):
+        vistos, cursor = [], ''
+        while cursor is not None:
+            res = self.client.get(self.url, {'cursor': cursor, 'page_size': 2, 'fields': 'id'})
+            vistos += [r['id'] for r in res.data['refacciones']]
+            cursor = res.data['next_cursor']
+        self.assertEqual(sorted(vistos), sorted(r.id for r in self.refs))
+        self.assertEqual(len(vistos), len(set(vistos)))
+        self.assertEqual(self.client.get(self.url, {'cursor': 'roto'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/productos/categorias/999/refacciones/').status_code, 404)
+        # Un id inexistente no deja versión (sin vencimiento) en la caché
+        self.assertIsNone(cache.get(clave_cache('productos', 'categoria', 999, 'version')))
@@ -6,6 +6,7 @@ from .views import (
     RefaccionViewSet, 
     ProveedorViewSet,
     ComentarioProductoViewSet,
+    ModeloAparatoViewSet,
     refacciones_por_categoria,
 )
 
@@ -15,6 +16,7 @@ router.register(r'marcas', MarcaViewSet)
 router.register(r'categorias', CategoriaViewSet)
 router.register(r'refacciones', RefaccionViewSet)
 router.register(r'proveedores', ProveedorViewSet)
+router.register(r'modelos', ModeloAparatoViewSet)
 router.register(r'comentarios', ComentarioProductoViewSet, basename='comentario-producto')
 
 urlpatterns = [ 
@@ -1,19 +1,38 @@
 from rest_framework import viewsets, permissions, filters, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from django.db.models.deletion import ProtectedError
 from django.db import models, transaction
-from .models import Marca, Categoria, Refaccion, Proveedor, ComentarioProducto
+from .models import Marca, Categoria, Refaccion, Proveedor, ComentarioProducto, ModeloAparato
 from .serializers import (
     MarcaSerializer, 
     CategoriaSerializer, 
     RefaccionSerializer, 
     ProveedorSerializer,
+    campos_solicitados,
+    limitar_columnas,
+    serializer_de_listado,
     ComentarioProductoSerializer,
+    ModeloAparatoSerializer,
 )
+from .search import buscar_refacciones, reindexar_catalogo
+from .compatibility import clave_modelo, refacciones_compatibles
+from .importacion import importar_catalogo
+from .listados import (
+    LISTADO_TTL,
+    ORDEN_LISTADO,
+    RefaccionCategoriaPagination,
+    clave_listado,
+    invalidar_listado_categoria,
+    pagina_por_cursor,
+)
+from apps.common.pagination import KeysetPagination
 from apps.inventario.models import Inventario
+from apps.inventario.services import leer_csv, leer_jsonl
 
 class MarcaViewSet(viewsets.ModelViewSet):
     queryset = Marca.objects.all().order_by('nombre')
@@ -23,6 +42,31 @@ class MarcaViewSet(viewsets.ModelViewSet):
     search_fields = ['nombre', 'pais_origen']
     ordering_fields = ['nombre']
 
+    def perform_update(self, serializer):
+        """Refaccion.marca apunta al nombre: al renombrar se actualizan las refacciones en la misma transacción."""
+        nombre_anterior = serializer.instance.nombre
+        with transaction.atomic():
+            marca = serializer.save()
+            if marca.nombre != nombre_anterior:
+                refacciones = Refaccion.objects.filter(marca_id=nombre_anterior)
+                categorias = set(refacciones.values_list('categoria_id', flat=True).distinct())
+                refacciones.update(marca_id=marca.nombre)
+                reindexar_catalogo(Refaccion.objects.filter(marca_id=marca.nombre))
+                # update() no dispara post_save: los listados por categoría se invalidan aquí
+                invalidar_listado_categoria(*categorias)
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {
+                    'error': 'No se puede eliminar esta marca',
+                    'detail': 'La marca está asignada a refacciones o movimientos de inventario.',
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
 class CategoriaViewSet(viewsets.ModelViewSet):
     queryset = Categoria.objects.all().order_by('nombre')
     serializer_class = CategoriaSerializer
@@ -31,6 +75,14 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     search_fields = ['nombre']
     ordering_fields = ['nombre']
 
+# Proyección de stock: existencias, apartado por pedidos sin pagar y disponible para venta
+CAMPOS_DISPONIBILIDAD = ('id', 'existencias', 'reservado', 'disponible')
+MAX_IDS_DISPONIBILIDAD = 200
+# Acciones de lectura que aceptan ?vista=tarjeta y ?fields=
+ACCIONES_LISTADO = ('list', 'search', 'compatibles')
+ACCIONES_CON_CAMPOS = ACCIONES_LISTADO + ('retrieve',)
+
+
 class RefaccionViewSet(viewsets.ModelViewSet):
     queryset = Refaccion.objects.select_related('categoria', 'proveedor').all()
     serializer_class = RefaccionSerializer
@@ -42,7 +94,126 @@ class RefaccionViewSet(viewsets.ModelViewSet):
     ]
     filterset_fields = ['marca', 'categoria', 'estado']
     search_fields = ['nombre', 'codigo_parte', 'compatibilidad']
-    ordering_fields = ['precio', 'fecha_ingreso', 'existencias']
+    ordering_fields = ['precio', 'fecha_ingreso', 'existencias', 'disponible']
+
+    def get_serializer_class(self):
+        if self.action in ACCIONES_LISTADO:
+            return serializer_de_listado(self.request)
+        return super().get_serializer_class()
+
+    def _campos(self):
+        # ?fields= se valida una sola vez por petición
+        if not hasattr(self, '_campos_solicitados'):
+            self._campos_solicitados = campos_solicitados(self.request, self.get_serializer_class())
+        return self._campos_solicitados
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ACCIONES_CON_CAMPOS:
+            kwargs.setdefault('fields', self._campos())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if self.action in ACCIONES_CON_CAMPOS and (serializer_class is not RefaccionSerializer or self._campos()):
+            # Solo las columnas que se van a serializar
+            queryset = limitar_columnas(queryset, serializer_class, self._campos())
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """Búsqueda rankeada del catálogo: ?q=texto (prefijos y tolerancia a errores).
+
+        Acepta los mismos filtros que el listado (marca, categoria, estado).
+        """
+        termino = (request.query_params.get('q') or '').strip()
+        if not termino:
+            return Response({'detail': 'El parámetro q es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        resultados = buscar_refacciones(termino, queryset)
+
+        page = self.paginate_queryset(resultados)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(resultados, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='compatibles')
+    def compatibles(self, request):
+        """Refacciones compatibles con un modelo de aparato: ?modelo=WM3400[&prefijo=true].
+
+        Usa el índice estructurado (ModeloAparato); acepta los filtros del listado.
+        """
+        modelo = (request.query_params.get('modelo') or '').strip()
+        if not modelo:
+            return Response({'detail': 'El parámetro modelo es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        prefijo = request.query_params.get('prefijo', '').lower() in ('1', 'true', 'si')
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        resultados = refacciones_compatibles(modelo, prefijo=prefijo, queryset=queryset).order_by('nombre', 'pk')
+
+        page = self.paginate_queryset(resultados)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(resultados, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='disponibilidad')
+    def disponibilidad(self, request, pk=None):
+        """Existencias, apartado y disponible para venta de una refacción."""
+        try:
+            fila = Refaccion.objects.filter(pk=pk).values(*CAMPOS_DISPONIBILIDAD).first()
+        except (TypeError, ValueError):
+            # pk no numérico: igual que retrieve, no existe
+            fila = None
+        if fila is None:
+            return Response({'detail': 'No encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(fila)
+
+    @action(detail=False, methods=['get'], url_path='disponibilidad')
+    def disponibilidad_lote(self, request):
+        """Disponibilidad de varias refacciones en una consulta: ?ids=1,2,3 (máx. MAX_IDS_DISPONIBILIDAD)."""
+        try:
+            ids = {int(valor) for valor in (request.query_params.get('ids') or '').split(',') if valor.strip()}
+        except ValueError:
+            return Response({'detail': 'ids debe ser una lista de enteros separada por comas'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'detail': 'El parámetro ids es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_IDS_DISPONIBILIDAD:
+            return Response(
+                {'detail': f'Máximo {MAX_IDS_DISPONIBILIDAD} ids por consulta'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        filas = Refaccion.objects.filter(pk__in=ids).order_by('pk').values(*CAMPOS_DISPONIBILIDAD)
+        return Response(list(filas))
+
+    @action(detail=False, methods=['post'], url_path='importar', permission_classes=[permissions.IsAdminUser])
+    def importar(self, request):
+        """Alta/actualización masiva del catálogo por codigo_parte (lista de precios de proveedor).
+
+        Acepta multipart con `archivo` (.csv o .jsonl) o JSON {"refacciones": [...]};
+        regresa el conteo de altas y actualizaciones y el reporte de errores por fila.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is not None:
+            formato = (request.data.get('formato') or archivo.name.rsplit('.', 1)[-1]).lower()
+            if formato not in ('csv', 'jsonl', 'ndjson'):
+                return Response({'detail': 'El archivo debe ser .csv o .jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+            filas = leer_csv(archivo) if formato == 'csv' else leer_jsonl(archivo)
+        else:
+            refacciones = request.data.get('refacciones') if isinstance(request.data, dict) else None
+            if not isinstance(refacciones, list):
+                return Response({'detail': 'Envía un archivo o una lista "refacciones"'}, status=status.HTTP_400_BAD_REQUEST)
+            filas = (
+                (numero, fila if isinstance(fila, dict) else {'__error__': 'La refacción debe ser un objeto.'})
+                for numero, fila in enumerate(refacciones, start=1)
+            )
+
+        resultado = importar_catalogo(filas)
+        exito = resultado['creadas'] or resultado['actualizadas']
+        return Response(resultado, status=status.HTTP_200_OK if exito else status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
         """Sobrescribe destroy para manejar ProtectedError y permitir eliminación si todos los pedidos están entregados"""
@@ -98,18 +269,38 @@ class ProveedorViewSet(viewsets.ModelViewSet):
     ordering_fields = ['nombre']
 
 
+class ModeloAparatoViewSet(viewsets.ReadOnlyModelViewSet):
+    """Modelos de aparatos conocidos; ?q= autocompleta por prefijo de la clave normalizada (con o sin marca)."""
+    queryset = ModeloAparato.objects.all()
+    serializer_class = ModeloAparatoSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        termino = self.request.query_params.get('q')
+        if termino:
+            clave = clave_modelo(termino)
+            queryset = queryset.filter(models.Q(clave__startswith=clave) | models.Q(clave_sin_marca__startswith=clave))
+        return queryset
+
+
 # Vistas personalizadas para URLs específicas
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def refacciones_por_categoria(request, categoria_id):
     """
-    Vista para obtener refacciones (productos) filtradas por categoría específica
+    Refacciones de una categoría, paginadas (?page=&page_size=) o por llave (?cursor=,
+    vacío para la primera página; responde next_cursor). Filtros: marca, estado.
+    Acepta ?vista=tarjeta y ?fields= como el catálogo. Cada combinación de parámetros
+    se memoriza hasta que cambie una refacción de la categoría.
     """
+    clave = clave_listado(categoria_id, request)
+    datos = cache.get(clave)
+    if datos is not None:
+        return Response(datos, status=status.HTTP_200_OK)
+
+    categoria = get_object_or_404(Categoria, id=categoria_id)
     try:
-        # Obtener la categoría por ID
-        categoria = get_object_or_404(Categoria, id=categoria_id)
-        
-        # Filtrar refacciones por categoría
         refacciones = Refaccion.objects.filter(categoria=categoria).select_related('categoria', 'proveedor')
         
         # Aplicar filtros adicionales si se proporcionan
@@ -117,23 +308,48 @@ def refacciones_por_categoria(request, categoria_id):
         estado = request.query_params.get('estado', None)
         
         if marca:
-            refacciones = refacciones.filter(marca__icontains=marca)
+            refacciones = refacciones.filter(marca__nombre__icontains=marca)
         if estado:
             refacciones = refacciones.filter(estado=estado)
-        
-        serializer = RefaccionSerializer(refacciones, many=True)
-        
-        return Response({
-            'categoria': CategoriaSerializer(categoria).data,
-            'refacciones': serializer.data,
-            'total': refacciones.count()
-        }, status=status.HTTP_200_OK)
-        
+
+        serializer_class = serializer_de_listado(request)
+        campos = campos_solicitados(request, serializer_class)
+        if serializer_class is not RefaccionSerializer or campos:
+            refacciones = limitar_columnas(refacciones, serializer_class, campos, extra=('fecha_ingreso',))
+
+        paginator = RefaccionCategoriaPagination()
+        if 'cursor' in request.query_params:
+            pagina, siguiente = pagina_por_cursor(
+                refacciones, request.query_params['cursor'], paginator.get_page_size(request),
+            )
+            datos = {
+                'categoria': CategoriaSerializer(categoria).data,
+                'refacciones': serializer_class(pagina, many=True, fields=campos).data,
+                'next_cursor': siguiente,
+            }
+        else:
+            pagina = paginator.paginate_queryset(refacciones.order_by(*ORDEN_LISTADO), request)
+            datos = {
+                'categoria': CategoriaSerializer(categoria).data,
+                'refacciones': serializer_class(pagina, many=True, fields=campos).data,
+                # El conteo sale del paginador: no hace falta otro COUNT
+                'total': paginator.page.paginator.count,
+                'count': paginator.page.paginator.count,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+            }
+    except ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    except NotFound:
+        raise
     except Exception as e:
         return Response({
             'error': f'Error al obtener refacciones: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    cache.set(clave, datos, LISTADO_TTL)
+    return Response(datos, status=status.HTTP_200_OK)
+
 
 class ComentarioProductoViewSet(viewsets.ModelViewSet):
     """
@@ -144,6 +360,8 @@ class ComentarioProductoViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'calificacion']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         """
@@ -1,6 +1,6 @@
 from django.db import models
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 # Create your models here.
 class Servicio(models.Model):
@@ -29,5 +29,10 @@ class Servicio(models.Model):
         verbose_name = "Servicio"
         verbose_name_plural = "Servicios"
         ordering = ['-noDeServicio']  # Ordenar por noDeServicio de forma descendente
-    
 
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def servicio_invalidar_estadisticas(sender, instance, **kwargs):
+    from .services import invalidar_estadisticas_servicios
+    invalidar_estadisticas_servicios()
@@ -0,0 +1,97 @@
+"""
+Estadísticas del taller (servicios) para el panel de administración.
+
+Todos los KPIs salen de una sola consulta agrupada por (estado, aparato, marca,
+semana); el resultado se memoriza por (año, mes) y se invalida al escribir un
+Servicio subiendo un número de versión en la caché (al confirmar la transacción).
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, Count, DateField, Q, When
+from django.db.models.functions import TruncWeek
+
+from apps.common.cache import clave_cache, invalidar_grupo, version_grupo
+
+from .models import Servicio
+
+ESTADISTICAS_TTL = 60 * 10  # segundos
+VERSION_CACHE_KEY = clave_cache('servicios', 'estadisticas', 'version')
+TOP_CATEGORIAS = 6
+ESTADOS_COMPLETADOS = ('Reparado', 'Entregado')
+
+
+def invalidar_estadisticas_servicios():
+    """Invalida todas las estadísticas memorizadas (cualquier año/mes) al confirmar la transacción."""
+    invalidar_grupo(VERSION_CACHE_KEY)
+
+
+def _top_con_otros(conteos, campo):
+    """[{campo, count}] con las TOP_CATEGORIAS más frecuentes y el resto sumado en 'Otros'."""
+    ordenados = sorted(conteos.items(), key=lambda par: (-par[1], par[0] or ''))
+    resultado = [{campo: nombre, 'count': cuenta} for nombre, cuenta in ordenados[:TOP_CATEGORIAS]]
+    otros = sum(cuenta for _, cuenta in ordenados[TOP_CATEGORIAS:])
+    if otros:
+        resultado.append({campo: 'Otros', 'count': otros})
+    return resultado
+
+
+def _calcular(anio, mes, hoy):
+    qs = Servicio.objects.all()
+    if anio:
+        qs = qs.filter(fecha__year=anio)
+    if mes:
+        qs = qs.filter(fecha__month=mes)
+
+    # Tendencia: todas las semanas del mes elegido, o las últimas 8 semanas
+    if mes and anio:
+        ventana = Q(fecha__range=(date(anio, mes, 1), date(anio, mes, calendar.monthrange(anio, mes)[1])))
+    else:
+        ventana = Q(fecha__gte=hoy - timedelta(weeks=8))
+
+    filas = (
+        qs.annotate(semana=Case(When(ventana, then=TruncWeek('fecha')), output_field=DateField()))
+        .values('estado', 'aparato', 'marca', 'semana')
+        .annotate(c=Count('noDeServicio'))
+        .order_by()
+    )
+
+    total = 0
+    por_estado, por_aparato, por_marca, por_semana = {}, {}, {}, {}
+    for fila in filas:
+        c = fila['c']
+        total += c
+        por_estado[fila['estado']] = por_estado.get(fila['estado'], 0) + c
+        por_aparato[fila['aparato']] = por_aparato.get(fila['aparato'], 0) + c
+        por_marca[fila['marca']] = por_marca.get(fila['marca'], 0) + c
+        if fila['semana'] is not None:
+            por_semana[fila['semana']] = por_semana.get(fila['semana'], 0) + c
+
+    completados = sum(por_estado.get(estado, 0) for estado in ESTADOS_COMPLETADOS)
+    return {
+        'total': total,
+        'pendientes': por_estado.get('Pendiente', 0),
+        'completados': completados,
+        'tasa_completado': round((completados / total * 100), 1) if total > 0 else 0.0,
+        'por_estado': dict(sorted(por_estado.items(), key=lambda par: -par[1])),
+        'por_aparato': _top_con_otros(por_aparato, 'aparato'),
+        'por_marca': _top_con_otros(por_marca, 'marca'),
+        'tendencia_semanal': [
+            {'semana': semana.strftime('%d %b'), 'count': por_semana[semana]}
+            for semana in sorted(por_semana)
+        ],
+    }
+
+
+def estadisticas_servicios(anio=None, mes=None):
+    """KPIs, distribución por estado/aparato/marca y tendencia semanal (memorizados)."""
+    hoy = date.today()
+    # Sin mes y año la tendencia es relativa a hoy, así que el día forma parte de la llave
+    periodo = f'{anio}:{mes}' if (anio and mes) else f'{anio}:{mes}:{hoy.isoformat()}'
+    clave = clave_cache('servicios', 'estadisticas', version_grupo(VERSION_CACHE_KEY), periodo)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _calcular(anio, mes, hoy)
+        cache.set(clave, datos, ESTADISTICAS_TTL)
+    return datos
@@ -1,3 +1,47 @@
 from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.servicios.models import Servicio
+from apps.servicios.services import VERSION_CACHE_KEY
+
+
+class EstadisticasServiciosTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='secret'))
+        aparatos = ['Lavadora', 'Lavadora', 'Secadora', 'Refrigerador', 'Estufa', 'Horno', 'Microondas', 'Licuadora', 'Minisplit']
+        for numero, aparato in enumerate(aparatos, start=1):
+            Servicio.objects.create(
+                noDeServicio=numero, marca='LG' if numero % 2 else 'Mabe', aparato=aparato, cliente='Ana',
+                estado='Reparado' if numero <= 3 else 'Pendiente',
+            )
+
+    def test_kpis_en_una_consulta_y_memorizados(self):
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/v1/servicios/estadisticas/')
+        self.assertEqual((res.data['total'], res.data['pendientes'], res.data['completados']), (9, 6, 3))
+        self.assertEqual(res.data['por_estado'], {'Pendiente': 6, 'Reparado': 3})
+        self.assertEqual(res.data['por_aparato'][0], {'aparato': 'Lavadora', 'count': 2})
+        self.assertEqual(res.data['por_aparato'][-1], {'aparato': 'Otros', 'count': 2})
+        self.assertEqual(res.data['por_marca'], [{'marca': 'LG', 'count': 5}, {'marca': 'Mabe', 'count': 4}])
+        self.assertEqual(sum(s['count'] for s in res.data['tendencia_semanal']), 9)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/servicios/estadisticas/')
+
+    def test_escritura_invalida(self):
+        self.client.get('/api/v1/servicios/estadisticas/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Servicio.objects.get(noDeServicio=4).delete()
+        res = self.client.get('/api/v1/servicios/estadisticas/')
+        self.assertEqual(res.data['total'], 8)
+
+    def test_version_perdida_no_sirve_estadisticas_viejas(self):
+        self.client.get('/api/v1/servicios/estadisticas/')
+        Servicio.objects.filter(noDeServicio=4).update(estado='Reparado')
+        cache.delete(VERSION_CACHE_KEY)
+        res = self.client.get('/api/v1/servicios/estadisticas/')
+        self.assertEqual(res.data['completados'], 4)
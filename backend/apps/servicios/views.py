@@ -3,12 +3,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser
-from django.db.models import Count
-from django.db.models.functions import TruncWeek
-from datetime import date, timedelta
 
 from .models import Servicio
 from .serializers import ServicioSerializer
+from .services import estadisticas_servicios
 
 class ServicioViewSet(viewsets.ModelViewSet):
     queryset = Servicio.objects.all().order_by('-noDeServicio')
@@ -50,8 +48,6 @@ class EstadisticasServiciosView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        qs = Servicio.objects.all()
-
         # ── Filtro por mes / año ─────────────────────────────────────────────────
         mes_param  = request.query_params.get('mes')
         anio_param = request.query_params.get('anio')
@@ -61,91 +57,5 @@ class EstadisticasServiciosView(APIView):
         except (ValueError, TypeError):
             anio_int = mes_int = None
 
-        if anio_int:
-            qs = qs.filter(fecha__year=anio_int)
-        if mes_int:
-            qs = qs.filter(fecha__month=mes_int)
-
-        total = qs.count()
-        pendientes = qs.filter(estado='Pendiente').count()
-        completados = qs.filter(estado__in=['Reparado', 'Entregado']).count()
-        tasa_completado = round((completados / total * 100), 1) if total > 0 else 0.0
-
-        # ── Por estado ──────────────────────────────────────────────────────────
-        por_estado = {
-            estado: count
-            for estado, count in (
-                qs.values_list('estado')
-                  .annotate(c=Count('noDeServicio'))
-                  .order_by('-c')
-            )
-            if count > 0
-        }
-
-        # ── Por aparato (top 6 + Otros) ─────────────────────────────────────────
-        aparatos_qs = list(
-            qs.values('aparato')
-              .annotate(count=Count('noDeServicio'))
-              .order_by('-count')[:7]
-        )
-        if len(aparatos_qs) > 6:
-            top = aparatos_qs[:6]
-            otros = sum(a['count'] for a in aparatos_qs[6:])
-            por_aparato = [{'aparato': a['aparato'], 'count': a['count']} for a in top]
-            if otros:
-                por_aparato.append({'aparato': 'Otros', 'count': otros})
-        else:
-            por_aparato = [{'aparato': a['aparato'], 'count': a['count']} for a in aparatos_qs]
-
-        # ── Por marca (top 6 + Otros) ────────────────────────────────────────────
-        marcas_qs = list(
-            qs.values('marca')
-              .annotate(count=Count('noDeServicio'))
-              .order_by('-count')[:7]
-        )
-        if len(marcas_qs) > 6:
-            top = marcas_qs[:6]
-            otros = sum(m['count'] for m in marcas_qs[6:])
-            por_marca = [{'marca': m['marca'], 'count': m['count']} for m in top]
-            if otros:
-                por_marca.append({'marca': 'Otros', 'count': otros})
-        else:
-            por_marca = [{'marca': m['marca'], 'count': m['count']} for m in marcas_qs]
-
-        # ── Tendencia: semanal (sin filtro) o semanal dentro del mes ─────────────
-        if mes_int and anio_int:
-            # Mostrar todas las semanas del mes seleccionado
-            import calendar
-            primer_dia = date(anio_int, mes_int, 1)
-            ultimo_dia = date(anio_int, mes_int, calendar.monthrange(anio_int, mes_int)[1])
-            tendencia_qs = (
-                qs.filter(fecha__range=(primer_dia, ultimo_dia))
-                  .annotate(semana=TruncWeek('fecha'))
-                  .values('semana')
-                  .annotate(count=Count('noDeServicio'))
-                  .order_by('semana')
-            )
-        else:
-            hace_8_semanas = date.today() - timedelta(weeks=8)
-            tendencia_qs = (
-                qs.filter(fecha__gte=hace_8_semanas)
-                  .annotate(semana=TruncWeek('fecha'))
-                  .values('semana')
-                  .annotate(count=Count('noDeServicio'))
-                  .order_by('semana')
-            )
-        tendencia_semanal = [
-            {'semana': item['semana'].strftime('%d %b'), 'count': item['count']}
-            for item in tendencia_qs
-        ]
-
-        return Response({
-            'total': total,
-            'pendientes': pendientes,
-            'completados': completados,
-            'tasa_completado': tasa_completado,
-            'por_estado': por_estado,
-            'por_aparato': por_aparato,
-            'por_marca': por_marca,
-            'tendencia_semanal': tendencia_semanal,
-        })
\ No newline at end of file
+        # Una sola consulta agrupada, memorizada por (año, mes)
+        return Response(estadisticas_servicios(anio_int, mes_int))
@@ -0,0 +1,74 @@
+"""
+Autenticación JWT con el usuario memorizado.
+
+JWTAuthentication consulta la fila de Usuario en cada petición; aquí el usuario
+ya validado se guarda en caché AUTH_TTL segundos bajo un número de versión por
+usuario. Se guardan sus columnas sin `password` (solo el hash de revocación que ya
+viaja en los tokens) y se reconstruye con from_db; el hash de la contraseña queda
+diferido y solo se consulta si alguna vista lo usa. Guardar o borrar el usuario
+(cambio o restablecimiento de contraseña, edición del perfil, cambios desde el
+admin) sube la versión y la siguiente petición vuelve a leerlo de la base. Los
+tokens emitidos antes de Usuario.tokens_validos_desde se rechazan sin consultar
+la lista negra.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.common.cache import clave_cache, invalidar_grupo, version_grupo
+
+AUTH_TTL = 60 * 5  # segundos
+
+
+def _clave_version(user_id):
+    return clave_cache('usuarios', 'auth', user_id, 'version')
+
+
+def invalidar_usuario_autenticado(user_id):
+    """Descarta el usuario memorizado para `user_id` (al confirmar la transacción)."""
+    invalidar_grupo(_clave_version(user_id))
+
+
+def _datos_en_cache(user):
+    """Columnas del usuario sin la contraseña, más el hash con el que se revocan sus tokens."""
+    campos = {f.attname: getattr(user, f.attname) for f in user._meta.concrete_fields if f.attname != 'password'}
+    return {'campos': campos, 'revocacion': get_md5_hash_password(user.password)}
+
+
+def _usuario_desde_cache(datos):
+    campos = datos['campos']
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, list(campos), list(campos.values()))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            # Sin identificador: que JWTAuthentication responda el error de siempre
+            return super().get_user(validated_token)
+
+        # Una versión perdida (desalojo) no vuelve a 1: si no, se serviría un
+        # usuario memorizado antes de una revocación
+        version = version_grupo(_clave_version(user_id))
+        clave = clave_cache('usuarios', 'auth', user_id, version)
+        datos = cache.get(clave)
+        if datos is None:
+            user = super().get_user(validated_token)
+            cache.set(clave, _datos_en_cache(user), AUTH_TTL)
+        else:
+            if api_settings.CHECK_REVOKE_TOKEN and (
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != datos['revocacion']
+            ):
+                # La revocación depende del token, no solo del usuario: se revisa también en caché
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+            user = _usuario_desde_cache(datos)
+
+        # `iat` viene en segundos enteros: se compara contra el segundo de la revocación
+        if user.tokens_validos_desde and validated_token.get('iat', 0) < int(user.tokens_validos_desde.timestamp()):
+            raise AuthenticationFailed('La sesión fue cerrada; inicia sesión de nuevo.', code='token_revocado')
+        return user
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.usuarios.services import LOTE_PURGA, purgar_tokens_vencidos
+
+
+class Command(BaseCommand):
+    help = "Borra por lotes los tokens JWT vencidos (y su registro en la lista negra)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_PURGA, help='Tokens a borrar por iteración')
+        parser.add_argument('--espera', type=float, default=3600.0, help='Segundos de espera cuando no hay tokens vencidos')
+        parser.add_argument('--una-vez', action='store_true', help='Purga lo vencido y termina (para cron)')
+
+    def handle(self, *args, **options):
+        while True:
+            borrados = purgar_tokens_vencidos(limite=options['lote'])
+            if borrados:
+                self.stdout.write(f'{borrados} tokens vencidos borrados')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['espera'])
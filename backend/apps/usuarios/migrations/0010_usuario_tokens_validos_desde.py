@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0009_direccion_barrio_privado_direccion_conserjeria_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='tokens_validos_desde',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
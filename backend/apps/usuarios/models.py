@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from apps.productos.models import Refaccion
 
@@ -31,6 +33,9 @@ class Usuario(AbstractUser):
     )
 
     # El carrito vive en el modelo Cart (con cantidades por item)
+
+    # Los tokens emitidos antes de este momento ya no autentican (ver revocar_sesiones)
+    tokens_validos_desde = models.DateTimeField(null=True, blank=True, editable=False)
     
     # Puedes agregar más campos según necesites
     def __str__(self):
@@ -172,4 +177,13 @@ class CartItem(models.Model):
         unique_together = ('cart', 'refaccion')
 
     def __str__(self):
-        return f"{self.refaccion.nombre} x{self.cantidad}"
\ No newline at end of file
+        return f"{self.refaccion.nombre} x{self.cantidad}"
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def usuario_invalidar_autenticacion(sender, instance, **kwargs):
+    # Cualquier escritura, incluida last_login, para que el usuario memorizado nunca
+    # sobrescriba datos más nuevos si una vista lo guarda completo
+    from .authentication import invalidar_usuario_autenticado
+    invalidar_usuario_autenticado(instance.pk)
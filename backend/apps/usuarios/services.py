@@ -0,0 +1,41 @@
+"""
+Revocación y limpieza de tokens JWT.
+
+Revocar las sesiones de un usuario inserta de una vez las filas de la lista negra
+que falten (solo tokens de refresco aún vigentes) y fija tokens_validos_desde, que
+CachedJWTAuthentication compara con el `iat` de cada token de acceso. Los tokens
+vencidos se purgan por lotes con el comando `purgar_tokens`.
+"""
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+LOTE_PURGA = 1000
+
+
+def revocar_sesiones(usuario):
+    """Invalida todos los tokens emitidos a `usuario` hasta ahora; regresa cuántos se agregaron a la lista negra."""
+    ahora = timezone.now()
+    pendientes = OutstandingToken.objects.filter(
+        user=usuario, expires_at__gt=ahora, blacklistedtoken__isnull=True,
+    ).values_list('id', flat=True)
+    nuevos = BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id in pendientes], ignore_conflicts=True,
+    )
+    usuario.tokens_validos_desde = ahora
+    # post_save de Usuario invalida el usuario memorizado en la autenticación
+    usuario.save(update_fields=['tokens_validos_desde'])
+    return len(nuevos)
+
+
+def purgar_tokens_vencidos(limite=LOTE_PURGA):
+    """Borra hasta `limite` tokens vencidos con su fila de lista negra; regresa cuántos borró."""
+    ids = list(
+        OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+        .order_by('id')
+        .values_list('id', flat=True)[:limite]
+    )
+    if not ids:
+        return 0
+    BlacklistedToken.objects.filter(token_id__in=ids).delete()
+    OutstandingToken.objects.filter(id__in=ids).delete()
+    return len(ids)
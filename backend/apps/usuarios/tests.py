@@ -1,3 +1,100 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.common.cache import clave_cache
+from apps.usuarios.models import Usuario
+from apps.usuarios.services import purgar_tokens_vencidos, revocar_sesiones
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(username='ana', email='ana@example.com', password='secreta-123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+
+    def _consultas_de_usuario(self):
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.get('/api/v1/user/user-profile/direcciones/')
+        self.assertEqual(res.status_code, 200)
+        return [q['sql'] for q in consultas if 'FROM "usuarios_usuario"' in q['sql']]
+
+    def test_usuario_memorizado_entre_peticiones(self):
+        self.assertEqual(len(self._consultas_de_usuario()), 1)
+        self.assertEqual(self._consultas_de_usuario(), [])
+
+    def test_la_cache_no_guarda_el_hash_de_la_contrasena(self):
+        self._consultas_de_usuario()
+        version = cache.get(clave_cache('usuarios', 'auth', self.usuario.pk, 'version'))
+        datos = cache.get(clave_cache('usuarios', 'auth', self.usuario.pk, version))
+        self.assertNotIn('password', datos['campos'])
+        self.assertNotIn(self.usuario.password, repr(datos))
+        self.assertEqual(datos['campos']['username'], 'ana')
+
+    def test_guardar_el_usuario_invalida(self):
+        self._consultas_de_usuario()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/v1/user/user-profile/update/', {'first_name': 'Ana María'}, format='json')
+        self.assertEqual(len(self._consultas_de_usuario()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        self.assertEqual(self.client.get('/api/v1/user/user-profile/direcciones/').status_code, 401)
+
+
+class RevocacionTokensTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(username='luis', email='luis@example.com', password='secreta-123')
+        self.sesiones = [RefreshToken.for_user(self.usuario) for _ in range(3)]
+        # Sesión abierta un minuto antes del cambio de contraseña
+        acceso = self.sesiones[0].access_token
+        acceso.set_iat(at_time=timezone.now() - timedelta(minutes=1))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {acceso}')
+
+    def test_cambio_de_contrasena_revoca_todas_las_sesiones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/v1/user/user-profile/change-password/', {
+                'current_password': 'secreta-123', 'new_password': 'otra-clave-456', 'new_password_confirm': 'otra-clave-456',
+            }, format='json')
+        self.assertEqual(res.status_code, 200, res.data)
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.usuario).count(), 3)
+        # El token de acceso ya emitido deja de autenticar sin esperar a que venza
+        self.assertEqual(self.client.get('/api/v1/user/user-profile/direcciones/').status_code, 401)
+
+        # Una sesión nueva sí autentica; revocar otra vez solo agrega su token
+        nueva = RefreshToken.for_user(self.usuario)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {nueva.access_token}')
+        self.assertEqual(self.client.get('/api/v1/user/user-profile/direcciones/').status_code, 200)
+        self.assertEqual(revocar_sesiones(self.usuario), 1)
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.usuario).count(), 4)
+
+    def test_version_perdida_no_revive_la_sesion_revocada(self):
+        url = '/api/v1/user/user-profile/direcciones/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            revocar_sesiones(self.usuario)
+        self.assertEqual(self.client.get(url).status_code, 401)
+        # Como si la caché desalojara la versión: la entrada anterior no debe volver a usarse
+        cache.delete(clave_cache('usuarios', 'auth', self.usuario.pk, 'version'))
+        self.assertEqual(self.client.get(url).status_code, 401)
 
-# Create your tests here.
+    def test_purgar_tokens_vencidos(self):
+        vencidos = OutstandingToken.objects.filter(user=self.usuario).order_by('id')[:2]
+        BlacklistedToken.objects.create(token=vencidos[0])
+        OutstandingToken.objects.filter(id__in=[t.id for t in vencidos]).update(expires_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(purgar_tokens_vencidos(limite=1), 1)
+        self.assertEqual(purgar_tokens_vencidos(), 1)
+        self.assertEqual(purgar_tokens_vencidos(), 0)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
@@ -7,11 +7,10 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.conf import settings
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
-import brevo_python
-from brevo_python.rest import ApiException
 
+from .authentication import CachedJWTAuthentication
 from .models import Usuario, Direccion, Cart, CartItem
+from .services import revocar_sesiones
 from .serializers import (
     RegistroSerializer, 
     LoginSerializer, 
@@ -28,8 +27,13 @@ from .serializers import (
     ChangePasswordSerializer
 )
 from apps.productos.models import Refaccion
-from apps.productos.serializers import RefaccionSerializer
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.productos.serializers import (
+    RefaccionSerializer,
+    campos_solicitados,
+    limitar_columnas,
+    serializer_de_listado,
+)
+from apps.common.services import brevo_configurado, encolar_correo
 
 class RegistroUsuarioView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -92,7 +96,7 @@ class GetUserData(APIView):
     Vista para obtener la información del perfil del usuario autenticado
     Requiere autenticación mediante JWT
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -113,7 +117,7 @@ class UpdateUserProfileView(APIView):
     Requiere autenticación mediante JWT
     Solo permite actualizar el propio perfil
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def put(self, request):
@@ -155,7 +159,7 @@ class DireccionesListView(APIView):
     """
     Vista para listar y crear direcciones del usuario autenticado
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
@@ -197,7 +201,7 @@ class DireccionDetailView(APIView):
     """
     Vista para obtener, actualizar y eliminar una dirección específica
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self, pk, usuario):
@@ -275,13 +279,18 @@ class FavoritosListView(APIView):
     """
     Vista para listar y agregar productos favoritos del usuario autenticado
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
         """Obtener todos los productos favoritos del usuario"""
-        favoritos = request.user.favoritos.all()
-        serializer = RefaccionSerializer(favoritos, many=True)
+        favoritos = request.user.favoritos.select_related('categoria')
+        # Igual que el catálogo: ?vista=tarjeta y ?fields= limitan campos y columnas
+        serializer_class = serializer_de_listado(request)
+        campos = campos_solicitados(request, serializer_class)
+        if serializer_class is not RefaccionSerializer or campos:
+            favoritos = limitar_columnas(favoritos, serializer_class, campos)
+        serializer = serializer_class(favoritos, many=True, fields=campos)
         return Response({
             'favoritos': serializer.data,
             'total': favoritos.count()
@@ -318,7 +327,7 @@ class FavoritoDetailView(APIView):
     """
     Vista para eliminar un producto de favoritos
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, refaccion_id):
@@ -348,7 +357,7 @@ class CartListView(APIView):
     """
     Vista para listar, agregar y vaciar productos del carrito del usuario
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -401,7 +410,7 @@ class CartDetailView(APIView):
     """
     Vista para eliminar un producto del carrito
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request, refaccion_id):
@@ -461,75 +470,48 @@ class PasswordResetRequestView(APIView):
         frontend_url = request.data.get('frontend_url', 'http://localhost:3000')
         reset_url = f"{frontend_url}/cuenta/reset-password/{uid}/{token}"
         
-        # Enviar email con Brevo
-        try:
-            # Validaciones de configuración para evitar 500 por falta de credenciales
-            if not getattr(settings, 'BREVO_API_KEY', None):
-                if settings.DEBUG:
-                    print("Falta configurar BREVO_API_KEY")
-                # Retornar éxito de todas formas por seguridad
-                return Response({
-                    'message': 'Si el correo existe, recibirás un enlace para restablecer tu contraseña'
-                }, status=status.HTTP_200_OK)
-
-            if not getattr(settings, 'BREVO_SENDER_EMAIL', None):
-                if settings.DEBUG:
-                    print("Falta configurar BREVO_SENDER_EMAIL")
-                # Retornar éxito de todas formas por seguridad
-                return Response({
-                    'message': 'Si el correo existe, recibirás un enlace para restablecer tu contraseña'
-                }, status=status.HTTP_200_OK)
-
-            configuration = brevo_python.Configuration()
-            configuration.api_key['api-key'] = settings.BREVO_API_KEY
-            api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-
-            # Mensaje HTML simple para recuperación de contraseña
-            html_content = f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #0A3981;">Recuperación de Contraseña</h2>
-                <p>Hola {user.username},</p>
-                <p>Has solicitado restablecer tu contraseña. Haz clic en el siguiente enlace para continuar:</p>
-                <p style="margin: 20px 0;">
-                    <a href="{reset_url}" style="background-color: #0A3981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Restablecer Contraseña
-                    </a>
-                </p>
-                <p>O copia y pega este enlace en tu navegador:</p>
-                <p style="word-break: break-all; color: #666;">{reset_url}</p>
-                <p style="color: #999; font-size: 12px; margin-top: 30px;">
-                    Este enlace expirará en 1 hora.<br>
-                    Si no solicitaste este cambio, ignora este correo.
-                </p>
-                <p style="margin-top: 20px;">
-                    Saludos,<br>
-                    <strong>Equipo de {getattr(settings, 'COMPANY_NAME', 'Refaccionaria Vega')}</strong>
-                </p>
-            </div>
-            """
-
-            send_smtp_email = brevo_python.SendSmtpEmail(
-                to=[{"email": email}],
-                subject=f'Recuperación de contraseña - {getattr(settings, "COMPANY_NAME", "Refaccionaria Vega")}',
-                html_content=html_content,
-                sender={
-                    "email": settings.BREVO_SENDER_EMAIL,
-                    "name": getattr(settings, 'BREVO_SENDER_NAME', 'Refaccionaria Vega')
-                },
-            )
-            api_instance.send_transac_email(send_smtp_email)
-        except ApiException as exc:  # type: ignore
-            # En desarrollo, loguear el error pero no revelarlo al usuario
-            if settings.DEBUG:
-                detail = getattr(exc, 'body', None) or str(exc)
-                print(f"Error enviando email con Brevo: {detail}")
-            # Retornar éxito de todas formas por seguridad
-        except Exception as e:
-            # En desarrollo, loguear el error pero no revelarlo al usuario
+        # Encolar email (lo envía el comando `enviar_correos`)
+        if not brevo_configurado():
             if settings.DEBUG:
-                print(f"Error enviando email: {e}")
+                print("Falta configurar BREVO_API_KEY / BREVO_SENDER_EMAIL")
             # Retornar éxito de todas formas por seguridad
-        
+            return Response({
+                'message': 'Si el correo existe, recibirás un enlace para restablecer tu contraseña'
+            }, status=status.HTTP_200_OK)
+
+        # Mensaje HTML simple para recuperación de contraseña
+        html_content = f"""
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2 style="color: #0A3981;">Recuperación de Contraseña</h2>
+            <p>Hola {user.username},</p>
+            <p>Has solicitado restablecer tu contraseña. Haz clic en el siguiente enlace para continuar:</p>
+            <p style="margin: 20px 0;">
+                <a href="{reset_url}" style="background-color: #0A3981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
+                    Restablecer Contraseña
+                </a>
+            </p>
+            <p>O copia y pega este enlace en tu navegador:</p>
+            <p style="word-break: break-all; color: #666;">{reset_url}</p>
+            <p style="color: #999; font-size: 12px; margin-top: 30px;">
+                Este enlace expirará en 1 hora.<br>
+                Si no solicitaste este cambio, ignora este correo.
+            </p>
+            <p style="margin-top: 20px;">
+                Saludos,<br>
+                <strong>Equipo de {getattr(settings, 'COMPANY_NAME', 'Refaccionaria Vega')}</strong>
+            </p>
+        </div>
+        """
+
+        encolar_correo(
+            email,
+            asunto=f'Recuperación de contraseña - {getattr(settings, "COMPANY_NAME", "Refaccionaria Vega")}',
+            html=html_content,
+            categoria='password_reset',
+            # El enlace con uid/token no debe quedar en la bandeja después de enviarse
+            sensible=True,
+        )
+
         return Response({
             'message': 'Si el correo existe, recibirás un enlace para restablecer tu contraseña'
         }, status=status.HTTP_200_OK)
@@ -623,9 +605,7 @@ class PasswordResetConfirmView(APIView):
         
         # Invalidar todas las sesiones JWT activas del usuario
         try:
-            outstanding_tokens = OutstandingToken.objects.filter(user=user)
-            for outstanding_token in outstanding_tokens:
-                BlacklistedToken.objects.get_or_create(token=outstanding_token)
+            revocar_sesiones(user)
         except Exception as e:
             # Si falla la invalidación, loguear pero continuar
             if settings.DEBUG:
@@ -642,7 +622,7 @@ class ChangePasswordView(APIView):
     Requiere autenticación y contraseña actual
     Invalida todas las sesiones JWT activas del usuario
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
@@ -673,11 +653,9 @@ class ChangePasswordView(APIView):
         user.set_password(new_password)
         user.save()
         
-        # Invalidar todas las sesiones JWT activas del usuario (excepto la actual si se desea mantener)
+        # Invalidar todas las sesiones JWT activas del usuario, incluida la actual
         try:
-            outstanding_tokens = OutstandingToken.objects.filter(user=user)
-            for outstanding_token in outstanding_tokens:
-                BlacklistedToken.objects.get_or_create(token=outstanding_token)
+            revocar_sesiones(user)
         except Exception as e:
             # Si falla la invalidación, loguear pero continuar
             if settings.DEBUG:
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.ventas.services import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario de ventas (ResumenVentasDiario) desde las ventas registradas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, default=None, help='Día inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, default=None, help='Día final (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        total = reconstruir_resumen(desde=options['desde'], hasta=options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'{total} renglones del resumen reconstruidos'))
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:23
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_resumen(apps, schema_editor):
+    ResumenVentasDiario = apps.get_model('ventas', 'ResumenVentasDiario')
+    origenes = [
+        ('REF', apps.get_model('ventas', 'Ventas'), 'fecha_venta'),
+        ('SER', apps.get_model('ventas', 'VentasServicios'), 'fecha_venta'),
+        ('DEV', apps.get_model('ventas', 'Devolucion'), 'fecha_devolucion'),
+    ]
+    filas = []
+    for tipo, modelo, campo in origenes:
+        agregados = (
+            modelo.objects.annotate(dia=TruncDate(campo)).values('dia')
+            .annotate(suma=Sum('total'), cuenta=Count('id')).order_by('dia')
+        )
+        filas.extend(
+            ResumenVentasDiario(fecha=a['dia'], tipo=tipo, total=a['suma'] or 0, cantidad=a['cuenta'])
+            for a in agregados
+        )
+    ResumenVentasDiario.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0006_ventas_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('REF', 'Venta de refacciones'), ('SER', 'Venta de servicios'), ('DEV', 'Devolución')], max_length=3)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resumen diario de ventas',
+                'ordering': ['fecha', 'tipo'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'tipo'), name='ventas_resumen_fecha_tipo_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_refaccion_reservado_disponible'),
+        ('ventas', '0007_resumenventasdiario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['fecha_venta', 'id'], name='ventas_vent_fecha_v_401471_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 from apps.productos.models import Marca, Refaccion
 from apps.servicios.models import Servicio
@@ -43,6 +45,10 @@ class Ventas(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-fecha_venta']
+        indexes = [
+            # Paginación por llave del listado de ventas
+            models.Index(fields=['fecha_venta', 'id']),
+        ]
         
     def __str__(self):
         return f"Venta {self.id} - {self.refaccion.nombre} ({self.cantidad})"
@@ -112,4 +118,64 @@ class Devolucion(models.Model):
         ordering = ['-fecha_devolucion']
 
     def __str__(self):
-        return f"Devolución {self.id} - {self.refaccion.nombre} ({self.cantidad})"
\ No newline at end of file
+        return f"Devolución {self.id} - {self.refaccion.nombre} ({self.cantidad})"
+
+
+class ResumenVentasDiario(models.Model):
+    """Acumulado diario por tipo (refacciones, servicios, devoluciones).
+
+    Se mantiene de forma incremental al registrar ventas (ver receivers abajo y
+    ventas.services) y se puede reconstruir con `reconstruir_resumen_ventas`.
+    Las estadísticas y gráficas de AllVentasView leen de aquí.
+    """
+
+    class TipoChoices(models.TextChoices):
+        REFACCION = 'REF', 'Venta de refacciones'
+        SERVICIO = 'SER', 'Venta de servicios'
+        DEVOLUCION = 'DEV', 'Devolución'
+
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=3, choices=TipoChoices.choices)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen diario de ventas"
+        verbose_name_plural = "Resumen diario de ventas"
+        ordering = ['fecha', 'tipo']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'tipo'], name='ventas_resumen_fecha_tipo_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo}: {self.total} ({self.cantidad})"
+
+
+def _tipo_y_fecha(instance):
+    from .services import TIPO_POR_MODELO
+    tipo, campo_fecha = TIPO_POR_MODELO[type(instance)]
+    return tipo, getattr(instance, campo_fecha)
+
+
+@receiver(post_save, sender=Ventas)
+@receiver(post_save, sender=VentasServicios)
+@receiver(post_save, sender=Devolucion)
+def venta_post_save_resumen(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    from .services import acumular_en_resumen, recalcular_resumen_dia
+    tipo, fecha = _tipo_y_fecha(instance)
+    if created:
+        acumular_en_resumen(tipo, fecha, instance.total, 1)
+    else:
+        # Una edición puede cambiar el total: se recalcula solo ese día
+        recalcular_resumen_dia(tipo, fecha)
+
+
+@receiver(post_delete, sender=Ventas)
+@receiver(post_delete, sender=VentasServicios)
+@receiver(post_delete, sender=Devolucion)
+def venta_post_delete_resumen(sender, instance, **kwargs):
+    from .services import recalcular_resumen_dia
+    tipo, fecha = _tipo_y_fecha(instance)
+    recalcular_resumen_dia(tipo, fecha)
@@ -0,0 +1,224 @@
+"""
+Mantenimiento del resumen diario de ventas (ResumenVentasDiario) y listado
+unificado de ventas, servicios y devoluciones.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, DateTimeField, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Devolucion, ResumenVentasDiario, Ventas, VentasServicios
+
+Tipo = ResumenVentasDiario.TipoChoices
+
+# modelo -> (tipo en el resumen, campo de fecha)
+TIPO_POR_MODELO = {
+    Ventas: (Tipo.REFACCION, 'fecha_venta'),
+    VentasServicios: (Tipo.SERVICIO, 'fecha_venta'),
+    Devolucion: (Tipo.DEVOLUCION, 'fecha_devolucion'),
+}
+MODELO_POR_TIPO = {tipo: (modelo, campo) for modelo, (tipo, campo) in TIPO_POR_MODELO.items()}
+
+
+def _dia_local(fecha):
+    if isinstance(fecha, datetime):
+        return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+def _rango_del_dia(dia):
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def acumular_en_resumen(tipo, fecha, total, cantidad=1):
+    """Suma `total`/`cantidad` al renglón (día, tipo) con un UPDATE atómico (F), creándolo si falta."""
+    dia = _dia_local(fecha)
+    total = Decimal(total or 0)
+    actualizados = ResumenVentasDiario.objects.filter(fecha=dia, tipo=tipo).update(
+        total=F('total') + total, cantidad=F('cantidad') + cantidad
+    )
+    if actualizados:
+        return
+    try:
+        with transaction.atomic():
+            ResumenVentasDiario.objects.create(fecha=dia, tipo=tipo, total=total, cantidad=cantidad)
+    except IntegrityError:
+        # Otro proceso creó el renglón entre el UPDATE y el INSERT
+        ResumenVentasDiario.objects.filter(fecha=dia, tipo=tipo).update(
+            total=F('total') + total, cantidad=F('cantidad') + cantidad
+        )
+
+
+def acumular_registros(registros):
+    """Ruta en lote (p. ej. tras bulk_create, que no dispara señales): un UPDATE por (día, tipo)."""
+    acumulado = {}
+    for registro in registros:
+        tipo, campo = TIPO_POR_MODELO[type(registro)]
+        clave = (tipo, _dia_local(getattr(registro, campo)))
+        total, cantidad = acumulado.get(clave, (Decimal('0'), 0))
+        acumulado[clave] = (total + Decimal(registro.total or 0), cantidad + 1)
+    for (tipo, dia), (total, cantidad) in acumulado.items():
+        acumular_en_resumen(tipo, dia, total, cantidad)
+
+
+def _agregar_por_dia(tipo, desde=None, hasta=None):
+    modelo, campo = MODELO_POR_TIPO[tipo]
+    qs = modelo.objects.all()
+    if desde is not None:
+        qs = qs.filter(**{f'{campo}__gte': _rango_del_dia(desde)[0]})
+    if hasta is not None:
+        qs = qs.filter(**{f'{campo}__lt': _rango_del_dia(hasta)[1]})
+    return (
+        qs.annotate(dia=TruncDate(campo))
+        .values('dia')
+        .annotate(
+            suma=Coalesce(Sum('total'), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            cuenta=Count('id'),
+        )
+        .order_by('dia')
+    )
+
+
+def recalcular_resumen_dia(tipo, fecha):
+    """Recalcula desde las tablas de origen el renglón de un solo día."""
+    dia = _dia_local(fecha)
+    filas = list(_agregar_por_dia(tipo, desde=dia, hasta=dia))
+    if not filas or not filas[0]['cuenta']:
+        ResumenVentasDiario.objects.filter(fecha=dia, tipo=tipo).delete()
+        return
+    ResumenVentasDiario.objects.update_or_create(
+        fecha=dia, tipo=tipo,
+        defaults={'total': filas[0]['suma'], 'cantidad': filas[0]['cuenta']},
+    )
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """Reconstruye el resumen (completo o de un rango de días) a partir de las ventas."""
+    with transaction.atomic():
+        existentes = ResumenVentasDiario.objects.all()
+        if desde is not None:
+            existentes = existentes.filter(fecha__gte=desde)
+        if hasta is not None:
+            existentes = existentes.filter(fecha__lte=hasta)
+        existentes.delete()
+
+        filas = [
+            ResumenVentasDiario(fecha=fila['dia'], tipo=tipo, total=fila['suma'], cantidad=fila['cuenta'])
+            for tipo in MODELO_POR_TIPO
+            for fila in _agregar_por_dia(tipo, desde, hasta)
+        ]
+        ResumenVentasDiario.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def totales_por_tipo(desde, hasta):
+    """{tipo: {'total', 'cantidad'}} entre dos días (inclusive), en una sola consulta."""
+    filas = (
+        ResumenVentasDiario.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta)
+        .values('tipo')
+        .annotate(suma=Sum('total'), cuenta=Sum('cantidad'))
+    )
+    resultado = {tipo: {'total': Decimal('0'), 'cantidad': 0} for tipo in Tipo.values}
+    for fila in filas:
+        resultado[fila['tipo']] = {'total': fila['suma'] or Decimal('0'), 'cantidad': fila['cuenta'] or 0}
+    return resultado
+
+
+def serie_por_periodo(desde, hasta, por_mes=False):
+    """Serie para la gráfica: un punto por día (o por mes) con ventas, servicios y devoluciones."""
+    campos = {Tipo.REFACCION: 'ventas_refacciones', Tipo.SERVICIO: 'ventas_servicios', Tipo.DEVOLUCION: 'devoluciones'}
+    datos = {}
+    for fila in ResumenVentasDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).values('fecha', 'tipo', 'total'):
+        periodo = fila['fecha'].replace(day=1) if por_mes else fila['fecha']
+        punto = datos.setdefault(periodo, {
+            'fecha': timezone.make_aware(datetime.combine(periodo, time.min)).isoformat(),
+            'ventas_refacciones': 0,
+            'ventas_servicios': 0,
+            'devoluciones': 0,
+            'total': 0,
+        })
+        monto = float(fila['total'] or 0)
+        punto[campos[fila['tipo']]] += monto
+        punto['total'] += -monto if fila['tipo'] == Tipo.DEVOLUCION else monto
+    return [datos[periodo] for periodo in sorted(datos)]
+
+
+# ── Listado unificado (refacciones + servicios + devoluciones) ────────────────
+# Cada fuente aporta (tipo, id, fecha); se combinan con UNION ALL y la base de
+# datos filtra, ordena y pagina. Solo se cargan y serializan las filas de la página.
+
+FUENTES_LISTADO = {
+    'refaccion': (Ventas, 'fecha_venta', ['refaccion__nombre', 'marca__nombre']),
+    'servicio': (VentasServicios, 'fecha_venta', ['servicio__aparato', 'tecnico']),
+    'devolucion': (Devolucion, 'fecha_devolucion', ['refaccion__nombre', 'marca__nombre']),
+}
+# Llave del listado; el cursor (formato de KeysetPagination) guarda estos valores
+ORDEN_LISTADO = ('-fecha', '-tipo', '-id')
+# Campos de las columnas anotadas, para convertir los valores del cursor
+CAMPOS_LISTADO = {'fecha': DateTimeField(), 'tipo': CharField()}
+
+
+def _condicion_despues_de(tipo, campo, cursor):
+    """Filas posteriores al cursor en el orden (fecha, tipo, id) descendente."""
+    fecha, tipo_cursor, id_cursor = cursor
+    if tipo < tipo_cursor:
+        return Q(**{f'{campo}__lte': fecha})
+    if tipo == tipo_cursor:
+        return Q(**{f'{campo}__lt': fecha}) | Q(**{campo: fecha, 'id__lt': id_cursor})
+    return Q(**{f'{campo}__lt': fecha})
+
+
+def listado_ventas(tipo=None, search=None, cursor=None):
+    """Queryset UNION ALL de filas {'tipo', 'id', 'fecha'} ordenado por fecha descendente.
+
+    `cursor` es (fecha, tipo, id) de la última fila vista, para paginar por llave.
+    """
+    partes = []
+    for nombre, (modelo, campo, campos_busqueda) in FUENTES_LISTADO.items():
+        if tipo and tipo != nombre:
+            continue
+        qs = modelo.objects.all()
+        if search:
+            condicion = Q(id_texto__contains=search)
+            for campo_busqueda in campos_busqueda:
+                condicion |= Q(**{f'{campo_busqueda}__icontains': search})
+            qs = qs.annotate(id_texto=Cast('id', CharField())).filter(condicion)
+        if cursor is not None:
+            qs = qs.filter(_condicion_despues_de(nombre, campo, cursor))
+        partes.append(
+            qs.order_by()
+            .annotate(tipo=Value(nombre, output_field=CharField()), fecha=F(campo))
+            .values('tipo', 'id', 'fecha')
+        )
+    if not partes:
+        return Ventas.objects.none().values('id')
+    listado = partes[0].union(*partes[1:], all=True) if len(partes) > 1 else partes[0]
+    return listado.order_by(*ORDEN_LISTADO)
+
+
+def serializar_listado(filas):
+    """Carga (una consulta por tipo) y serializa las filas de una página, conservando el orden."""
+    from .serializers import DevolucionSerializer, VentasSerializer, VentasServiciosSerializer
+
+    cargas = {
+        'refaccion': (Ventas.objects.select_related('usuario', 'marca', 'refaccion'), VentasSerializer),
+        'servicio': (VentasServicios.objects.select_related('servicio'), VentasServiciosSerializer),
+        'devolucion': (Devolucion.objects.select_related('venta', 'marca', 'refaccion'), DevolucionSerializer),
+    }
+    ids_por_tipo = {}
+    for fila in filas:
+        ids_por_tipo.setdefault(fila['tipo'], []).append(fila['id'])
+
+    datos = {}
+    for nombre, ids in ids_por_tipo.items():
+        queryset, serializer_class = cargas[nombre]
+        campo = FUENTES_LISTADO[nombre][1]
+        for item in serializer_class(queryset.filter(id__in=ids), many=True).data:
+            datos[(nombre, item['id'])] = {**item, 'tipo': nombre, 'fecha': item[campo]}
+    return [datos[(fila['tipo'], fila['id'])] for fila in filas if (fila['tipo'], fila['id']) in datos]
+
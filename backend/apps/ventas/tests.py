@@ -3,10 +3,13 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 
-from apps.productos.models import Refaccion, Categoria
+from apps.productos.models import Marca, Refaccion, Categoria
 from apps.pedidos.models import Pedido
 from apps.pedidos.serializers import CheckoutSerializer
-from apps.ventas.models import Devolucion
+from apps.ventas.models import Devolucion, ResumenVentasDiario, Ventas, VentasServicios
+from apps.ventas.services import reconstruir_resumen
+from apps.servicios.models import Servicio
+from django.utils import timezone
 from apps.inventario.services import registrar_salida_por_compra
 from apps.inventario.serializer import RegistrarDevolucionSerializer
 
@@ -19,7 +22,7 @@ class DevolucionesViewSetTest(TestCase):
         self.admin = self.User.objects.create_superuser(username='admin', password='secret')
         self.categoria = Categoria.objects.create(nombre='Cat', descripcion='')
         self.ref = Refaccion.objects.create(
-            codigo_parte='CP-2', nombre='Ref2', descripcion='', marca='Marca2', categoria=self.categoria,
+            codigo_parte='CP-2', nombre='Ref2', descripcion='', marca=Marca.objects.create(nombre='Marca2'), categoria=self.categoria,
             precio=100, existencias=10, compatibilidad=''
         )
 
@@ -52,4 +55,107 @@ class DevolucionesViewSetTest(TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertGreaterEqual(len(res.data), 1)
 
+
+class ResumenVentasTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(username='admin', password='secret')
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        self.marca = Marca.objects.create(nombre='Marca1')
+        self.ref = Refaccion.objects.create(
+            codigo_parte='CP-9', nombre='Ref9', descripcion='', marca=self.marca, categoria=categoria,
+            precio=100, existencias=10, compatibilidad=''
+        )
+        self.servicio = Servicio.objects.create(noDeServicio=1, marca='LG', aparato='Lavadora', cliente='Ana')
+
+    def _venta(self, total):
+        return Ventas.objects.create(
+            marca=self.marca, refaccion=self.ref, cantidad=1, precio_unitario=total, total=total
+        )
+
+    def test_resumen_se_mantiene_al_registrar(self):
+        self._venta(100)
+        venta = self._venta(50)
+        VentasServicios.objects.create(servicio=self.servicio, mano_obra=300, total=300)
+        Devolucion.objects.create(marca=self.marca, refaccion=self.ref, cantidad=1, precio_unitario=30, total=30)
+
+        hoy = timezone.localdate()
+        resumen = {r.tipo: (r.total, r.cantidad) for r in ResumenVentasDiario.objects.filter(fecha=hoy)}
+        self.assertEqual(resumen, {'REF': (150, 2), 'SER': (300, 1), 'DEV': (30, 1)})
+
+        venta.total = 80
+        venta.save()
+        self.assertEqual(ResumenVentasDiario.objects.get(fecha=hoy, tipo='REF').total, 180)
+        venta.delete()
+        self.assertEqual(ResumenVentasDiario.objects.get(fecha=hoy, tipo='REF').cantidad, 1)
+
+        ResumenVentasDiario.objects.all().delete()
+        self.assertEqual(reconstruir_resumen(), 3)
+        self.assertEqual(ResumenVentasDiario.objects.get(fecha=hoy, tipo='REF').total, 100)
+
+    def test_endpoints_leen_del_resumen(self):
+        self._venta(100)
+        VentasServicios.objects.create(servicio=self.servicio, mano_obra=300, total=300)
+        Devolucion.objects.create(marca=self.marca, refaccion=self.ref, cantidad=1, precio_unitario=30, total=30)
+        self.client.force_authenticate(user=self.admin)
+
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/v1/ventas/all/estadisticas/', {'tipo': 'año'})
+        self.assertEqual(res.data['ventas_refacciones'], {'total': 100.0, 'cantidad': 1})
+        self.assertEqual(res.data['ventas_servicios'], {'total': 300.0, 'cantidad': 1})
+        self.assertEqual(res.data['devoluciones'], {'total': 30.0, 'cantidad': 1})
+
+        res = self.client.get('/api/v1/ventas/all/grafico/', {'tipo': 'mes'})
+        self.assertEqual(len(res.data['datos']), 1)
+        punto = res.data['datos'][0]
+        self.assertEqual(
+            (punto['ventas_refacciones'], punto['ventas_servicios'], punto['devoluciones'], punto['total']),
+            (100.0, 300.0, 30.0, 370.0),
+        )
+
+
+class ListadoVentasTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_superuser(username='admin', password='secret'))
+        categoria = Categoria.objects.create(nombre='Cat', descripcion='')
+        self.marca = Marca.objects.create(nombre='Mabe')
+        self.ref = Refaccion.objects.create(
+            codigo_parte='CP-1', nombre='Bomba', descripcion='', marca=self.marca, categoria=categoria,
+            precio=100, existencias=10, compatibilidad=''
+        )
+        servicio = Servicio.objects.create(noDeServicio=1, marca='LG', aparato='Lavadora', cliente='Ana')
+        self.venta = Ventas.objects.create(marca=self.marca, refaccion=self.ref, cantidad=1, precio_unitario=100, total=100)
+        self.servicio = VentasServicios.objects.create(servicio=servicio, mano_obra=300, total=300, tecnico='Luis')
+        self.devolucion = Devolucion.objects.create(
+            marca=self.marca, refaccion=self.ref, cantidad=1, precio_unitario=100, total=100
+        )
+
+    def test_lista_unificada_ordenada_y_filtrada(self):
+        res = self.client.get('/api/v1/ventas/all/')
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(
+            [(v['tipo'], v['id']) for v in res.data['results']],
+            [('devolucion', self.devolucion.id), ('servicio', self.servicio.id), ('refaccion', self.venta.id)],
+        )
+        self.assertEqual(res.data['results'][2]['refaccion_nombre'], 'Bomba')
+
+        res = self.client.get('/api/v1/ventas/all/', {'search': 'LAVA'})
+        self.assertEqual([v['tipo'] for v in res.data['results']], ['servicio'])
+        res = self.client.get('/api/v1/ventas/all/', {'search': 'bomba', 'tipo': 'refaccion'})
+        self.assertEqual([v['id'] for v in res.data['results']], [self.venta.id])
+
+    def test_paginacion_por_cursor(self):
+        vistos = []
+        params = {'cursor': '', 'page_size': 2}
+        while True:
+            res = self.client.get('/api/v1/ventas/all/', params)
+            self.assertEqual(res.status_code, 200)
+            vistos += [v['tipo'] for v in res.data['results']]
+            if not res.data['next_cursor']:
+                break
+            params['cursor'] = res.data['next_cursor']
+        self.assertEqual(vistos, ['devolucion', 'servicio', 'refaccion'])
+        self.assertEqual(self.client.get('/api/v1/ventas/all/', {'cursor': 'x'}).status_code, 400)
+
 # Create your tests here.
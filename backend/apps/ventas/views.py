@@ -3,14 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.db import transaction
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth, TruncDate, TruncDay
-from datetime import datetime
+from calendar import monthrange
+from datetime import date
 from django.utils import timezone
-from datetime import timedelta
+from apps.common.pagination import KeysetPagination
 from apps.pedidos.pagination import PedidoPagination
 from apps.inventario.services import registrar_salida_por_compra
-from .models import Ventas, VentasServicios, Devolucion
+from .models import Ventas, VentasServicios, Devolucion, ResumenVentasDiario
+from .services import (
+    totales_por_tipo, serie_por_periodo, listado_ventas, serializar_listado,
+    CAMPOS_LISTADO, FUENTES_LISTADO, ORDEN_LISTADO,
+)
 from .serializers import VentasSerializer, VentasServiciosSerializer, DevolucionSerializer
 # Create your views here.
 class VentasViewSet(viewsets.ModelViewSet):
@@ -23,6 +26,8 @@ class VentasViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['refaccion__nombre', 'marca__nombre']
     ordering_fields = ['fecha_venta', 'total']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-fecha_venta', '-id')
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -37,24 +42,21 @@ class VentasViewSet(viewsets.ModelViewSet):
         return qs.filter(usuario=user)
 
     def perform_create(self, serializer):
-        from apps.productos.models import Marca
         refaccion = serializer.validated_data.get('refaccion')
         cantidad = serializer.validated_data.get('cantidad')
         precio_unitario = serializer.validated_data.get('precio_unitario')
-        marca = None
-        if refaccion and refaccion.marca:
-            marca, _ = Marca.objects.get_or_create(nombre=refaccion.marca)
 
         with transaction.atomic():
             try:
-                registrar_salida_por_compra(
+                movimiento = registrar_salida_por_compra(
                     refaccion=refaccion,
                     cantidad=cantidad,
                     precio_unitario=precio_unitario,
                 )
             except ValueError as e:
                 raise DRFValidationError({'detail': str(e)})
-            serializer.save(usuario=self.request.user, marca=marca)
+            # La marca ya viene resuelta en el movimiento (FK de la refacción)
+            serializer.save(usuario=self.request.user, marca=movimiento.marca)
 
 class VentasServiciosViewSet(viewsets.ModelViewSet):
     """
@@ -131,62 +133,37 @@ class AllVentasView(viewsets.ViewSet):
         else:
             dia = int(dia)
         
-        # Construir filtros según el tipo
+        # Construir el rango de días según el tipo
         if tipo == 'dia':
             # Estadísticas del día especificado
-            fecha_inicio = timezone.make_aware(datetime(año, mes, dia))
-            fecha_fin = fecha_inicio + timedelta(days=1) - timedelta(seconds=1)
+            fecha_inicio = fecha_fin = date(año, mes, dia)
         elif tipo == 'mes':
             # Estadísticas del mes especificado
-            fecha_inicio = timezone.make_aware(datetime(año, mes, 1))
-            if mes == 12:
-                fecha_fin = timezone.make_aware(datetime(año + 1, 1, 1)) - timedelta(seconds=1)
-            else:
-                fecha_fin = timezone.make_aware(datetime(año, mes + 1, 1)) - timedelta(seconds=1)
+            fecha_inicio = date(año, mes, 1)
+            fecha_fin = date(año, mes, monthrange(año, mes)[1])
         else:  # tipo == 'año'
             # Estadísticas del año especificado
-            fecha_inicio = timezone.make_aware(datetime(año, 1, 1))
-            fecha_fin = timezone.make_aware(datetime(año, 12, 31, 23, 59, 59))
-        
-        # Total de ventas de servicios
-        total_ventas_servicios = VentasServicios.objects.filter(
-            fecha_venta__gte=fecha_inicio,
-            fecha_venta__lte=fecha_fin
-        ).aggregate(
-            total=Sum('total'),
-            count=Count('id')
-        )
-        
-        # Total de ventas de refacciones
-        total_ventas_refacciones = Ventas.objects.filter(
-            fecha_venta__gte=fecha_inicio,
-            fecha_venta__lte=fecha_fin
-        ).aggregate(
-            total=Sum('total'),
-            count=Count('id')
-        )
-        
-        # Total de devoluciones
-        total_devoluciones = Devolucion.objects.filter(
-            fecha_devolucion__gte=fecha_inicio,
-            fecha_devolucion__lte=fecha_fin
-        ).aggregate(
-            total=Sum('total'),
-            count=Count('id')
-        )
-        
+            fecha_inicio = date(año, 1, 1)
+            fecha_fin = date(año, 12, 31)
+
+        # Una sola consulta sobre el resumen diario (ResumenVentasDiario)
+        totales = totales_por_tipo(fecha_inicio, fecha_fin)
+        total_ventas_servicios = totales[ResumenVentasDiario.TipoChoices.SERVICIO]
+        total_ventas_refacciones = totales[ResumenVentasDiario.TipoChoices.REFACCION]
+        total_devoluciones = totales[ResumenVentasDiario.TipoChoices.DEVOLUCION]
+
         return Response({
             'ventas_servicios': {
-                'total': float(total_ventas_servicios['total'] or 0),
-                'cantidad': total_ventas_servicios['count'] or 0
+                'total': float(total_ventas_servicios['total']),
+                'cantidad': total_ventas_servicios['cantidad']
             },
             'ventas_refacciones': {
-                'total': float(total_ventas_refacciones['total'] or 0),
-                'cantidad': total_ventas_refacciones['count'] or 0
+                'total': float(total_ventas_refacciones['total']),
+                'cantidad': total_ventas_refacciones['cantidad']
             },
             'devoluciones': {
-                'total': float(total_devoluciones['total'] or 0),
-                'cantidad': total_devoluciones['count'] or 0
+                'total': float(total_devoluciones['total']),
+                'cantidad': total_devoluciones['cantidad']
             },
             'tipo': tipo,
             'año': año,
@@ -215,174 +192,11 @@ class AllVentasView(viewsets.ViewSet):
         
         if tipo == 'dia':
             # Vista por día dentro del mes especificado
-            fecha_inicio = timezone.make_aware(datetime(año, mes, 1))
-            # Calcular último día del mes
-            if mes == 12:
-                fecha_fin = timezone.make_aware(datetime(año + 1, 1, 1)) - timedelta(days=1)
-            else:
-                fecha_fin = timezone.make_aware(datetime(año, mes + 1, 1)) - timedelta(days=1)
-            
-            # Ventas de refacciones por día
-            ventas_refacciones = Ventas.objects.filter(
-                fecha_venta__gte=fecha_inicio,
-                fecha_venta__lte=fecha_fin
-            ).annotate(
-                dia=TruncDay('fecha_venta')
-            ).values('dia').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('dia')
-            
-            # Ventas de servicios por día
-            ventas_servicios = VentasServicios.objects.filter(
-                fecha_venta__gte=fecha_inicio,
-                fecha_venta__lte=fecha_fin
-            ).annotate(
-                dia=TruncDay('fecha_venta')
-            ).values('dia').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('dia')
-            
-            # Devoluciones por día
-            devoluciones = Devolucion.objects.filter(
-                fecha_devolucion__gte=fecha_inicio,
-                fecha_devolucion__lte=fecha_fin
-            ).annotate(
-                dia=TruncDay('fecha_devolucion')
-            ).values('dia').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('dia')
-            
-            # Combinar datos por día
-            datos_por_periodo = {}
-            
-            for item in ventas_refacciones:
-                dia_key = item['dia'].strftime('%Y-%m-%d')
-                if dia_key not in datos_por_periodo:
-                    datos_por_periodo[dia_key] = {
-                        'fecha': item['dia'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[dia_key]['ventas_refacciones'] = float(item['total'] or 0)
-                datos_por_periodo[dia_key]['total'] += float(item['total'] or 0)
-            
-            for item in ventas_servicios:
-                dia_key = item['dia'].strftime('%Y-%m-%d')
-                if dia_key not in datos_por_periodo:
-                    datos_por_periodo[dia_key] = {
-                        'fecha': item['dia'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[dia_key]['ventas_servicios'] = float(item['total'] or 0)
-                datos_por_periodo[dia_key]['total'] += float(item['total'] or 0)
-            
-            for item in devoluciones:
-                dia_key = item['dia'].strftime('%Y-%m-%d')
-                if dia_key not in datos_por_periodo:
-                    datos_por_periodo[dia_key] = {
-                        'fecha': item['dia'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[dia_key]['devoluciones'] = float(item['total'] or 0)
-                datos_por_periodo[dia_key]['total'] -= float(item['total'] or 0)
-            
-            # Convertir a lista y ordenar
-            resultado = sorted(datos_por_periodo.values(), key=lambda x: x['fecha'])
-            
+            resultado = serie_por_periodo(date(año, mes, 1), date(año, mes, monthrange(año, mes)[1]))
         else:
-            # Vista por mes dentro del año especificado
-            fecha_inicio = timezone.make_aware(datetime(año, 1, 1))
-            fecha_fin = timezone.make_aware(datetime(año, 12, 31, 23, 59, 59))
-            
-            # Ventas de refacciones por mes
-            ventas_refacciones = Ventas.objects.filter(
-                fecha_venta__gte=fecha_inicio,
-                fecha_venta__lte=fecha_fin
-            ).annotate(
-                mes=TruncMonth('fecha_venta')
-            ).values('mes').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('mes')
-            
-            # Ventas de servicios por mes
-            ventas_servicios = VentasServicios.objects.filter(
-                fecha_venta__gte=fecha_inicio,
-                fecha_venta__lte=fecha_fin
-            ).annotate(
-                mes=TruncMonth('fecha_venta')
-            ).values('mes').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('mes')
-            
-            # Devoluciones por mes
-            devoluciones = Devolucion.objects.filter(
-                fecha_devolucion__gte=fecha_inicio,
-                fecha_devolucion__lte=fecha_fin
-            ).annotate(
-                mes=TruncMonth('fecha_devolucion')
-            ).values('mes').annotate(
-                total=Sum('total'),
-                cantidad=Count('id')
-            ).order_by('mes')
-            
-            # Combinar datos por mes
-            datos_por_periodo = {}
-            
-            for item in ventas_refacciones:
-                mes_key = item['mes'].strftime('%Y-%m')
-                if mes_key not in datos_por_periodo:
-                    datos_por_periodo[mes_key] = {
-                        'fecha': item['mes'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[mes_key]['ventas_refacciones'] = float(item['total'] or 0)
-                datos_por_periodo[mes_key]['total'] += float(item['total'] or 0)
-            
-            for item in ventas_servicios:
-                mes_key = item['mes'].strftime('%Y-%m')
-                if mes_key not in datos_por_periodo:
-                    datos_por_periodo[mes_key] = {
-                        'fecha': item['mes'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[mes_key]['ventas_servicios'] = float(item['total'] or 0)
-                datos_por_periodo[mes_key]['total'] += float(item['total'] or 0)
-            
-            for item in devoluciones:
-                mes_key = item['mes'].strftime('%Y-%m')
-                if mes_key not in datos_por_periodo:
-                    datos_por_periodo[mes_key] = {
-                        'fecha': item['mes'].isoformat(),
-                        'ventas_refacciones': 0,
-                        'ventas_servicios': 0,
-                        'devoluciones': 0,
-                        'total': 0
-                    }
-                datos_por_periodo[mes_key]['devoluciones'] = float(item['total'] or 0)
-                datos_por_periodo[mes_key]['total'] -= float(item['total'] or 0)
-            
-            # Convertir a lista y ordenar
-            resultado = sorted(datos_por_periodo.values(), key=lambda x: x['fecha'])
-        
+            # Vista por mes dentro del año especificado (a lo más 365 renglones por tipo)
+            resultado = serie_por_periodo(date(año, 1, 1), date(año, 12, 31), por_mes=True)
+
         return Response({
             'datos': resultado,
             'tipo': tipo,
@@ -391,81 +205,35 @@ class AllVentasView(viewsets.ViewSet):
         }, status=status.HTTP_200_OK)
 
     def list(self, request):
-        """Obtiene todas las ventas (refacciones, servicios y devoluciones) con paginación"""
+        """Obtiene todas las ventas (refacciones, servicios y devoluciones) con paginación.
+
+        El filtrado, orden y paginación se hacen en la base de datos (UNION ALL);
+        solo se serializan las filas de la página. Con `?cursor=` se pagina por
+        llave (fecha, tipo, id) en lugar de por número de página.
+        """
         # Obtener parámetros de filtro
         tipo_filter = request.query_params.get('tipo', None)
         search = request.query_params.get('search', None)
-        
-        # Obtener ventas de refacciones
-        ventas_refacciones_qs = Ventas.objects.select_related('usuario', 'marca', 'refaccion').all()
-        if tipo_filter and tipo_filter != 'refaccion':
-            ventas_refacciones_qs = ventas_refacciones_qs.none()
-        ventas_refacciones_data = VentasSerializer(ventas_refacciones_qs, many=True).data
-        
-        # Obtener ventas de servicios
-        ventas_servicios_qs = VentasServicios.objects.select_related('servicio').all()
-        if tipo_filter and tipo_filter != 'servicio':
-            ventas_servicios_qs = ventas_servicios_qs.none()
-        ventas_servicios_data = VentasServiciosSerializer(ventas_servicios_qs, many=True).data
-        
-        # Obtener devoluciones
-        devoluciones_qs = Devolucion.objects.select_related('venta', 'marca', 'refaccion').all()
-        if tipo_filter and tipo_filter != 'devolucion':
-            devoluciones_qs = devoluciones_qs.none()
-        devoluciones_data = DevolucionSerializer(devoluciones_qs, many=True).data
-        
-        # Combinar y ordenar por fecha
-        todas_las_ventas = []
-        
-        # Agregar ventas de refacciones con tipo
-        for venta in ventas_refacciones_data:
-            todas_las_ventas.append({
-                **venta,
-                'tipo': 'refaccion',
-                'fecha': venta['fecha_venta']
-            })
-        
-        # Agregar ventas de servicios con tipo
-        for venta in ventas_servicios_data:
-            todas_las_ventas.append({
-                **venta,
-                'tipo': 'servicio',
-                'fecha': venta['fecha_venta']
-            })
-        
-        # Agregar devoluciones con tipo
-        for devolucion in devoluciones_data:
-            todas_las_ventas.append({
-                **devolucion,
-                'tipo': 'devolucion',
-                'fecha': devolucion['fecha_devolucion']
-            })
-        
-        # Aplicar búsqueda si existe
-        if search:
-            search_lower = search.lower()
-            todas_las_ventas = [
-                v for v in todas_las_ventas
-                if (
-                    search_lower in (v.get('refaccion_nombre', '') or '').lower() or
-                    search_lower in (v.get('marca_nombre', '') or '').lower() or
-                    search_lower in (v.get('servicio_aparato', '') or '').lower() or
-                    search_lower in (v.get('tecnico', '') or '').lower() or
-                    search_lower in str(v.get('id', '')).lower()
-                )
-            ]
-        
-        # Ordenar por fecha descendente
-        todas_las_ventas.sort(key=lambda x: x['fecha'], reverse=True)
-        
-        # Aplicar paginación
+
+        if 'cursor' in request.query_params:
+            return self._listar_por_cursor(request, tipo_filter, search)
+
         paginator = self.pagination_class()
-        page = paginator.paginate_queryset(todas_las_ventas, request)
-        
-        if page is not None:
-            return paginator.get_paginated_response(page)
-        
+        page = paginator.paginate_queryset(listado_ventas(tipo_filter, search), request, view=self)
+        return paginator.get_paginated_response(serializar_listado(page))
+
+    def _listar_por_cursor(self, request, tipo_filter, search):
+        cursor = KeysetPagination.decodificar_cursor(
+            Ventas, ORDEN_LISTADO, request.query_params.get('cursor'), campos=CAMPOS_LISTADO,
+        )
+        if cursor is not None and cursor[1] not in FUENTES_LISTADO:
+            raise DRFValidationError({'cursor': 'Cursor inválido'})
+
+        paginator = self.pagination_class()
+        tamano = paginator.get_page_size(request)
+        filas = list(listado_ventas(tipo_filter, search, cursor=cursor)[:tamano + 1])
+        siguiente = KeysetPagination.codificar_cursor(filas[tamano - 1], ORDEN_LISTADO) if len(filas) > tamano else None
         return Response({
-            'results': todas_las_ventas,
-            'count': len(todas_las_ventas)
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            'next_cursor': siguiente,
+            'results': serializar_listado(filas[:tamano]),
+        }, status=status.HTTP_200_OK)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import environ
 import dj_database_url
 from pathlib import Path
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'cloudinary_storage',          # debe ir ANTES de staticfiles
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'cloudinary',
     'rest_framework',
     'django_filters',
@@ -137,12 +139,46 @@ if DEBUG:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --------------------------------------------------------
+# CACHE (compartida entre workers: throttling y respuestas memorizadas)
+# --------------------------------------------------------
+# Redis en producción (REDIS_URL); sin él, archivos en disco, que comparten todos
+# los workers de la misma máquina. Las pruebas usan LocMemCache (config.test_runner).
+# El límite de entradas del backend de archivos (300 por omisión) se sube: al
+# llenarse borra un tercio al azar, incluidos los números de versión.
+# Cada app arma sus llaves con apps.common.cache.clave_cache ('productos:v1:...');
+# subir su versión en CACHE_VERSIONES_APPS descarta solo lo de esa app, y subir
+# CACHE_VERSION descarta todo lo memorizado al desplegar un cambio de formato.
+REDIS_URL = env('REDIS_URL', default='')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'refaccionaria-cache')),
+        'OPTIONS': {'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', default=50000)},
+    },
+}
+CACHES['default'].update({
+    'KEY_PREFIX': env('CACHE_KEY_PREFIX', default='refaccionaria'),
+    'VERSION': env.int('CACHE_VERSION', default=1),
+})
+CACHE_VERSIONES_APPS = {
+    'productos': 1,
+    'pedidos': 1,
+    'ventas': 1,
+    'servicios': 1,
+    'usuarios': 1,
+}
+TEST_RUNNER = 'config.test_runner.CacheEnMemoriaRunner'
+
 # --------------------------------------------------------
 # REST FRAMEWORK
 # --------------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.usuarios.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
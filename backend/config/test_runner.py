@@ -0,0 +1,26 @@
+"""
+Corredor de pruebas del proyecto.
+
+Las pruebas usan una caché en memoria por proceso (LocMemCache): no comparten
+llaves con la caché en disco del desarrollo local ni con otra corrida al mismo
+tiempo, y cada corrida empieza vacía.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CacheEnMemoriaRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        cache_pruebas = {
+            **settings.CACHES['default'],
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'refaccionaria-pruebas',
+        }
+        self._cache_en_memoria = override_settings(CACHES={'default': cache_pruebas})
+        self._cache_en_memoria.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_en_memoria.disable()
+        super().teardown_test_environment(**kwargs)
@@ -20,14 +20,25 @@ async function getBlogSlugs(): Promise<{ slug: string; lastmod: string }[]> {
 
 async function getProductsByCategory(id: number, key: string) {
   try {
-    const res = await fetch(
-      `${process.env.NEXT_PUBLIC_BASE_URL_API}/productos/categorias/${id}/refacciones/`,
-      { next: { revalidate: 3600 } }
-    )
-    if (!res.ok) return []
-    const data = await res.json()
-    const items = data.refacciones ?? data.results ?? data
-    return items.map((r: { nombre: string; slug?: string | null; ultima_actualizacion?: string }) => ({
+    const items: { nombre: string; slug?: string | null; ultima_actualizacion?: string }[] = []
+    let cursor: string | null = ''
+    // El listado por categoría está paginado: se recorre por cursor
+    while (cursor !== null) {
+      const params = new URLSearchParams({
+        cursor,
+        page_size: '200',
+        fields: 'nombre,slug,ultima_actualizacion',
+      })
+      const res = await fetch(
+        `${process.env.NEXT_PUBLIC_BASE_URL_API}/productos/categorias/${id}/refacciones/?${params.toString()}`,
+        { next: { revalidate: 3600 } }
+      )
+      if (!res.ok) return []
+      const data = await res.json()
+      items.push(...(data.refacciones ?? data.results ?? data))
+      cursor = data.next_cursor ?? null
+    }
+    return items.map((r) => ({
       url: `${BASE_URL}/categorias/${key}/${r.slug ?? encodeURIComponent(r.nombre)}`,
       lastmod: r.ultima_actualizacion ?? new Date().toISOString(),
     }))
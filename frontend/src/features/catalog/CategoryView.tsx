@@ -1,23 +1,35 @@
 "use client"
 
-import { useMemo, useState, useCallback } from "react"
+import { useMemo, useState, useCallback, useTransition } from "react"
 import { Product, Brand, ProductType } from "@/shared/data/products"
 import Filters from "@/shared/ui/product/filter"
 import { PackageSearch } from 'lucide-react'
+import { getRefaccionesByCategoria } from "./api"
 import ProductCard from "./ProductCard"
+import { transformRefaccion } from "./transform-refaccion"
 
 interface Props {
     categoryKey: string
     categoryLabel?: string
     categoryDescription?: string
+    categoryId?: number
     products: Product[]
+    nextCursor?: string | null
 }
 
 export default function CategoryView({
-    products,
+    categoryKey,
+    categoryId,
+    products: initialProducts,
+    nextCursor = null,
     categoryLabel,
     categoryDescription,
 }: Props) {
+    // La primera página llega del servidor; las siguientes se piden con el cursor
+    const [products, setProducts] = useState<Product[]>(initialProducts)
+    const [cursor, setCursor] = useState<string | null>(nextCursor)
+    const [loadError, setLoadError] = useState(false)
+    const [isLoading, startTransition] = useTransition()
     const [filters, setFilters] = useState<{ brands: Brand[]; types?: ProductType[]; min: number; max: number }>({
         brands: [],
         types: [],
@@ -56,6 +68,20 @@ export default function CategoryView({
 
     const totalPages = Math.ceil(filtered.length / productsPerPage)
 
+    const handleLoadMore = useCallback(() => {
+        if (categoryId === undefined || cursor === null) return
+        startTransition(async () => {
+            try {
+                const data = await getRefaccionesByCategoria(categoryId, cursor)
+                setProducts(prev => [...prev, ...data.refacciones.map(r => transformRefaccion(r, categoryKey))])
+                setCursor(data.next_cursor)
+                setLoadError(false)
+            } catch {
+                setLoadError(true)
+            }
+        })
+    }, [categoryId, categoryKey, cursor])
+
     const handleFilterChange = useCallback(
         (newFilters: { brands: Brand[]; types?: ProductType[]; min: number; max: number }) => {
             setFilters(newFilters)
@@ -159,6 +185,21 @@ export default function CategoryView({
                             )}
                         </>
                     )}
+
+                    {categoryId !== undefined && cursor !== null && (
+                        <div className="mt-6 flex flex-col items-center gap-2">
+                            <button
+                                onClick={handleLoadMore}
+                                disabled={isLoading}
+                                className="px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+                            >
+                                {isLoading ? 'Cargando…' : 'Cargar más productos'}
+                            </button>
+                            {loadError && (
+                                <p className="text-xs text-red-600">No se pudieron cargar más productos. Intenta de nuevo.</p>
+                            )}
+                        </div>
+                    )}
                 </div>
             </section>
         </div>
@@ -1,30 +1,10 @@
 // Async Server Component — streams when API resolves (Vercel: async-suspense-boundaries)
-import { getRefaccionesByCategoria, type Refaccion } from '@/features/catalog/api'
-import type { Product, Brand, ProductType } from '@/shared/data/products'
+import { getRefaccionesByCategoria } from '@/features/catalog/api'
 import CategoryView from './CategoryView'
+import { transformRefaccion } from './transform-refaccion'
 
 const BASE = 'https://www.refaccionariavega.com.mx'
 
-function transformRefaccion(refaccion: Refaccion, categoryKey: string): Product {
-  return {
-    id: String(refaccion.id),
-    slug: refaccion.codigo_parte || `product-${refaccion.id}`,
-    name: refaccion.nombre,
-    price: Number(refaccion.precio),
-    brand: refaccion.marca as Brand,
-    type: (refaccion.categoria_nombre || 'Pedestal') as ProductType,
-    category: categoryKey,
-    image: refaccion.imagen || '/placeholder.svg',
-    shortDescription: refaccion.descripcion || '',
-    specs: [
-      { label: 'Marca', value: refaccion.marca },
-      { label: 'Código de parte', value: refaccion.codigo_parte },
-      { label: 'Estado', value: refaccion.estado },
-    ],
-    inStock: refaccion.existencias > 0,
-  }
-}
-
 interface Props {
   category: {
     key: string
@@ -35,9 +15,10 @@ interface Props {
 }
 
 export default async function ProductsSection({ category }: Props) {
+  // Solo la primera página; CategoryView pide las siguientes con next_cursor
   const data = await getRefaccionesByCategoria(category.id_category).catch(() => ({
     refacciones: [],
-    total: 0,
+    next_cursor: null,
   }))
 
   const products = (data.refacciones || []).map((r) => transformRefaccion(r, category.key))
@@ -70,7 +51,12 @@ export default async function ProductsSection({ category }: Props) {
           dangerouslySetInnerHTML={{ __html: JSON.stringify(itemListSchema) }}
         />
       )}
-      <CategoryView categoryKey={category.key} products={products} />
+      <CategoryView
+        categoryKey={category.key}
+        categoryId={category.id_category}
+        products={products}
+        nextCursor={data.next_cursor}
+      />
     </>
   )
 }
@@ -5,6 +5,8 @@ import { cookies } from "next/headers";
 import { cache } from "react";
 
 const URL = process.env.NEXT_PUBLIC_BASE_URL_API
+// Refacciones por página en el listado de una categoría
+const CATEGORIA_PAGE_SIZE = 48
 
 // Types
 export interface Marca {
@@ -344,7 +346,7 @@ export const deleteRefaccion = async (id: number) => {
 export interface RefaccionesPorCategoriaResponse {
     categoria: Categoria;
     refacciones: Refaccion[];
-    total: number;
+    next_cursor: string | null;
 }
 
 // ========== COMENTARIOS DE PRODUCTOS ==========
@@ -363,25 +365,30 @@ export interface ComentarioProducto {
 }
 
 /**
- * Obtiene todas las refacciones (productos) de una categoría específica
+ * Obtiene una página de refacciones (productos) de una categoría específica.
+ * El endpoint pagina por cursor: la tienda pide la siguiente página con el
+ * next_cursor de la anterior ("Cargar más"); solo el sitemap recorre todas.
  * @param id_category - ID de la categoría
+ * @param cursor - next_cursor de la página anterior ('' para la primera)
  * @param marca - Filtro opcional por marca
  * @param estado - Filtro opcional por estado
- * @returns Objeto con la categoría, lista de refacciones y total
+ * @returns Objeto con la categoría, las refacciones de la página y el cursor siguiente
  */
 export const getRefaccionesByCategoria = async (
     id_category: number,
+    cursor: string = '',
     marca?: string,
     estado?: string
 ): Promise<RefaccionesPorCategoriaResponse> => {
     try {
         const params = new URLSearchParams()
-        
+
+        params.append('cursor', cursor)
+        params.append('page_size', String(CATEGORIA_PAGE_SIZE))
         if (marca) params.append('marca', marca)
         if (estado) params.append('estado', estado)
-        
-        const url = `${URL}/productos/categorias/${id_category}/refacciones/${params.toString() ? '?' + params.toString() : ''}`
 
+        const url = `${URL}/productos/categorias/${id_category}/refacciones/?${params.toString()}`
         const response = await fetch(url, {
             headers: { 'Content-Type': 'application/json' },
             next: { revalidate: 300 },
@@ -392,8 +399,12 @@ export const getRefaccionesByCategoria = async (
         }
 
         const data = await response.json()
-        return data
-} catch (error) {
+        return {
+            categoria: data.categoria,
+            refacciones: data.refacciones ?? [],
+            next_cursor: data.next_cursor ?? null,
+        }
+    } catch (error) {
         console.error('Error fetching refacciones by categoria:', error)
         throw error
     }
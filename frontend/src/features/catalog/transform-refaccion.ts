@@ -0,0 +1,22 @@
+import type { Refaccion } from '@/features/catalog/api'
+import type { Product, Brand, ProductType } from '@/shared/data/products'
+
+export function transformRefaccion(refaccion: Refaccion, categoryKey: string): Product {
+  return {
+    id: String(refaccion.id),
+    slug: refaccion.codigo_parte || `product-${refaccion.id}`,
+    name: refaccion.nombre,
+    price: Number(refaccion.precio),
+    brand: refaccion.marca as Brand,
+    type: (refaccion.categoria_nombre || 'Pedestal') as ProductType,
+    category: categoryKey,
+    image: refaccion.imagen || '/placeholder.svg',
+    shortDescription: refaccion.descripcion || '',
+    specs: [
+      { label: 'Marca', value: refaccion.marca },
+      { label: 'Código de parte', value: refaccion.codigo_parte },
+      { label: 'Estado', value: refaccion.estado },
+    ],
+    inStock: refaccion.existencias > 0,
+  }
+}